@@ -1,3 +1,7 @@
 from .archive.utils import generate_sha256
+from .bundle import iter_bundle
+from .layout import OutputLayout
 from .manifest import Manifest, Source
-from .parse import parse_archive
+from .parse import ParsedArchive, parse_archive
+from .sink import FileSystemSink, MemorySink, S3Sink, Sink, open_sink
+from .verify import verify_output
@@ -42,6 +42,11 @@ class ArchiveHandlerAAAJPC(ArchiveHandlerH32):
         sp_files = self._unzip(self._get_second_part())
         return fp_files + sp_files
 
+    def check_contents(self):
+        return self._check_zip(self._get_first_part(), "first part") + self._check_zip(
+            self._get_second_part(), "second part"
+        )
+
     def is_valid(self) -> bool:
         # magic number: 30-31-32-30-31-30
         signature = self._get_signature()
@@ -61,6 +66,13 @@ class ArchiveHandlerAAAJWX(ArchiveHandlerH32):
         sp_files = self._unzip(data)
         return fp_files + sp_files
 
+    def check_contents(self):
+        errors = self._check_zip(self._get_first_part(), "first part")
+        data, wad_errors = self._check_wad(self._get_second_part(), "second part")
+        if data is not None:
+            wad_errors += self._check_zip(data, "second part content")
+        return errors + wad_errors
+
     def is_valid(self) -> bool:
         # magic number: 49-31-32-30-31-30
         signature = self._get_signature()
@@ -79,6 +91,9 @@ class ArchiveHandlerAAAJPD(ArchiveHandlerH32):
         sp_files = self._decode_mime(self._get_second_part())
         return fp_files + sp_files
 
+    def check_contents(self):
+        return self._check_zip(self._get_first_part(), "first part")
+
     def is_valid(self) -> bool:
         # magic number: 30-31-33-30-31-30
         signature = self._get_signature()
@@ -98,6 +113,11 @@ class ArchiveHandlerAAAJWS(ArchiveHandlerH32):
         sp_files = self._decode_mime(data)
         return fp_files + sp_files
 
+    def check_contents(self):
+        errors = self._check_zip(self._get_first_part(), "first part")
+        _, wad_errors = self._check_wad(self._get_second_part(), "second part")
+        return errors + wad_errors
+
     def is_valid(self) -> bool:
         # magic number: 49-31-33-30-31-30
         signature = self._get_signature()
@@ -0,0 +1,97 @@
+"""Integrity check of archives without extracting them to disk."""
+
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+from pydantic import BaseModel, Field
+
+from .extract import handlers
+
+ARCHIVE_EXTENSIONS = {".jwx", ".jws", ".jpc", ".jpd"}
+
+
+class ArchiveCheckResult(BaseModel):
+    path: str
+    byte_size: int
+    handler: Optional[str] = None
+    errors: List[str] = Field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.handler is not None and not self.errors
+
+
+def check_archive(archive_path: str | Path) -> ArchiveCheckResult:
+    """validate an archive: signature, sizes in the header, CRC of every
+    zip member and messageDigest of the signed data of JWX/JWS.
+
+    nothing is written to disk. the archive is memory mapped rather than
+    read, so that only the part being checked is held in memory, and
+    decompressed data is discarded as it is read.
+
+    Args:
+        archive_path (str | Path): Path of the archive
+
+    Returns:
+        ArchiveCheckResult: result of the validation. an archive which can
+            not be read at all is reported in errors, not raised.
+    """
+    result = ArchiveCheckResult(path=str(archive_path), byte_size=0)
+    try:
+        with open(archive_path, "rb") as stream:
+            result.byte_size = os.fstat(stream.fileno()).st_size
+            if result.byte_size == 0:
+                _check(b"", result)
+            else:
+                with mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    _check(data, result)
+    except Exception as exc:
+        result.errors.append(f"{type(exc).__name__}: {exc}")
+    return result
+
+
+def _check(raw_data: bytes | mmap.mmap, result: ArchiveCheckResult) -> None:
+    for handler_cls in handlers:
+        handler = handler_cls(raw_data)  # type: ignore
+        if handler.is_valid():
+            result.handler = handler_cls.__name__
+            result.errors = handler.check()
+            return
+    result.errors = [f"unsupported signature: {raw_data[:6]!r}"]
+
+
+def find_archives(paths: Iterable[str | Path]) -> Iterator[Path]:
+    """yield archive files, looking into directories recursively.
+
+    Args:
+        paths (Iterable[str | Path]): archive files or directories
+    """
+    for path in map(Path, paths):
+        if path.is_dir():
+            for file_path in sorted(path.rglob("*")):
+                if (
+                    file_path.suffix.lower() in ARCHIVE_EXTENSIONS
+                    and file_path.is_file()
+                ):
+                    yield file_path
+        else:
+            yield path
+
+
+def check_archives(
+    archive_paths: Iterable[str | Path], max_workers: int | None = None
+) -> Iterator[ArchiveCheckResult]:
+    """check archives in parallel on a process pool, in the given order.
+
+    Args:
+        archive_paths (Iterable[str | Path]): archive files
+        max_workers (int | None): number of worker processes
+
+    Yields:
+        ArchiveCheckResult: result of each archive
+    """
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(check_archive, archive_paths, chunksize=16)
@@ -1,3 +1,4 @@
+from pathlib import Path
 from typing import List, Tuple
 
 from .aaa import (
@@ -20,11 +21,14 @@ handlers: List[type[ArchiveHandler]] = [
 ]
 
 
-def extract_archive(archive_path: str) -> List[Tuple[str, bytes]]:
+def extract_archive(
+    archive_path: str, unzip_workers: int = 1
+) -> List[Tuple[str, bytes]]:
     """extract all files from the archive.
 
     Args:
         archive_path (str): Path of the archive
+        unzip_workers (int): number of threads to decompress zip members
     Returns:
         List[Tuple[str, bytes]]: List of extracted files as (filename, data) tuples
     Raises:
@@ -32,10 +36,34 @@ def extract_archive(archive_path: str) -> List[Tuple[str, bytes]]:
     """
     with open(archive_path, "rb") as stream:
         raw_data = stream.read()
+    return extract_archive_data(raw_data, Path(archive_path).name, unzip_workers)
 
+
+def extract_archive_data(
+    raw_data: bytes,
+    name: str = "<bytes>",
+    unzip_workers: int = 1,
+    decompress_seconds: dict[str, float] | None = None,
+) -> List[Tuple[str, bytes]]:
+    """extract all files from the archive already read into memory.
+
+    Args:
+        raw_data (bytes): content of the archive
+        name (str): name of the archive used in error messages
+        unzip_workers (int): number of threads to decompress zip members
+        decompress_seconds (dict[str, float] | None): updated with the seconds
+            spent decompressing each member, by filename
+    Returns:
+        List[Tuple[str, bytes]]: List of extracted files as (filename, data) tuples
+    Raises:
+        ValueError: when the archive format is unsupported
+    """
     for handler_cls in handlers:
-        handler = handler_cls(raw_data)
+        handler = handler_cls(raw_data, unzip_workers=unzip_workers)
         if handler.is_valid():
-            return handler.get_contents()
+            contents = handler.get_contents()
+            if decompress_seconds is not None:
+                decompress_seconds.update(handler.decompress_seconds)
+            return contents
     else:
-        raise ValueError(f"unsupported archive format: {archive_path.name}")
+        raise ValueError(f"unsupported archive format: {name}")
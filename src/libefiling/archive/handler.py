@@ -1,9 +1,13 @@
+import hashlib
 import io
 import struct
+import time
+import zlib
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from email import message_from_bytes
-from typing import List, Tuple
-from zipfile import ZipFile
+from typing import Callable, List, Tuple
+from zipfile import ZIP_DEFLATED, ZIP_STORED, BadZipFile, ZipFile, ZipInfo
 
 from asn1crypto.cms import SignedData
 
@@ -13,8 +17,17 @@ class ArchiveHandler(ABC):
     with extensions JWX, JWC, JPC, and JPD used in internet application software.
     """
 
-    def __init__(self, raw_data: bytes):
+    def __init__(self, raw_data: bytes, unzip_workers: int = 1):
+        """
+        Args:
+            raw_data (bytes): whole content of the archive
+            unzip_workers (int): number of threads to decompress zip members.
+                1 decompresses them serially.
+        """
         self._raw_data = raw_data
+        self._unzip_workers = unzip_workers
+        # seconds spent decompressing or decoding each member, by filename
+        self.decompress_seconds: dict[str, float] = {}
 
     @abstractmethod
     def get_contents(self) -> List[Tuple[str, bytes]]:
@@ -24,6 +37,41 @@ class ArchiveHandler(ABC):
     def is_valid(self) -> bool:
         pass
 
+    @abstractmethod
+    def check_contents(self) -> List[str]:
+        """validate the parts of the payload without extracting them.
+
+        Returns:
+            List[str]: problems found, empty if none
+        """
+        pass
+
+    def check(self) -> List[str]:
+        """validate sizes recorded in the header, then the parts of the payload.
+
+        Returns:
+            List[str]: problems found, empty if none
+        """
+        size = len(self._raw_data)
+        if size < self._get_header_size():
+            return [f"truncated header: {size} bytes"]
+        errors = []
+        payload_size = self._get_payload_size()
+        if payload_size + 6 != size:
+            errors.append(
+                f"payload size {payload_size} does not match file size {size} - 6"
+            )
+        end = (
+            self._get_header_size()
+            + self._get_some_information_size()
+            + self._get_first_part_size()
+            + self._get_second_part_size()
+        )
+        if end > size:
+            errors.append(f"truncated: parts end at {end}, file size is {size}")
+            return errors
+        return errors + self.check_contents()
+
     @abstractmethod
     def _get_header_size(self) -> int:
         """return the header size of the archive
@@ -100,8 +148,104 @@ class ArchiveHandler(ABC):
     def _unzip(self, data: bytes) -> List[Tuple[str, bytes]]:
         zip_stream = io.BytesIO(data)
         with ZipFile(zip_stream, "r") as zip_file:
-            result = [(name, zip_file.read(name)) for name in zip_file.namelist()]
-        return result
+            infos = zip_file.infolist()
+            if self._unzip_workers <= 1 or len(infos) < 2:
+                return [
+                    (info.filename, self._timed(info.filename, zip_file.read, info))
+                    for info in infos
+                ]
+        return self._unzip_parallel(data, infos)
+
+    def _timed(
+        self, filename: str, read: Callable[..., bytes], *args, **kwargs
+    ) -> bytes:
+        """call read and record the seconds it took for the member."""
+        start = time.perf_counter()
+        data = read(*args, **kwargs)
+        self.decompress_seconds[filename] = time.perf_counter() - start
+        return data
+
+    def _unzip_parallel(
+        self, data: bytes, infos: List[ZipInfo]
+    ) -> List[Tuple[str, bytes]]:
+        """decompress zip members on a thread pool, keeping the member order.
+
+        each member is inflated by a single zlib call on its own memoryview
+        slice of the buffer, and zlib releases the GIL while inflating,
+        so members are decompressed on several cores.
+        """
+        view = memoryview(data)
+
+        def read(info: ZipInfo) -> Tuple[str, bytes]:
+            return info.filename, self._timed(
+                info.filename, _read_member, data, view, info
+            )
+
+        with ThreadPoolExecutor(
+            max_workers=min(self._unzip_workers, len(infos))
+        ) as executor:
+            return list(executor.map(read, infos))
+
+    def _check_zip(self, data: bytes, part: str) -> List[str]:
+        """test CRC of every zip member, streaming without keeping the output.
+
+        any error of a member, such as encryption or an unsupported
+        compression method, is reported and the next member is checked.
+        """
+        try:
+            with ZipFile(io.BytesIO(data), "r") as zip_file:
+                errors = []
+                for info in zip_file.infolist():
+                    try:
+                        with zip_file.open(info) as member:
+                            while member.read(1 << 20):
+                                pass
+                    except Exception as exc:
+                        errors.append(f"{part}: {info.filename}: {exc}")
+                return errors
+        except Exception as exc:
+            return [f"{part}: {exc}"]
+
+    def _check_wad(self, data: bytes, part: str) -> Tuple[bytes | None, List[str]]:
+        """compare the messageDigest signed attributes with the eContent.
+
+        the eContent is hashed once per digest algorithm in use.
+
+        Returns:
+            Tuple[bytes | None, List[str]]: eContent (None if unreadable) and problems
+        """
+        try:
+            info = SignedData.load(data)  # type: ignore
+            content = info["encap_content_info"]["content"].native  # type: ignore
+            signer_infos = list(info["signer_infos"])  # type: ignore
+        except (ValueError, TypeError, KeyError) as exc:
+            return None, [f"{part}: unreadable signed data: {exc}"]
+        if content is None:
+            return None, [f"{part}: no eContent"]
+
+        errors = []
+        digests: dict[str, bytes] = {}
+        for i, signer_info in enumerate(signer_infos):
+            signed_attrs = signer_info["signed_attrs"]
+            if not signed_attrs:
+                continue
+            expected = None
+            for attr in signed_attrs:
+                if attr["type"].native == "message_digest":
+                    expected = attr["values"][0].native
+            if expected is None:
+                errors.append(f"{part}: signer {i}: no messageDigest")
+                continue
+            algorithm = signer_info["digest_algorithm"]["algorithm"].native
+            if algorithm not in digests:
+                try:
+                    digests[algorithm] = hashlib.new(algorithm, content).digest()
+                except ValueError:
+                    errors.append(f"{part}: signer {i}: unsupported {algorithm}")
+                    continue
+            if digests[algorithm] != expected:
+                errors.append(f"{part}: signer {i}: messageDigest mismatch")
+        return content, errors
 
     def _extract_data_from_wad(self, data: bytes) -> bytes:
         """extract data part from WAD data.
@@ -118,7 +262,35 @@ class ArchiveHandler(ABC):
         """extract data part from MIME data."""
         mime = message_from_bytes(data)
         return [
-            (filename, m.get_payload(decode=True))  # type: ignore
+            (
+                filename,
+                self._timed(filename, m.get_payload, decode=True),  # type: ignore
+            )
             for m in mime.walk()
             if (filename := m.get_filename()) is not None
         ]
+
+
+def _read_member(data: bytes, view: memoryview, info: ZipInfo) -> bytes:
+    """read a stored or deflated zip member directly from the buffer.
+
+    other members (encrypted, or compressed by other methods) are read
+    through ZipFile.
+    """
+    if info.flag_bits & 0x1 or info.compress_type not in (ZIP_STORED, ZIP_DEFLATED):
+        with ZipFile(io.BytesIO(data), "r") as zip_file:
+            return zip_file.read(info)
+
+    offset = info.header_offset
+    if view[offset : offset + 4] != b"PK\x03\x04":
+        raise BadZipFile(f"Bad magic number for file header: {info.filename}")
+    name_length, extra_length = struct.unpack_from("<HH", view, offset + 26)
+    start = offset + 30 + name_length + extra_length
+    compressed = view[start : start + info.compress_size]
+    if info.compress_type == ZIP_STORED:
+        content = bytes(compressed)
+    else:
+        content = zlib.decompress(compressed, -zlib.MAX_WBITS, info.file_size or 1)
+    if zlib.crc32(content) != info.CRC:
+        raise BadZipFile(f"Bad CRC-32 for file {info.filename!r}")
+    return content
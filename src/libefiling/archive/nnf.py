@@ -46,6 +46,9 @@ class ArchiveHandlerNNFJPC(ArchiveHandlerH16):
     def get_contents(self):
         return self._unzip(self._get_second_part())
 
+    def check_contents(self):
+        return self._check_zip(self._get_second_part(), "second part")
+
     def is_valid(self) -> bool:
         # magic number: 30-32-32-30-32-30
         signature = self._get_signature()
@@ -65,6 +68,11 @@ class ArchiveHandlerNNFJWS(ArchiveHandlerH16):
         sp_files = self._decode_mime(data)
         return fp_files + sp_files
 
+    def check_contents(self):
+        errors = self._check_zip(self._get_first_part(), "first part")
+        _, wad_errors = self._check_wad(self._get_second_part(), "second part")
+        return errors + wad_errors
+
     def is_valid(self) -> bool:
         # magic number: 49-32-31-30-32-30
         signature = self._get_signature()
@@ -84,6 +92,13 @@ class ArchiveHandlerNNFJWX(ArchiveHandlerH16):
         sp_files = self._unzip(data)
         return fp_files + sp_files
 
+    def check_contents(self):
+        errors = self._check_zip(self._get_first_part(), "first part")
+        data, wad_errors = self._check_wad(self._get_second_part(), "second part")
+        if data is not None:
+            wad_errors += self._check_zip(data, "second part content")
+        return errors + wad_errors
+
     def is_valid(self) -> bool:
         # magic number: 49-32-32-30-32-30
         signature = self._get_signature()
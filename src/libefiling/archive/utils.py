@@ -11,11 +11,9 @@ def generate_sha256(file_path: str | Path) -> str:
     Returns:
         str: document sha256
     """
-    sha256_hash = hashlib.sha256()
     if isinstance(file_path, Path):
         file_path = str(file_path)
     with open(file_path, "rb") as f:
-        # Read and update hash string value in blocks of 4K
-        for byte_block in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(byte_block)
-    return sha256_hash.hexdigest()
+        # file_digest reads into a large reusable buffer and
+        # releases the GIL while hashing, so threads hash in parallel.
+        return hashlib.file_digest(f, "sha256").hexdigest()
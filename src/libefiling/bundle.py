@@ -0,0 +1,179 @@
+"""Archives and procedure XMLs read from tar/zip bundles of many filings.
+
+each bundle is read once from the beginning to the end, so that it can be
+streamed from tape or object storage without unpacking it to disk.
+"""
+
+import hashlib
+import tarfile
+import time
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Callable, Iterator, NamedTuple
+
+from libefiling.archive.check import ARCHIVE_EXTENSIONS
+from libefiling.archive.extract import extract_archive_data
+from libefiling.manifest import Source, Sources
+from libefiling.parse import ParsedArchive
+from libefiling.xml.bibliography import BibliographyField
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+class BundleMember(NamedTuple):
+    name: str  # path in the bundle
+    data: bytes
+    sha256: str
+
+    @property
+    def filename(self) -> str:
+        return PurePosixPath(self.name).name
+
+    def source(self) -> Source:
+        return Source.from_bytes(self.filename, self.data, sha256=self.sha256)
+
+
+class BundlePair(NamedTuple):
+    archive: BundleMember
+    procedure: BundleMember
+
+    def parse(
+        self,
+        *,
+        bibliography_fields: tuple[BibliographyField, ...] | None = None,
+        unzip_workers: int = 1,
+    ) -> ParsedArchive:
+        """parse the archive in memory.
+
+        Args:
+            bibliography_fields (tuple[BibliographyField, ...] | None): fields
+                to collect into the bibliography section of the manifest.
+            unzip_workers (int): number of threads to decompress archive members.
+
+        Raises:
+            ValueError: when the archive format is unsupported
+        """
+        started = time.perf_counter()
+        archive = self.archive.source()
+        sources = Sources(
+            document_code=archive.get_document_code(),
+            archive=archive,
+            procedure=self.procedure.source(),
+        )
+        decompress_seconds: dict[str, float] = {}
+        raw_files = extract_archive_data(
+            self.archive.data, self.archive.name, unzip_workers, decompress_seconds
+        )
+        return ParsedArchive(
+            sources,
+            raw_files,
+            self.procedure.data,
+            bibliography_fields,
+            decompress_seconds,
+            started,
+        )
+
+
+def _is_archive(name: str) -> bool:
+    return PurePosixPath(name).suffix.lower() in ARCHIVE_EXTENSIONS
+
+
+def _is_procedure(name: str) -> bool:
+    return PurePosixPath(name).suffix.lower() == ".xml"
+
+
+def _pair_key(name: str) -> tuple[str, str]:
+    """archive and procedure XML of a filing differ only in the last
+    7 characters of their names, e.g. AAA.JWX and AFM.XML."""
+    path = PurePosixPath(name)
+    return str(path.parent), path.name[:-7]
+
+
+def _read_member(name: str, stream: BinaryIO) -> BundleMember:
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    while chunk := stream.read(_CHUNK_SIZE):
+        digest.update(chunk)
+        buffer += chunk
+    return BundleMember(name, bytes(buffer), digest.hexdigest())
+
+
+def iter_bundle_members(bundle: str | Path | BinaryIO) -> Iterator[BundleMember]:
+    """read archives and XMLs from a bundle in the order they are stored.
+
+    other members are skipped without being read.
+
+    Args:
+        bundle (str | Path | BinaryIO): path of a tar (optionally compressed)
+            or zip bundle, or a stream of a tar bundle such as stdin.
+
+    Yields:
+        BundleMember: member with its sha256 computed while it is read
+    """
+    if isinstance(bundle, (str, Path)) and zipfile.is_zipfile(bundle):
+        with zipfile.ZipFile(bundle) as zf:
+            ### local headers in file order, so that the zip is read sequentially
+            infos = sorted(zf.infolist(), key=lambda info: info.header_offset)
+            for info in infos:
+                if info.is_dir():
+                    continue
+                if not (_is_archive(info.filename) or _is_procedure(info.filename)):
+                    continue
+                with zf.open(info) as stream:
+                    yield _read_member(info.filename, stream)
+        return
+
+    if isinstance(bundle, (str, Path)):
+        tar = tarfile.open(bundle, mode="r|*")
+    else:
+        tar = tarfile.open(fileobj=bundle, mode="r|*")
+    with tar:
+        for info in tar:
+            if not info.isfile():
+                continue
+            if not (_is_archive(info.name) or _is_procedure(info.name)):
+                continue
+            stream = tar.extractfile(info)
+            if stream is not None:
+                yield _read_member(info.name, stream)
+
+
+def iter_bundle(
+    bundle: str | Path | BinaryIO,
+    on_unpaired: Callable[[BundleMember], None] | None = None,
+) -> Iterator[BundlePair]:
+    """pair archives with their procedure XMLs while reading a bundle.
+
+    a member is kept in memory only until its counterpart is read.
+
+    Args:
+        bundle (str | Path | BinaryIO): path of a tar or zip bundle,
+            or a stream of a tar bundle.
+        on_unpaired (Callable[[BundleMember], None] | None): called at the end
+            of the bundle with each member left without its counterpart.
+
+    Yields:
+        BundlePair: archive and procedure XML of a filing
+    """
+    archives: dict[tuple[str, str], list[BundleMember]] = {}
+    procedures: dict[tuple[str, str], list[BundleMember]] = {}
+    for member in iter_bundle_members(bundle):
+        key = _pair_key(member.name)
+        if _is_archive(member.name):
+            pending, partners = archives, procedures
+        else:
+            pending, partners = procedures, archives
+        waiting = partners.get(key)
+        if not waiting:
+            pending.setdefault(key, []).append(member)
+            continue
+        partner = waiting.pop(0)
+        if pending is archives:
+            yield BundlePair(member, partner)
+        else:
+            yield BundlePair(partner, member)
+
+    if on_unpaired is not None:
+        for members in (*archives.values(), *procedures.values()):
+            for member in members:
+                on_unpaired(member)
@@ -1,33 +1,190 @@
+import codecs
+import io
+import re
 import xml.etree.ElementTree as ET
 from pathlib import Path
+from typing import Callable, Optional
+from xml.parsers import expat
+
+from libefiling.manifest import EncodingInfo
 
 ET.register_namespace("jp", "http://www.jpo.go.jp")
 
+_XML_DECLARATION = re.compile(
+    rb"<\?xml[^>]*?\sencoding\s*=\s*[\"']([A-Za-z][A-Za-z0-9._-]*)[\"']"
+)
 
-def convert_xml_charset(
-    src_xml_path: str,
-    dst_xml_path: str,
-    from_encoding: str = "shift_jis",
+# labels of Shift_JIS and its Windows superset.
+# インターネット出願ソフト用XMLは Shift_JIS と宣言されていても ① などの
+# cp932 拡張文字を含むので、cp932 でデコードする。
+_SHIFT_JIS_LABELS = {
+    "shift_jis",
+    "shift-jis",
+    "sjis",
+    "s_jis",
+    "x-sjis",
+    "ms_kanji",
+    "csshiftjis",
+    "windows-31j",
+    "cp932",
+    "ms932",
+}
+
+
+def _normalize_label(label: str) -> str:
+    label = label.lower()
+    if label in _SHIFT_JIS_LABELS:
+        return "cp932"
+    try:
+        return codecs.lookup(label).name
+    except LookupError:
+        return label
+
+
+def sniff_encoding(data: bytes, default: str = "cp932") -> EncodingInfo:
+    """detect encoding of xml data from BOM, XML declaration,
+    an ASCII-only scan and a strict UTF-8 check.
+
+    Args:
+        data (bytes): xml data.
+        default (str): encoding assumed when nothing tells the encoding
+            and the data is neither pure ASCII nor valid UTF-8.
+
+    Returns:
+        EncodingInfo: detected is a Python codec name such as cp932, utf-8 or ascii.
+    """
+    if data.startswith(codecs.BOM_UTF8):
+        return EncodingInfo(detected="utf-8", had_bom=True)
+    if data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return EncodingInfo(detected="utf-16", had_bom=True)
+    match = _XML_DECLARATION.match(data, 0, 256)
+    if match is not None:
+        label = match.group(1).decode("ascii")
+        return EncodingInfo(detected=_normalize_label(label))
+    if data.isascii():
+        return EncodingInfo(detected="ascii")
+    ### XML without declaration is UTF-8 by the XML specification.
+    ### cp932 text is hardly ever valid UTF-8, so check it before the default.
+    try:
+        data.decode("utf-8")
+    except UnicodeDecodeError:
+        return EncodingInfo(detected=default)
+    return EncodingInfo(detected="utf-8")
+
+
+def _declare_utf8(data: bytes) -> bytes:
+    """rewrite the encoding of the XML declaration to UTF-8 if it says otherwise."""
+    match = _XML_DECLARATION.match(data, 0, 256)
+    if match is None or _normalize_label(match.group(1).decode("ascii")) == "utf-8":
+        return data
+    return data[: match.start(1)] + b"UTF-8" + data[match.end(1) :]
+
+
+def convert_xml_bytes(
+    data: bytes,
+    from_encoding: Optional[str] = None,
     to_encoding: str = "utf-8",
-):
-    """convert charset of a set of xml files and replace header.
+    on_parsed: Optional[Callable[[ET.Element], None]] = None,
+    name: str = "<bytes>",
+) -> tuple[bytes, EncodingInfo]:
+    """convert charset of xml data and replace header.
+
+    data which is already UTF-8 (or pure ASCII) is not decoded nor
+    re-serialized when converting to UTF-8. it is only checked to be
+    well-formed, and its XML declaration is patched if it names
+    another encoding.
 
     Args:
-        src_xml_path (str): path to file to be converted.
-        dst_xml_path (str): path to file to be stored.
+        data (bytes): xml data to be converted.
+        from_encoding (str | None): encoding of data. detected by
+            sniff_encoding when None.
+        to_encoding (str): encoding to convert to.
+        on_parsed (Callable[[ET.Element], None] | None): called with the root
+            element after parsing, to reuse the tree without parsing again.
+        name (str): name of the data used in error messages.
+
+    Returns:
+        tuple[bytes, EncodingInfo]: converted xml data and its encoding information.
     """
     ### インターネット出願ソフト用XMLはShift_JISでエンコードされている。
     ### これをUTF-8に変換する。
-    src_path = Path(src_xml_path)
-    dst_path = Path(dst_xml_path)
+    if from_encoding is None:
+        info = sniff_encoding(data)
+    else:
+        info = EncodingInfo(
+            detected=from_encoding, had_bom=data.startswith(codecs.BOM_UTF8)
+        )
+    info.normalized_to = to_encoding.upper()
+
+    if codecs.lookup(to_encoding).name == "utf-8" and (
+        info.detected in ("utf-8", "ascii") or data.isascii()
+    ):
+        body = data[len(codecs.BOM_UTF8) :] if info.had_bom else data
+        converted = _declare_utf8(body)
+        _check_well_formed(converted, on_parsed, name)
+        return converted, info
+
     try:
-        xml_text = src_path.read_text(encoding=from_encoding)
+        xml_text = data.decode(info.detected or "cp932")
         root = ET.fromstring(xml_text)
+        if on_parsed is not None:
+            on_parsed(root)
         tree = ET.ElementTree(root)
-        tree.write(dst_path, encoding=to_encoding, xml_declaration=True)
-    except UnicodeDecodeError as exc:
+        buffer = io.BytesIO()
+        tree.write(buffer, encoding=to_encoding, xml_declaration=True)
+        return buffer.getvalue(), info
+    except (UnicodeDecodeError, LookupError) as exc:
         raise ValueError(
-            f"Failed to decode XML with encoding '{from_encoding}': {src_path}"
+            f"Failed to decode XML with encoding '{info.detected}': {name}"
         ) from exc
     except ET.ParseError as exc:
-        raise ValueError(f"Invalid XML format: {src_path}") from exc
+        raise ValueError(f"Invalid XML format: {name}") from exc
+
+
+def _check_well_formed(
+    data: bytes,
+    on_parsed: Optional[Callable[[ET.Element], None]],
+    name: str,
+) -> None:
+    """parse UTF-8 xml data without building a tree,
+    or with a tree only when on_parsed needs it."""
+    try:
+        if on_parsed is not None:
+            on_parsed(ET.fromstring(data))
+        else:
+            expat.ParserCreate().Parse(data, True)
+    except (ET.ParseError, expat.ExpatError) as exc:
+        raise ValueError(f"Invalid XML format: {name}") from exc
+
+
+def convert_xml_charset(
+    src_xml_path: str,
+    dst_xml_path: str,
+    from_encoding: Optional[str] = None,
+    to_encoding: str = "utf-8",
+    on_parsed: Optional[Callable[[ET.Element], None]] = None,
+) -> EncodingInfo:
+    """convert charset of a set of xml files and replace header.
+
+    Args:
+        src_xml_path (str): path to file to be converted.
+        dst_xml_path (str): path to file to be stored.
+        from_encoding (str | None): encoding of the file, detected when None.
+        on_parsed (Callable[[ET.Element], None] | None): called with the root
+            element after parsing, to reuse the tree without parsing again.
+
+    Returns:
+        EncodingInfo: encoding information of the file.
+    """
+    src_path = Path(src_xml_path)
+    dst_path = Path(dst_xml_path)
+    converted, info = convert_xml_bytes(
+        src_path.read_bytes(),
+        from_encoding,
+        to_encoding,
+        on_parsed=on_parsed,
+        name=str(src_path),
+    )
+    with dst_path.open("wb") as f:
+        f.write(converted)
+    return info
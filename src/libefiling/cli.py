@@ -1,11 +1,47 @@
 import argparse
+import contextlib
+import io
+import json
+import signal
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from importlib.metadata import version
+from pathlib import Path, PurePosixPath
+from typing import get_args
+from xml.etree.ElementTree import ParseError
 
-from libefiling import parse_archive
+from libefiling import ParsedArchive, verify_output
+from libefiling.archive.check import check_archives, find_archives
+from libefiling.bundle import BundleMember, iter_bundle
+from libefiling.layout import LAYOUT_SCHEME, OutputLayout
+from libefiling.manifest import Manifest
+from libefiling.profiling import Profiler
+from libefiling.server import serve, submit
+from libefiling.sink import DURABILITY, Sink, open_sink
+from libefiling.stats import collect_stats
+from libefiling.verify import VerifyReport
+from libefiling.xml.bibliography import DEFAULT_BIBLIOGRAPHY_FIELDS
+from libefiling.xml.text import write_text_jsonl
 
 
-def main():
-    parser = argparse.ArgumentParser(description="Test Archive Parsing")
+def main(argv: list[str] | None = None):
+    """entry point of the libefiling command.
+
+    `libefiling ARCHIVE PROCEDURE OUT_DIR` parses an archive,
+    `libefiling COMMAND ...` runs one of the commands below.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+    return parse_main(argv)
+
+
+def parse_main(argv: list[str]):
+    parser = argparse.ArgumentParser(
+        prog="libefiling",
+        description="Test Archive Parsing",
+        epilog=f"other commands: {', '.join(COMMANDS)}",
+    )
     parser.add_argument(
         "archive",
         type=str,
@@ -19,15 +55,591 @@ def main():
     parser.add_argument(
         "out_dir",
         type=str,
-        help="Output directory for parsed files",
+        help="Output directory or s3://bucket/prefix for parsed files, "
+        "the root of the layout with --layout",
     )
+    _add_output_arguments(parser)
+    _add_layout_arguments(parser, default=None)
+    _add_s3_arguments(parser)
     parser.add_argument(
         "--version", action="version", version=f"%(prog)s {version('libefiling')}"
     )
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+
+    options = _output_options(args)
+    layout = _layout(parser, args) if args.layout is not None else None
+    root = _open_sink(parser, args, args.out_dir, options)
+    profiler = _start_profiler(options.pop("profile"))
+    try:
+        with root:
+            parsed = ParsedArchive.create(
+                args.archive, args.procedure, **_parse_options(options)
+            )
+            if layout is None:
+                parsed.write_to(root, profiler=profiler, **options)
+                return
+            relpath = layout.relative_path(parsed.sources.archive)
+            parsed.write_to(root.child(relpath), profiler=profiler, **options)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+    print(_join(args.out_dir, relpath))
+
+
+def _add_output_arguments(parser: argparse.ArgumentParser) -> None:
+    """options of the outputs shared by parse and bundle."""
+    parser.add_argument(
+        "--image-derivatives",
+        action="store_true",
+        help="convert images to WebP and thumbnails (requires Pillow)",
+    )
+    parser.add_argument(
+        "--image-cache",
+        type=str,
+        default=None,
+        help="directory to cache image derivatives by sha256",
+    )
+    parser.add_argument(
+        "--bibliography",
+        action="store_true",
+        help="collect bibliographic keys into the manifest",
+    )
+    parser.add_argument(
+        "--text-jsonl",
+        action="store_true",
+        help="write text of converted XMLs to text.jsonl",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="rewrite only changed outputs and write changes.json",
+    )
+    parser.add_argument(
+        "--unzip-workers",
+        type=int,
+        default=1,
+        help="number of threads to decompress archive members",
+    )
+    parser.add_argument(
+        "--durability",
+        choices=get_args(DURABILITY),
+        default="fast",
+        help="fast: no fsync, batch: fsync once and publish the directory "
+        "atomically, strict: fsync every file",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="write cProfile, tracemalloc and per-member cost reports "
+        "next to manifest.json",
+    )
+
+
+def _output_options(args: argparse.Namespace) -> dict:
+    """keyword arguments of parse_archive from the options above."""
+    return {
+        "image_derivatives": args.image_derivatives,
+        "image_cache_dir": args.image_cache,
+        "bibliography_fields": (
+            DEFAULT_BIBLIOGRAPHY_FIELDS if args.bibliography else None
+        ),
+        "text_jsonl": args.text_jsonl,
+        "incremental": args.incremental,
+        "unzip_workers": args.unzip_workers,
+        "durability": args.durability,
+        "profile": args.profile,
+    }
+
+
+def _start_profiler(profile: bool) -> Profiler | None:
+    """profiler of a run with --profile, in the parse phase."""
+    if not profile:
+        return None
+    profiler = Profiler()
+    profiler.phase("parse")
+    return profiler
+
+
+def _add_s3_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--s3-endpoint-url",
+        type=str,
+        default=None,
+        help="endpoint of an S3 compatible storage for s3:// outputs",
+    )
+
+
+def _open_sink(
+    parser: argparse.ArgumentParser,
+    args: argparse.Namespace,
+    location: str,
+    options: dict,
+) -> Sink:
+    """sink of location, popping durability out of _output_options."""
+    s3_options = {}
+    if args.s3_endpoint_url is not None:
+        s3_options["endpoint_url"] = args.s3_endpoint_url
+    try:
+        return open_sink(location, options.pop("durability"), **s3_options)
+    except (ValueError, ImportError) as exc:
+        parser.error(str(exc))
+
+
+def _join(location: str, relpath: PurePosixPath) -> str:
+    return f"{location.rstrip('/')}/{relpath}"
+
+
+def _parse_options(options: dict) -> dict:
+    """pop the options of parsing in memory out of _output_options,
+    leaving the ones of ParsedArchive.write_to."""
+    return {
+        "bibliography_fields": options.pop("bibliography_fields"),
+        "unzip_workers": options.pop("unzip_workers"),
+    }
+
+
+def _add_layout_arguments(parser: argparse.ArgumentParser, default: str | None) -> None:
+    parser.add_argument(
+        "--layout",
+        choices=get_args(LAYOUT_SCHEME),
+        default=default,
+        help="directory layout under the root: flat (archive name), "
+        "sha256 (ab/cd/<sha256>) or document (code/yyyy/mm/dd/ab/cd/<name>)",
+    )
+    parser.add_argument(
+        "--fanout-depth",
+        type=int,
+        default=2,
+        help="levels of fan-out directories of the sha256 and document layouts",
+    )
+    parser.add_argument(
+        "--fanout-width",
+        type=int,
+        default=2,
+        help="hex digits per fan-out directory",
+    )
+
+
+def _layout(parser: argparse.ArgumentParser, args: argparse.Namespace) -> OutputLayout:
+    try:
+        return OutputLayout(
+            scheme=args.layout, depth=args.fanout_depth, width=args.fanout_width
+        )
+    except ValueError as exc:  # pydantic.ValidationError
+        parser.error(f"invalid fan-out: {exc.errors()[0]['msg']}")
+
+
+def bundle_main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="libefiling bundle",
+        description="Parse every filing in tar/zip bundles without unpacking them",
+    )
+    parser.add_argument(
+        "bundles",
+        type=str,
+        nargs="+",
+        help="tar or zip bundles of archives and procedure XMLs, "
+        "'-' for a tar on stdin",
+    )
+    parser.add_argument(
+        "out_root",
+        type=str,
+        help="root of the layout to create an output directory per archive in",
+    )
+    _add_output_arguments(parser)
+    _add_layout_arguments(parser, default="flat")
+    _add_s3_arguments(parser)
+    args = parser.parse_args(argv)
+
+    options = _output_options(args)
+    parse_options = _parse_options(options)
+    profile = options.pop("profile")
+    layout = _layout(parser, args)
+    root = _open_sink(parser, args, args.out_root, options)
+    parsed = failed = 0
+
+    def on_unpaired(member: BundleMember) -> None:
+        nonlocal failed
+        failed += 1
+        print(f"NG {member.name}: no counterpart in the bundle", file=sys.stderr)
+
+    ### one process pool converts the images of all the filings
+    image_executor = ProcessPoolExecutor() if args.image_derivatives else None
+    with root, image_executor or contextlib.nullcontext():
+        for bundle in args.bundles:
+            source = sys.stdin.buffer if bundle == "-" else bundle
+            for pair in iter_bundle(source, on_unpaired):
+                profiler = _start_profiler(profile)
+                ### a broken filing must not stop the rest of the bundle
+                try:
+                    relpath = layout.relative_path(pair.archive.source())
+                    pair.parse(**parse_options).write_to(
+                        root.child(relpath),
+                        profiler=profiler,
+                        image_executor=image_executor,
+                        **options,
+                    )
+                except Exception as exc:
+                    failed += 1
+                    print(f"NG {pair.archive.name}: {exc}", file=sys.stderr)
+                    continue
+                finally:
+                    if profiler is not None:
+                        profiler.stop()
+                parsed += 1
+                print(f"OK {pair.archive.name} -> {_join(args.out_root, relpath)}")
+    print(f"parsed={parsed} failed={failed}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def text_main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="libefiling text",
+        description="Write text of converted XMLs as JSON Lines",
+    )
+    parser.add_argument(
+        "out_dirs",
+        type=str,
+        nargs="+",
+        help="output directories of parse_archive",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default="-",
+        help="JSON Lines file to write, '-' for stdout",
+    )
+    args = parser.parse_args(argv)
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    failed = 0
+    try:
+        for out_dir in args.out_dirs:
+            ### records of a directory failing halfway are not written
+            buffer = io.StringIO()
+            try:
+                manifest = Manifest.load_json(Path(out_dir) / "manifest.json")
+                write_text_jsonl(manifest, out_dir, buffer)
+            except (OSError, ValueError, ParseError) as exc:  # pydantic errors
+                failed += 1
+                print(f"NG {out_dir}: {exc}", file=sys.stderr)
+                continue
+            out.write(buffer.getvalue())
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 1 if failed else 0
+
+
+def verify_main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="libefiling verify",
+        description="Verify output directories against their manifest.json",
+    )
+    parser.add_argument(
+        "out_dirs",
+        type=str,
+        nargs="+",
+        help="output directories of parse_archive",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="trust files whose size and mtime are unchanged since the last run",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="number of hashing threads",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="print one JSON report per directory",
+    )
+    args = parser.parse_args(argv)
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        for out_dir in args.out_dirs:
+            try:
+                report = verify_output(
+                    out_dir, incremental=args.incremental, executor=executor
+                )
+            except (OSError, ValueError) as exc:  # ValueError: pydantic
+                error = f"{type(exc).__name__}: {exc}"
+                report = VerifyReport(root=str(Path(out_dir)), error=error)
+            failed += not report.ok
+            if args.json:
+                print(report.model_dump_json())
+                continue
+            if report.error is not None:
+                ### first line only, pydantic errors span many lines
+                print(f"NG {report.root}: {report.error.splitlines()[0]}")
+                continue
+            print(
+                f"{'OK' if report.ok else 'NG'} {report.root}: "
+                f"checked={report.checked} trusted={report.trusted} "
+                f"missing={len(report.missing)} extra={len(report.extra)} "
+                f"mismatched={len(report.mismatched)}"
+            )
+            for label, relpaths in (
+                ("missing", report.missing),
+                ("extra", report.extra),
+                ("mismatched", report.mismatched),
+            ):
+                for relpath in relpaths:
+                    print(f"  {label}: {relpath}")
+    return 1 if failed else 0
+
+
+def check_main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="libefiling check",
+        description="Check integrity of archives without extracting them",
+    )
+    parser.add_argument(
+        "paths",
+        type=str,
+        nargs="+",
+        help="archive files, or directories to search for archives",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="number of worker processes",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default="-",
+        help="JSON Lines report to write, '-' for stdout",
+    )
+    args = parser.parse_args(argv)
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    checked = failed = 0
+    try:
+        for result in check_archives(find_archives(args.paths), args.jobs):
+            checked += 1
+            failed += not result.ok
+            out.write(result.model_dump_json())
+            out.write("\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"checked={checked} failed={failed}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def stats_main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="libefiling stats",
+        description="Aggregate statistics of the manifests under output directories",
+    )
+    parser.add_argument(
+        "roots",
+        type=str,
+        nargs="+",
+        help="output directories, or roots of layouts to search for manifest.json",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="number of worker processes",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default="-",
+        help="report to write, '-' for stdout",
+    )
+    parser.add_argument(
+        "--csv",
+        action="store_true",
+        help="write the report as CSV instead of JSON",
+    )
+    args = parser.parse_args(argv)
+
+    stats = collect_stats(args.roots, args.jobs)
+    out = (
+        sys.stdout
+        if args.output == "-"
+        else open(args.output, "w", encoding="utf-8", newline="")
+    )
+    try:
+        if args.csv:
+            stats.write_csv(out)
+        else:
+            json.dump(stats.result(), out, indent=4, ensure_ascii=False)
+            out.write("\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"manifests={stats.manifests} errors={stats.errors}", file=sys.stderr)
+    return 1 if stats.errors else 0
 
-    parse_archive(
-        args.archive,
-        args.procedure,
-        args.out_dir,
+
+def locate_main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="libefiling locate",
+        description="Print output directories of archives in a layout without scanning",
+    )
+    parser.add_argument(
+        "root",
+        type=str,
+        help="root of the layout",
+    )
+    parser.add_argument(
+        "keys",
+        type=str,
+        nargs="+",
+        help="archive sha256 for the sha256 layout, archive names for the others",
     )
+    _add_layout_arguments(parser, default="sha256")
+    args = parser.parse_args(argv)
+
+    layout = _layout(parser, args)
+    failed = 0
+    for key in args.keys:
+        try:
+            print(layout.resolve(args.root, key))
+        except ValueError as exc:
+            failed += 1
+            print(f"{key}: {exc}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def serve_main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="libefiling serve",
+        description="Serve parse, inspect and verify jobs on a Unix domain socket",
+    )
+    parser.add_argument(
+        "socket",
+        type=str,
+        help="path of the Unix domain socket",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=None,
+        help="number of worker processes, which run jobs at once",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="seconds after which a job is killed",
+    )
+    args = parser.parse_args(argv)
+
+    ### stop on SIGTERM as on Ctrl-C, so that the socket is removed
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        serve(args.socket, args.workers, args.timeout)
+    except KeyboardInterrupt:
+        pass
+    except RuntimeError as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    return 0
+
+
+def submit_main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="libefiling submit",
+        description="Submit a job to 'libefiling serve' and print the JSON response",
+    )
+    parser.add_argument(
+        "socket",
+        type=str,
+        help="path of the Unix domain socket",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="seconds after which the job is killed",
+    )
+    ops = parser.add_subparsers(dest="op", required=True)
+    parse_parser = ops.add_parser("parse", help="parse an archive to a directory")
+    parse_parser.add_argument("archive", type=str, help="src archive path")
+    parse_parser.add_argument("procedure", type=str, help="procedure file path")
+    parse_parser.add_argument(
+        "out_dir", type=str, help="Output directory for parsed files"
+    )
+    _add_output_arguments(parse_parser)
+    inspect_parser = ops.add_parser(
+        "inspect", help="parse an archive in memory and print its manifest"
+    )
+    inspect_parser.add_argument("archive", type=str, help="src archive path")
+    inspect_parser.add_argument("procedure", type=str, help="procedure file path")
+    inspect_parser.add_argument(
+        "--bibliography",
+        action="store_true",
+        help="collect bibliographic keys into the manifest",
+    )
+    verify_parser = ops.add_parser(
+        "verify", help="verify an output directory against its manifest.json"
+    )
+    verify_parser.add_argument(
+        "out_dir", type=str, help="output directory of parse_archive"
+    )
+    verify_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="trust files whose size and mtime are unchanged since the last run",
+    )
+    args = parser.parse_args(argv)
+
+    ### the server has its own working directory
+    job: dict = {"op": args.op}
+    for key in ("archive", "procedure", "out_dir"):
+        if key in args:
+            job[key] = str(Path(getattr(args, key)).resolve())
+    if args.op == "parse":
+        job["options"] = {
+            "image_derivatives": args.image_derivatives,
+            "image_cache_dir": (
+                str(Path(args.image_cache).resolve()) if args.image_cache else None
+            ),
+            "bibliography": args.bibliography,
+            "text_jsonl": args.text_jsonl,
+            "incremental": args.incremental,
+            "unzip_workers": args.unzip_workers,
+            "durability": args.durability,
+            "profile": args.profile,
+        }
+    elif args.op == "inspect":
+        job["options"] = {"bibliography": args.bibliography}
+    else:
+        job["incremental"] = args.incremental
+    if args.timeout is not None:
+        job["timeout"] = args.timeout
+
+    response = submit(args.socket, job)
+    print(json.dumps(response, ensure_ascii=False))
+    return 0 if response.get("ok") else 1
+
+
+COMMANDS = {
+    "bundle": bundle_main,
+    "text": text_main,
+    "verify": verify_main,
+    "check": check_main,
+    "locate": locate_main,
+    "stats": stats_main,
+    "serve": serve_main,
+    "submit": submit_main,
+}
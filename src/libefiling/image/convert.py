@@ -0,0 +1,223 @@
+"""WebP and thumbnail derivatives of the original images.
+
+Pillow is an optional dependency: ``pip install libefiling[image]``.
+"""
+
+import hashlib
+import io
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from typing import Mapping
+
+from libefiling.image.header import read_webp_size
+from libefiling.image.kind import DERIVATIVE_KIND
+from libefiling.image.mediatype import get_media_type
+from libefiling.manifest import ImageDerivative, ImageEntry
+from libefiling.writer import OutputWriter
+
+DEFAULT_THUMBNAIL_SIZE = (256, 256)
+
+# (kind, encoded data, width, height)
+_Rendered = tuple[DERIVATIVE_KIND, bytes, int, int]
+
+
+def _require_pillow() -> None:
+    try:
+        import PIL  # noqa: F401
+    except ImportError as exc:
+        raise ImportError(
+            "image derivatives require Pillow: pip install libefiling[image]"
+        ) from exc
+
+
+def _render(src: str | bytes, thumbnail_size: tuple[int, int]) -> list[_Rendered]:
+    """decode the first page of an image and encode it as WebP and thumbnail.
+
+    runs in a worker process, so it takes a path rather than the image data
+    when the original is on disk.
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(src) if isinstance(src, bytes) else src) as image:
+        image.seek(0)
+        # bilevel drawings are stored losslessly as grayscale,
+        # WebP has no 1-bit mode.
+        if image.mode not in ("L", "RGB", "RGBA"):
+            image = image.convert("L" if image.mode == "1" else "RGB")
+        else:
+            image.load()
+
+        full = io.BytesIO()
+        image.save(full, "WEBP", lossless=True, method=4)
+
+        thumb = image.copy()
+        thumb.thumbnail(thumbnail_size)
+        small = io.BytesIO()
+        thumb.save(small, "WEBP", quality=80)
+
+        return [
+            ("webp", full.getvalue(), image.width, image.height),
+            ("thumbnail", small.getvalue(), thumb.width, thumb.height),
+        ]
+
+
+def _render_timed(
+    src: str | bytes, thumbnail_size: tuple[int, int]
+) -> tuple[list[_Rendered], float]:
+    """_render, and the seconds it took in the worker process."""
+    start = time.perf_counter()
+    rendered = _render(src, thumbnail_size)
+    return rendered, time.perf_counter() - start
+
+
+def _cache_path(
+    cache_dir: Path, sha256: str, kind: DERIVATIVE_KIND, size: tuple[int, int]
+) -> Path:
+    suffix = "" if kind == "webp" else f"-thumb{size[0]}x{size[1]}"
+    return cache_dir / sha256[:2] / f"{sha256}{suffix}.webp"
+
+
+def _read_cache(
+    cache_dir: Path, sha256: str, size: tuple[int, int]
+) -> list[_Rendered] | None:
+    rendered: list[_Rendered] = []
+    for kind in ("webp", "thumbnail"):
+        path = _cache_path(cache_dir, sha256, kind, size)
+        if not path.exists():
+            return None
+        data = path.read_bytes()
+        width, height = read_webp_size(data)
+        rendered.append((kind, data, width, height))
+    return rendered
+
+
+def _write_cache(
+    cache_dir: Path, sha256: str, size: tuple[int, int], rendered: list[_Rendered]
+) -> None:
+    for kind, data, _, _ in rendered:
+        path = _cache_path(cache_dir, sha256, kind, size)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary name first so concurrent runs sharing
+        # the cache never see a partially written file.
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+
+
+def derivative_filename(image_name: str, kind: DERIVATIVE_KIND) -> str:
+    """return the filename of a derivative of image_name.
+
+    the extension of the original is kept, so that foo.tif and foo.jpg in
+    an archive have derivatives of their own.
+
+    Args:
+        image_name (str): original image filename, e.g. JPOXMLDOC01-appb-D000001.tif
+        kind (DERIVATIVE_KIND): derivative kind
+
+    Returns:
+        str: e.g. JPOXMLDOC01-appb-D000001.tif.webp,
+            JPOXMLDOC01-appb-D000001.tif.thumbnail.webp
+    """
+    name = Path(image_name).name
+    return f"{name}.webp" if kind == "webp" else f"{name}.{kind}.webp"
+
+
+def create_image_derivatives(
+    images: list[ImageEntry],
+    raw_dir: Path | None,
+    images_dir: Path,
+    cache_dir: Path | None = None,
+    thumbnail_size: tuple[int, int] = DEFAULT_THUMBNAIL_SIZE,
+    max_workers: int | None = None,
+    writer: OutputWriter | None = None,
+    originals: Mapping[str, bytes] | None = None,
+    convert_seconds: dict[str, float] | None = None,
+    executor: Executor | None = None,
+) -> list[ImageEntry]:
+    """convert original images to WebP and thumbnails, and save them to images_dir.
+
+    images with the same sha256 are converted only once. when cache_dir is given,
+    derivatives are also looked up in and stored to cache_dir by the sha256
+    of the original image, so that they are never converted again.
+
+    Args:
+        images (list[ImageEntry]): image entries collected from raw_dir
+        raw_dir (Path | None): directory of the original images
+        images_dir (Path): directory to save derivatives
+        cache_dir (Path | None): directory of the derivative cache
+        thumbnail_size (tuple[int, int]): bounding box of thumbnails
+        max_workers (int | None): number of worker processes of the pool
+            created when executor is None
+        writer (OutputWriter | None): writer of the derivatives
+        originals (Mapping[str, bytes] | None): original images by filename,
+            read instead of the files in raw_dir when given.
+        convert_seconds (dict[str, float] | None): updated with the seconds
+            spent converting each image, by filename. an image converted
+            once for many images with the same sha256 is counted once.
+        executor (Executor | None): process pool to share between many
+            archives, e.g. the filings of a bundle. left running.
+
+    Returns:
+        list[ImageEntry]: image entries with derivatives filled in
+    """
+    _require_pillow()
+    writer = writer or OutputWriter(images_dir)
+
+    rendered: dict[str, list[_Rendered]] = {}
+    pending: dict[str, str | bytes] = {}  # sha256 -> source path or data
+    pending_names: dict[str, str] = {}  # sha256 -> filename of the first image
+    for image in images:
+        if image.sha256 in rendered or image.sha256 in pending:
+            continue
+        cached = (
+            _read_cache(cache_dir, image.sha256, thumbnail_size)
+            if cache_dir is not None
+            else None
+        )
+        if cached is not None:
+            rendered[image.sha256] = cached
+        elif originals is not None:
+            pending[image.sha256] = originals[image.filename]
+        else:
+            pending[image.sha256] = str(raw_dir / image.filename)
+        if image.sha256 in pending:
+            pending_names[image.sha256] = image.filename
+
+    sizes = [thumbnail_size] * len(pending)
+    if len(pending) == 1 or (executor is None and max_workers == 1):
+        results = [_render_timed(path, thumbnail_size) for path in pending.values()]
+    elif executor is not None:
+        results = list(executor.map(_render_timed, pending.values(), sizes))
+    elif pending:
+        with ProcessPoolExecutor(max_workers=max_workers) as own_executor:
+            results = list(own_executor.map(_render_timed, pending.values(), sizes))
+    else:
+        results = []
+
+    for sha256, (result, seconds) in zip(pending.keys(), results, strict=True):
+        rendered[sha256] = result
+        if convert_seconds is not None:
+            convert_seconds[pending_names[sha256]] = seconds
+        if cache_dir is not None:
+            _write_cache(cache_dir, sha256, thumbnail_size, result)
+
+    updated = []
+    for image in images:
+        derivatives = []
+        for kind, data, width, height in rendered[image.sha256]:
+            filename = derivative_filename(image.filename, kind)
+            writer.write(images_dir / filename, data)
+            derivatives.append(
+                ImageDerivative(
+                    filename=filename,
+                    sha256=hashlib.sha256(data).hexdigest(),
+                    media_type=get_media_type(Path(filename).suffix),
+                    kind=kind,
+                    width=width,
+                    height=height,
+                )
+            )
+        updated.append(image.model_copy(update={"derivatives": derivatives}))
+    return updated
@@ -0,0 +1,207 @@
+"""Image metadata read from file headers only.
+
+TIFF IFDs, JPEG SOF/APP0 segments and WebP chunk headers are parsed
+without decoding any pixel data.
+"""
+
+import struct
+from typing import NamedTuple, Optional
+
+
+class ImageInfo(NamedTuple):
+    width: Optional[int] = None
+    height: Optional[int] = None
+    x_dpi: Optional[float] = None
+    y_dpi: Optional[float] = None
+    page_count: Optional[int] = None
+    compression: Optional[str] = None
+
+
+_TIFF_COMPRESSIONS = {
+    1: "none",
+    2: "ccitt-rle",
+    3: "ccitt-g3",
+    4: "ccitt-g4",
+    5: "lzw",
+    6: "ojpeg",
+    7: "jpeg",
+    8: "deflate",
+    32773: "packbits",
+    32946: "deflate",
+}
+
+_JPEG_COMPRESSIONS = {
+    0xC0: "jpeg-baseline",
+    0xC1: "jpeg-extended",
+    0xC2: "jpeg-progressive",
+    0xC3: "jpeg-lossless",
+    0xC5: "jpeg-differential",
+    0xC6: "jpeg-differential-progressive",
+    0xC7: "jpeg-differential-lossless",
+    0xC9: "jpeg-arithmetic",
+    0xCA: "jpeg-arithmetic-progressive",
+    0xCB: "jpeg-arithmetic-lossless",
+    0xCD: "jpeg-arithmetic-differential",
+    0xCE: "jpeg-arithmetic-differential-progressive",
+    0xCF: "jpeg-arithmetic-differential-lossless",
+}
+
+# TIFF field types and their sizes in bytes
+_TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 7: 1, 9: 4, 10: 8}
+
+# upper bound of IFDs to follow, guards against broken or cyclic chains
+_MAX_TIFF_PAGES = 10000
+
+
+def read_image_info(data: bytes | memoryview) -> ImageInfo:
+    """read image metadata from the header of TIFF, JPEG or WebP data.
+
+    Args:
+        data (bytes | memoryview): whole or leading part of the image file
+
+    Returns:
+        ImageInfo: image metadata. fields which can not be read are None.
+    """
+    head = bytes(data[:4])
+    try:
+        if head in (b"II*\x00", b"MM\x00*"):
+            return _read_tiff(data)
+        if head[:2] == b"\xff\xd8":
+            return _read_jpeg(data)
+        if head == b"RIFF" and bytes(data[8:12]) == b"WEBP":
+            width, height = read_webp_size(data)
+            return ImageInfo(
+                width=width, height=height, page_count=1, compression="webp"
+            )
+    except (struct.error, ValueError):
+        pass
+    return ImageInfo()
+
+
+def _read_tiff(data: bytes | memoryview) -> ImageInfo:
+    endian = "<" if bytes(data[:2]) == b"II" else ">"
+    entry = struct.Struct(endian + "HHLL")
+    (offset,) = struct.unpack_from(endian + "L", data, 4)
+
+    tags: dict[int, int | float] = {}
+    pages = 0
+    seen = set()
+    while offset and offset not in seen and pages < _MAX_TIFF_PAGES:
+        seen.add(offset)
+        (count,) = struct.unpack_from(endian + "H", data, offset)
+        if pages == 0:
+            for i in range(count):
+                pos = offset + 2 + i * 12
+                tag, type_, n, value = entry.unpack_from(data, pos)
+                if tag not in (256, 257, 259, 282, 283, 296) or n != 1:
+                    continue
+                tags[tag] = _tiff_value(data, endian, type_, pos + 8, value)
+        pages += 1
+        (offset,) = struct.unpack_from(endian + "L", data, offset + 2 + count * 12)
+
+    x_dpi = tags.get(282)
+    y_dpi = tags.get(283)
+    unit = tags.get(296, 2)
+    if unit == 3:  # centimeter
+        x_dpi = x_dpi * 2.54 if x_dpi is not None else None
+        y_dpi = y_dpi * 2.54 if y_dpi is not None else None
+    elif unit != 2:  # no absolute unit
+        x_dpi = y_dpi = None
+
+    compression = tags.get(259, 1)
+    return ImageInfo(
+        width=_int_or_none(tags.get(256)),
+        height=_int_or_none(tags.get(257)),
+        x_dpi=x_dpi,
+        y_dpi=y_dpi,
+        page_count=pages,
+        compression=_TIFF_COMPRESSIONS.get(int(compression), f"tiff-{compression}"),
+    )
+
+
+def _tiff_value(
+    data: bytes | memoryview, endian: str, type_: int, pos: int, value: int
+) -> int | float:
+    """decode a single-valued IFD entry whose value field starts at pos."""
+    if type_ == 3:  # SHORT, left-justified in the value field
+        return struct.unpack_from(endian + "H", data, pos)[0]
+    if type_ == 4:  # LONG
+        return value
+    if type_ == 5:  # RATIONAL, value is an offset
+        numerator, denominator = struct.unpack_from(endian + "LL", data, value)
+        return numerator / denominator if denominator else 0.0
+    if _TIFF_TYPE_SIZES.get(type_) == 1:
+        return struct.unpack_from("B", data, pos)[0]
+    return value
+
+
+def _int_or_none(value: int | float | None) -> Optional[int]:
+    return int(value) if value is not None else None
+
+
+def _read_jpeg(data: bytes | memoryview) -> ImageInfo:
+    x_dpi = y_dpi = None
+    pos = 2
+    size = len(data)
+    while pos + 4 <= size:
+        if data[pos] != 0xFF:
+            raise ValueError("corrupt JPEG marker")
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:  # no length
+            pos += 2
+            continue
+        if marker in (0xD9, 0xDA):  # EOI / SOS, no SOF before image data
+            break
+        (length,) = struct.unpack_from(">H", data, pos + 2)
+        segment = pos + 4
+        if marker == 0xE0 and bytes(data[segment : segment + 5]) == b"JFIF\x00":
+            unit, x_density, y_density = struct.unpack_from(">BHH", data, segment + 7)
+            if unit == 1:
+                x_dpi, y_dpi = float(x_density), float(y_density)
+            elif unit == 2:
+                x_dpi, y_dpi = x_density * 2.54, y_density * 2.54
+        elif marker in _JPEG_COMPRESSIONS:
+            height, width = struct.unpack_from(">HH", data, segment + 1)
+            return ImageInfo(
+                width=width,
+                height=height,
+                x_dpi=x_dpi,
+                y_dpi=y_dpi,
+                page_count=1,
+                compression=_JPEG_COMPRESSIONS[marker],
+            )
+        pos = segment + length - 2
+    return ImageInfo(x_dpi=x_dpi, y_dpi=y_dpi, page_count=1)
+
+
+def read_webp_size(data: bytes | memoryview) -> tuple[int, int]:
+    """read canvas size from a RIFF/WebP header.
+
+    Args:
+        data (bytes | memoryview): WebP data
+
+    Returns:
+        tuple[int, int]: width and height
+
+    Raises:
+        ValueError: if the data is not WebP or is cut before the size
+    """
+    chunk = bytes(data[12:16])
+    if len(data) < (25 if chunk == b"VP8L" else 30):
+        raise ValueError("truncated WebP header")
+    if chunk == b"VP8X":
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+    elif chunk == b"VP8L":
+        bits = int.from_bytes(data[21:25], "little")
+        width = (bits & 0x3FFF) + 1
+        height = ((bits >> 14) & 0x3FFF) + 1
+    elif chunk == b"VP8 ":
+        width = int.from_bytes(data[26:28], "little") & 0x3FFF
+        height = int.from_bytes(data[28:30], "little") & 0x3FFF
+    else:
+        raise ValueError("unsupported WebP data")
+    return width, height
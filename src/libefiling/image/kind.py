@@ -4,6 +4,7 @@ from typing import Literal
 IMAGE_KIND = Literal[
     "chemical-formulas", "figures", "equations", "tables", "other-images", "unknown"
 ]
+DERIVATIVE_KIND = Literal["webp", "thumbnail"]
 _OPTIONAL_EXTENSION = r"(?:\.[A-Za-z0-9]+)?"
 _KIND_RULES: tuple[tuple[IMAGE_KIND, re.Pattern[str]], ...] = (
     ("chemical-formulas", re.compile(rf".+-appb-C[0-9]+{_OPTIONAL_EXTENSION}")),
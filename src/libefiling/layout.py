@@ -0,0 +1,118 @@
+"""Output directories of many archives sharded under a single root.
+
+the location of an archive is computed from its name or sha256 alone,
+so that it can be found without scanning the root.
+"""
+
+import hashlib
+import re
+from pathlib import Path, PurePosixPath
+from typing import Literal
+
+from pydantic import BaseModel, Field, model_validator
+
+from libefiling.manifest import Source
+
+# flat: <archive stem>/
+# sha256: <fan-out of the archive sha256>/<archive sha256>/
+# document: <document code>/<yyyy>/<mm>/<dd>/
+#           <fan-out of the archive name>/<archive stem>/
+LAYOUT_SCHEME = Literal["flat", "sha256", "document"]
+
+_SHA256 = re.compile(r"[0-9a-f]{64}")
+
+
+class OutputLayout(BaseModel):
+    scheme: LAYOUT_SCHEME = "sha256"
+    depth: int = Field(default=2, ge=0, description="levels of fan-out directories")
+    width: int = Field(default=2, ge=1, description="hex digits per level")
+
+    @model_validator(mode="after")
+    def _check_fanout(self) -> "OutputLayout":
+        if self.depth * self.width > 64:
+            raise ValueError("depth * width must not exceed 64 hex digits")
+        return self
+
+    def _fanout(self, hex_digest: str) -> PurePosixPath:
+        return PurePosixPath(
+            *(
+                hex_digest[i * self.width : (i + 1) * self.width]
+                for i in range(self.depth)
+            )
+        )
+
+    def for_sha256(self, sha256: str) -> PurePosixPath:
+        """relative output directory of an archive by its sha256.
+
+        Args:
+            sha256 (str): sha256 of the archive in hex
+
+        Raises:
+            ValueError: when the scheme is not sha256 or sha256 is malformed
+        """
+        if self.scheme != "sha256":
+            raise ValueError(f"the {self.scheme} layout is resolved from archive names")
+        sha256 = sha256.lower()
+        if not _SHA256.fullmatch(sha256):
+            raise ValueError(f"not a sha256: {sha256}")
+        return self._fanout(sha256) / sha256
+
+    def for_archive_name(self, filename: str) -> PurePosixPath:
+        """relative output directory of an archive by its file name.
+
+        Args:
+            filename (str): archive file name, e.g.
+                202501010000123456_A163_____XXXXXXXXXX__99999999999_____AAA.JWX
+
+        Raises:
+            ValueError: when the scheme is sha256
+        """
+        filename = PurePosixPath(filename).name
+        stem = PurePosixPath(filename).stem
+        if self.scheme == "flat":
+            return PurePosixPath(stem)
+        if self.scheme != "document":
+            raise ValueError("the sha256 layout is resolved from archive sha256")
+        date = filename[:8]
+        if date.isdigit():
+            date_dir = PurePosixPath(date[:4], date[4:6], date[6:8])
+        else:
+            date_dir = PurePosixPath("UNKNOWN")
+        fanout = self._fanout(hashlib.sha256(filename.encode("utf-8")).hexdigest())
+        ### only the file name is known here, which is all the document code needs
+        document_code = Source.model_construct(filename=filename).get_document_code()
+        return PurePosixPath(document_code) / date_dir / fanout / stem
+
+    def relative_path(self, source: Source) -> PurePosixPath:
+        """relative output directory of an archive.
+
+        Args:
+            source (Source): the archive, e.g. ParsedArchive.sources.archive
+        """
+        if self.scheme == "sha256":
+            return self.for_sha256(source.sha256)
+        return self.for_archive_name(source.filename)
+
+    def resolve(self, root: str | Path, key: str) -> Path:
+        """output directory of an archive under root, without touching the disk.
+
+        Args:
+            root (str | Path): root of the layout
+            key (str): archive sha256 for the sha256 scheme,
+                archive file name for the others
+
+        Raises:
+            ValueError: when key does not suit the scheme
+        """
+        if self.scheme == "sha256":
+            return Path(root) / self.for_sha256(key)
+        return Path(root) / self.for_archive_name(key)
+
+    def output_dir(self, root: str | Path, source: Source) -> Path:
+        """output directory of an archive under root.
+
+        Args:
+            root (str | Path): root of the layout
+            source (Source): the archive
+        """
+        return Path(root) / self.relative_path(source)
@@ -1,17 +1,21 @@
 from __future__ import annotations
 
+import hashlib
 from datetime import datetime
 from importlib.metadata import version as get_version
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 from xml.etree import ElementTree as ET
 
 from pydantic import BaseModel, Field
 
 from libefiling.archive.utils import generate_sha256
-from libefiling.image.kind import IMAGE_KIND
+from libefiling.image.kind import DERIVATIVE_KIND, IMAGE_KIND
 from libefiling.xml.kind import XML_KIND
 
+# suffixes of original images, in the order they are listed in the manifest
+IMAGE_SUFFIXES = (".tif", ".tiff", ".jpg", ".jpeg")
+
 # -------------------------
 # Generator / Document
 # -------------------------
@@ -38,16 +42,36 @@ class Source(BaseModel):
         Args:
             file_path (str | Path): file path
         """
-        filename = Path(file_path).name
-        sha256 = generate_sha256(file_path)
-        byte_size = Path(file_path).stat().st_size
+        return cls._from_filename(
+            Path(file_path).name,
+            generate_sha256(file_path),
+            Path(file_path).stat().st_size,
+        )
+
+    @classmethod
+    def from_bytes(
+        cls, filename: str, data: bytes, sha256: Optional[str] = None
+    ) -> Source:
+        """Create Source from file name and content
+
+        Args:
+            filename (str): file name
+            data (bytes): content of the file
+            sha256 (str | None): sha256 of data if already computed
+        """
+        if sha256 is None:
+            sha256 = hashlib.sha256(data).hexdigest()
+        return cls._from_filename(filename, sha256, len(data))
+
+    @classmethod
+    def _from_filename(cls, filename: str, sha256: str, byte_size: int) -> Source:
         if len(filename) == 63:
             task = filename[56 : 56 + 1]
             kind_code = filename[57 : 57 + 2]
         else:
             task = "X"  # X means unknown
             kind_code = "XX"  # XX means unknown
-        extension = Path(file_path).suffix.upper()
+        extension = Path(filename).suffix.upper()
         return cls(
             filename=filename,
             sha256=sha256,
@@ -88,6 +112,27 @@ class Sources(BaseModel):
         document_code = archive.get_document_code()
         return cls(document_code=document_code, archive=archive, procedure=procedure)
 
+    @classmethod
+    def from_bytes(
+        cls,
+        archive_filename: str,
+        archive_data: bytes,
+        procedure_filename: str,
+        procedure_data: bytes,
+    ) -> Sources:
+        """Create Sources from archive and procedure file names and contents
+
+        Args:
+            archive_filename (str): archive file name
+            archive_data (bytes): content of the archive
+            procedure_filename (str): procedure file name
+            procedure_data (bytes): content of the procedure XML
+        """
+        archive = Source.from_bytes(archive_filename, archive_data)
+        procedure = Source.from_bytes(procedure_filename, procedure_data)
+        document_code = archive.get_document_code()
+        return cls(document_code=document_code, archive=archive, procedure=procedure)
+
     def save_as_xml(self, xml_path: str | Path) -> None:
         """Save Sources as XML file
 
@@ -122,6 +167,7 @@ class Paths(BaseModel):
     root: Path = Path(".")
     raw_dir: Path = Path("raw")
     xml_dir: Path = Path("xml")
+    images_dir: Optional[Path] = None
 
     @classmethod
     def create(cls, root: str | Path = ".") -> Paths:
@@ -143,15 +189,19 @@ class Paths(BaseModel):
             root=self.root.relative_to(base),
             raw_dir=self.raw_dir.relative_to(base),
             xml_dir=self.xml_dir.relative_to(base),
+            images_dir=(
+                self.images_dir.relative_to(base)
+                if self.images_dir is not None
+                else None
+            ),
         )
 
     def raw_images(self) -> List[Path]:
-        return (
-            list(self.raw_dir.glob("*.tif", case_sensitive=False))
-            + list(self.raw_dir.glob("*.tiff", case_sensitive=False))
-            + list(self.raw_dir.glob("*.jpg", case_sensitive=False))
-            + list(self.raw_dir.glob("*.jpeg", case_sensitive=False))
-        )
+        return [
+            path
+            for suffix in IMAGE_SUFFIXES
+            for path in sorted(self.raw_dir.glob(f"*{suffix}", case_sensitive=False))
+        ]
 
 
 # -------------------------
@@ -189,11 +239,29 @@ class XmlFile(BaseModel):
 # -------------------------
 
 
+class ImageDerivative(BaseModel):
+    filename: str
+    sha256: str
+    media_type: str = "image/webp"
+    kind: DERIVATIVE_KIND
+    width: int
+    height: int
+
+
 class ImageEntry(BaseModel):
     filename: str
     sha256: str
     media_type: str = "image/tiff"
     kind: IMAGE_KIND
+    byte_size: Optional[int] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    x_dpi: Optional[float] = None
+    y_dpi: Optional[float] = None
+    page_count: Optional[int] = None
+    compression: Optional[str] = None
+    derivatives: List[ImageDerivative] = Field(default_factory=list)
+
 
 # -------------------------
 # Stats
@@ -203,6 +271,9 @@ class ImageEntry(BaseModel):
 class Stats(BaseModel):
     xml_count: int
     image_original_count: int
+    # seconds from parsing the archive to writing the manifest,
+    # None if not written by parse_archive (or written by an older version)
+    processing_seconds: Optional[float] = None
 
     @staticmethod
     def _count_files_by_suffix(directory: Path, suffixes: set[str]) -> int:
@@ -217,14 +288,32 @@ class Stats(BaseModel):
     def create(cls, path: Paths) -> "Stats":
         xml_count = cls._count_files_by_suffix(path.xml_dir, {".xml"})
         image_original_count = cls._count_files_by_suffix(
-            path.raw_dir,
-            {".tif", ".tiff", ".jpg", ".jpeg"},
+            path.raw_dir, set(IMAGE_SUFFIXES)
         )
         return cls(
             xml_count=xml_count,
             image_original_count=image_original_count,
         )
 
+    @classmethod
+    def count(cls, xml_filenames: List[str], raw_filenames: List[str]) -> "Stats":
+        """count files by name, for outputs which are not on disk.
+
+        Args:
+            xml_filenames (List[str]): names of the converted XML files
+            raw_filenames (List[str]): names of the files extracted from the archive
+        """
+        return cls(
+            xml_count=sum(
+                1 for name in xml_filenames if Path(name).suffix.lower() == ".xml"
+            ),
+            image_original_count=sum(
+                1
+                for name in raw_filenames
+                if Path(name).suffix.lower() in IMAGE_SUFFIXES
+            ),
+        )
+
 
 # -------------------------
 # Manifest (root)
@@ -238,6 +327,7 @@ class Manifest(BaseModel):
     paths: Paths = Field(default_factory=Paths)
     xml_files: List[XmlFile] = Field(default_factory=list)
     images: List[ImageEntry] = Field(default_factory=list)
+    bibliography: Dict[str, List[str]] = Field(default_factory=dict)
     stats: Stats
 
     @classmethod
@@ -248,6 +338,7 @@ class Manifest(BaseModel):
         images: list[ImageEntry],
         paths: Paths,
         stats: Stats,
+        bibliography: Optional[dict[str, list[str]]] = None,
     ) -> Manifest:
         return cls(
             generator=GeneratorInfo(
@@ -259,10 +350,34 @@ class Manifest(BaseModel):
             paths=paths,
             xml_files=xml_files,
             images=images,
+            bibliography=bibliography or {},
             stats=stats,
         )
 
+    @classmethod
+    def load_json(cls, json_path: str | Path) -> Manifest:
+        """Load Manifest from manifest.json
+
+        Args:
+            json_path (str | Path): manifest.json path
+        """
+        with open(json_path, "r", encoding="utf-8") as f:
+            return cls.model_validate_json(f.read())
+
+    def is_equivalent(self, other: Manifest) -> bool:
+        """Return True if other differs from self only in the creation time
+        and the processing time
+
+        Args:
+            other (Manifest): manifest to compare with
+        """
+        exclude = {"generator": {"created_at"}, "stats": {"processing_seconds"}}
+        return self.model_dump(exclude=exclude) == other.model_dump(exclude=exclude)
+
+    def to_json(self) -> str:
+        return self.model_dump_json(indent=4, ensure_ascii=False)
+
     def save_as_json(self, json_path: str | Path) -> None:
         json_path = Path(json_path)
         with open(json_path, "w", encoding="utf-8") as f:
-            f.write(self.model_dump_json(indent=4, ensure_ascii=False))
+            f.write(self.to_json())
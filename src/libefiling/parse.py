@@ -1,10 +1,17 @@
+import hashlib
+import io
+import time
+from concurrent.futures import Executor
 from pathlib import Path
-from typing import Iterator
+from typing import Callable, Iterator
+from xml.etree import ElementTree as ET
 
-from libefiling.archive.utils import generate_sha256
-from libefiling.image.kind import detect_image_kind
+from libefiling.image.convert import create_image_derivatives
+from libefiling.image.header import read_image_info
+from libefiling.image.kind import IMAGE_KIND, detect_image_kind
 from libefiling.image.mediatype import get_media_type
 from libefiling.manifest import (
+    IMAGE_SUFFIXES,
     EncodingInfo,
     ImageEntry,
     Manifest,
@@ -13,69 +20,502 @@ from libefiling.manifest import (
     Stats,
     XmlFile,
 )
-from libefiling.xml.kind import detect_xml_kind
+from libefiling.profiling import MemberCost, MemberTimer, Profiler
+from libefiling.sink import DURABILITY, FileSystemSink, Sink
+from libefiling.verify import expected_files
+from libefiling.writer import OutputWriter
+from libefiling.xml.bibliography import BibliographyExtractor, BibliographyField
+from libefiling.xml.kind import XML_KIND, detect_xml_kind
+from libefiling.xml.text import write_text_jsonl
 
-from .archive.extract import extract_archive
-from .charset import convert_xml_charset
+from .archive.extract import extract_archive_data
+from .charset import convert_xml_bytes
+
+
+# name of the converted procedure XML in xml_dir
+PROCEDURE_XML_FILENAME = "procedure.xml"
 
 
 def parse_archive(
     src_archive_path: str,
     src_procedure_path: str,
-    output_dir: str,
-):
-    """parse e-filing archive and generate various outputs."""
-
-    if not Path(src_archive_path).exists():
-        raise FileNotFoundError(f"Source archive not found: {src_archive_path}")
-    if not Path(src_procedure_path).exists():
-        raise FileNotFoundError(f"Source procedure XML not found: {src_procedure_path}")
-    output_root = Path(output_dir)
-    if not output_root.exists():
-        output_root.mkdir(parents=True, exist_ok=True)
-
-    ### create output subdirectories
-    p = Paths.create(output_root)
-
-    ### extract archive to raw_dir
-    extracted_files = extract_archive(src_archive_path)
-    save_raw_files(extracted_files, p.raw_dir)
-
-    ### convert charset of extracted XML files to UTF-8 and save to xml_dir
-    raw_xml_files = p.raw_dir.glob("*.xml", case_sensitive=False)
-    xml_files = process_xml(raw_xml_files, p.xml_dir)
-
-    ### convert charset of procedure xml to UTF-8 and save to xml_dir
-    proc_xml_path = p.xml_dir / "procedure.xml"
-    xml_files.append(process_procedure_xml(Path(src_procedure_path), proc_xml_path))
-
-    ### collect image metadata from raw files
-    images = collect_image_entries(p.raw_images())
-
-    sources = Sources.create(src_archive_path, src_procedure_path)
-
-    ### calc stats
-    stats = Stats.create(p)
-
-    ### generate manifest
-    manifest = Manifest.create(
-        sources,
-        xml_files,
-        images,
-        p.relative_to(p.root),  # paths in manifest should be relative to root
-        stats,
-    )
-    manifest.save_as_json(p.root / "manifest.json")
+    output_dir: str | Path | Sink,
+    *,
+    image_derivatives: bool = False,
+    image_cache_dir: str | None = None,
+    bibliography_fields: tuple[BibliographyField, ...] | None = None,
+    text_jsonl: bool = False,
+    incremental: bool = False,
+    unzip_workers: int = 1,
+    durability: DURABILITY = "fast",
+    profile: bool = False,
+) -> Manifest:
+    """parse e-filing archive and generate various outputs.
+
+    Args:
+        src_archive_path (str): path of the archive
+        src_procedure_path (str): path of the procedure XML
+        output_dir (str | Path | Sink): output directory, or a sink to store
+            the files in
+        image_derivatives (bool): also convert images to WebP and thumbnails
+            and save them to images_dir.
+        image_cache_dir (str | None): directory to cache image derivatives
+            by the sha256 of the original images.
+        bibliography_fields (tuple[BibliographyField, ...] | None): fields to
+            collect into the bibliography section of the manifest while
+            converting XMLs, e.g. DEFAULT_BIBLIOGRAPHY_FIELDS.
+        text_jsonl (bool): also write text of the converted XMLs to
+            text.jsonl for search indexing.
+        incremental (bool): leave files byte-identical to the existing
+            outputs untouched, remove files no longer produced, and write
+            the change set to changes.json.
+        unzip_workers (int): number of threads to decompress archive members.
+        durability (DURABILITY): fast (no fsync), batch (publish a staging
+            directory fsynced once) or strict (fsync every file).
+        profile (bool): also write cProfile, tracemalloc and per-member cost
+            reports next to the manifest. see libefiling.profiling.
+
+    Returns:
+        Manifest: manifest saved to output_dir
+    """
+    profiler = Profiler() if profile else None
+    if profiler is not None:
+        profiler.phase("parse")
+    try:
+        parsed = ParsedArchive.create(
+            src_archive_path,
+            src_procedure_path,
+            bibliography_fields=bibliography_fields,
+            unzip_workers=unzip_workers,
+        )
+        return parsed.write_to(
+            output_dir,
+            image_derivatives=image_derivatives,
+            image_cache_dir=image_cache_dir,
+            text_jsonl=text_jsonl,
+            incremental=incremental,
+            durability=durability,
+            profiler=profiler,
+        )
+    finally:
+        if profiler is not None:
+            profiler.stop()
+
+
+class ParsedArchive:
+    """e-filing archive parsed in memory, without writing anything to disk.
+
+    XMLs are converted to UTF-8 when they are first accessed, and kept.
+    building the manifest converts all of them, since it lists their sha256.
+    """
+
+    def __init__(
+        self,
+        sources: Sources,
+        raw_files: list[tuple[str, bytes]],
+        procedure_data: bytes,
+        bibliography_fields: tuple[BibliographyField, ...] | None = None,
+        decompress_seconds: dict[str, float] | None = None,
+        started: float | None = None,
+    ):
+        """
+        Args:
+            sources (Sources): the archive and the procedure XML
+            raw_files (list[tuple[str, bytes]]): files extracted from the archive
+            procedure_data (bytes): content of the procedure XML
+            bibliography_fields (tuple[BibliographyField, ...] | None): fields
+                to collect into the bibliography section of the manifest.
+            decompress_seconds (dict[str, float] | None): seconds spent
+                decompressing each member, see extract_archive_data
+            started (float | None): time.perf_counter() when parsing started,
+                now when None. see Stats.processing_seconds.
+
+        Raises:
+            ValueError: when the archive has a member named procedure.xml,
+                which is the name of the converted procedure XML
+        """
+        if any(name == PROCEDURE_XML_FILENAME for name, _ in raw_files):
+            raise ValueError(
+                f"{sources.archive.filename}: member {PROCEDURE_XML_FILENAME} "
+                "collides with the converted procedure XML"
+            )
+        self._started = time.perf_counter() if started is None else started
+        self.sources = sources
+        self._raw_files = dict(raw_files)
+        self._timer = MemberTimer(decompress_seconds)
+        self._procedure_data = procedure_data
+        self._bibliography_fields = bibliography_fields
+        # filename -> (converted data, encoding, bibliography found in it)
+        self._converted: dict[
+            str, tuple[bytes, EncodingInfo, BibliographyExtractor | None]
+        ] = {}
+        self._manifest: Manifest | None = None
+
+    @classmethod
+    def create(
+        cls,
+        src_archive_path: str | Path,
+        src_procedure_path: str | Path,
+        *,
+        bibliography_fields: tuple[BibliographyField, ...] | None = None,
+        unzip_workers: int = 1,
+    ) -> "ParsedArchive":
+        """read the archive and the procedure XML, and parse them in memory.
+
+        Args:
+            src_archive_path (str | Path): path of the archive
+            src_procedure_path (str | Path): path of the procedure XML
+            bibliography_fields (tuple[BibliographyField, ...] | None): fields
+                to collect into the bibliography section of the manifest.
+            unzip_workers (int): number of threads to decompress archive members.
+        """
+        if not Path(src_archive_path).exists():
+            raise FileNotFoundError(f"Source archive not found: {src_archive_path}")
+        if not Path(src_procedure_path).exists():
+            raise FileNotFoundError(
+                f"Source procedure XML not found: {src_procedure_path}"
+            )
+        return cls.from_bytes(
+            Path(src_archive_path).name,
+            Path(src_archive_path).read_bytes(),
+            Path(src_procedure_path).name,
+            Path(src_procedure_path).read_bytes(),
+            bibliography_fields=bibliography_fields,
+            unzip_workers=unzip_workers,
+        )
+
+    @classmethod
+    def from_bytes(
+        cls,
+        archive_filename: str,
+        archive_data: bytes,
+        procedure_filename: str,
+        procedure_data: bytes,
+        *,
+        bibliography_fields: tuple[BibliographyField, ...] | None = None,
+        unzip_workers: int = 1,
+    ) -> "ParsedArchive":
+        """parse the archive and the procedure XML given as bytes.
+
+        Args:
+            archive_filename (str): file name of the archive
+            archive_data (bytes): content of the archive
+            procedure_filename (str): file name of the procedure XML
+            procedure_data (bytes): content of the procedure XML
+            bibliography_fields (tuple[BibliographyField, ...] | None): fields
+                to collect into the bibliography section of the manifest.
+            unzip_workers (int): number of threads to decompress archive members.
+        """
+        started = time.perf_counter()
+        sources = Sources.from_bytes(
+            archive_filename, archive_data, procedure_filename, procedure_data
+        )
+        decompress_seconds: dict[str, float] = {}
+        raw_files = extract_archive_data(
+            archive_data, archive_filename, unzip_workers, decompress_seconds
+        )
+        return cls(
+            sources,
+            raw_files,
+            procedure_data,
+            bibliography_fields,
+            decompress_seconds,
+            started,
+        )
+
+    @property
+    def raw_files(self) -> dict[str, bytes]:
+        """files extracted from the archive by filename."""
+        return self._raw_files
+
+    @property
+    def xml_filenames(self) -> list[str]:
+        """names of the converted XMLs, in the order of the manifest.
+
+        sorted, so that the manifest does not depend on the archive order.
+        """
+        return sorted(
+            name for name in self._raw_files if Path(name).suffix.lower() == ".xml"
+        ) + [PROCEDURE_XML_FILENAME]
+
+    @property
+    def image_filenames(self) -> list[str]:
+        """names of the original images, in the order of the manifest."""
+        return [
+            name
+            for suffix in IMAGE_SUFFIXES
+            for name in sorted(self._raw_files)
+            if Path(name).suffix.lower() == suffix
+        ]
+
+    def xml(self, filename: str) -> bytes:
+        """return an XML converted to UTF-8.
+
+        Args:
+            filename (str): name of the XML, procedure.xml for the procedure XML
+
+        Raises:
+            KeyError: when there is no such XML
+        """
+        return self._convert(filename)[0]
+
+    def xml_by_kind(self, kind: XML_KIND) -> dict[str, bytes]:
+        """return XMLs of a kind converted to UTF-8, by filename."""
+        return {
+            name: self.xml(name)
+            for name in self.xml_filenames
+            if detect_xml_kind(name) == kind
+        }
+
+    def image(self, filename: str) -> bytes:
+        """return an original image.
+
+        Raises:
+            KeyError: when there is no such image
+        """
+        if Path(filename).suffix.lower() not in IMAGE_SUFFIXES:
+            raise KeyError(filename)
+        return self._raw_files[filename]
+
+    def images_by_kind(self, kind: IMAGE_KIND) -> dict[str, bytes]:
+        """return original images of a kind, by filename."""
+        return {
+            name: self._raw_files[name]
+            for name in self.image_filenames
+            if detect_image_kind(name) == kind
+        }
+
+    def _convert(
+        self, filename: str
+    ) -> tuple[bytes, EncodingInfo, BibliographyExtractor | None]:
+        converted = self._converted.get(filename)
+        if converted is not None:
+            return converted
+        if filename == PROCEDURE_XML_FILENAME:
+            data = self._procedure_data
+            name = self.sources.procedure.filename
+        elif Path(filename).suffix.lower() == ".xml":
+            data = self._raw_files[filename]
+            name = filename
+        else:
+            raise KeyError(filename)
+
+        ### each XML has its own extractor, merged in the order of the manifest
+        ### later, so that the bibliography does not depend on the access order
+        extractor = (
+            BibliographyExtractor(self._bibliography_fields)
+            if self._bibliography_fields is not None
+            else None
+        )
+        with self._timer.time(filename, "convert"):
+            data, encoding = convert_xml_bytes(
+                data,
+                on_parsed=_feeder(extractor, detect_xml_kind(filename)),
+                name=name,
+            )
+        converted = self._converted[filename] = (data, encoding, extractor)
+        return converted
+
+    @property
+    def manifest(self) -> Manifest:
+        """manifest of the archive, the same as the one parse_archive saves
+        without image derivatives, except for the processing time."""
+        if self._manifest is not None:
+            return self._manifest
+
+        xml_filenames = self.xml_filenames
+        xml_files = []
+        bibliography = None
+        if self._bibliography_fields is not None:
+            bibliography = BibliographyExtractor(self._bibliography_fields)
+        for filename in xml_filenames:
+            data, encoding, extractor = self._convert(filename)
+            with self._timer.time(filename, "hash"):
+                xml_files.append(_xml_entry(filename, data, encoding))
+            if bibliography is not None and extractor is not None:
+                bibliography.merge(extractor)
+
+        images = []
+        for filename in self.image_filenames:
+            with self._timer.time(filename, "hash"):
+                images.append(_image_entry(filename, self._raw_files[filename]))
+        self._manifest = Manifest.create(
+            self.sources,
+            xml_files,
+            images,
+            Paths(),
+            Stats.count(xml_filenames, list(self._raw_files)),
+            bibliography.result() if bibliography is not None else None,
+        )
+        return self._manifest
+
+    def member_costs(self) -> list[MemberCost]:
+        """seconds spent on each member so far, and its size.
+
+        the members are in the order of the archive, followed by the
+        procedure XML. converting and hashing take place when the XMLs and
+        the manifest are first accessed, and converting images in write_to.
+        """
+        archive = self.sources.archive.filename
+        costs = [
+            self._timer.cost(archive, filename, _member_kind(filename), len(data))
+            for filename, data in self._raw_files.items()
+        ]
+        costs.append(
+            self._timer.cost(
+                archive,
+                PROCEDURE_XML_FILENAME,
+                detect_xml_kind(PROCEDURE_XML_FILENAME),
+                len(self._procedure_data),
+            )
+        )
+        return costs
+
+    def write_to(
+        self,
+        output_dir: str | Path | Sink,
+        *,
+        image_derivatives: bool = False,
+        image_cache_dir: str | None = None,
+        text_jsonl: bool = False,
+        incremental: bool = False,
+        durability: DURABILITY = "fast",
+        profiler: Profiler | None = None,
+        image_executor: Executor | None = None,
+    ) -> Manifest:
+        """save the converted files and the manifest to output_dir.
+
+        Args:
+            output_dir (str | Path | Sink): output directory, or a sink such as
+                S3Sink to store the files in.
+            image_derivatives (bool): also convert images to WebP and thumbnails
+                and save them to images_dir.
+            image_cache_dir (str | None): directory to cache image derivatives
+                by the sha256 of the original images.
+            text_jsonl (bool): also write text of the converted XMLs to
+                text.jsonl for search indexing.
+            incremental (bool): leave files byte-identical to the existing
+                outputs untouched, remove files no longer produced, and write
+                the change set to changes.json.
+            durability (DURABILITY): fast, batch or strict when output_dir is
+                a directory. see FileSystemSink.
+            profiler (Profiler | None): profiler of the run, stopped and
+                reported next to the manifest. the write phase is started
+                here, and profiling too unless the caller has started it.
+            image_executor (Executor | None): process pool converting images,
+                shared between many archives. a pool is created per call
+                when None.
+
+        Returns:
+            Manifest: manifest saved to output_dir
+
+        Raises:
+            ValueError: when durability is given with a sink
+        """
+        if isinstance(output_dir, Sink):
+            if durability != "fast":
+                raise ValueError("durability applies to output directories only")
+            sink = output_dir
+        else:
+            sink = FileSystemSink(output_dir, durability)
+        if profiler is not None:
+            profiler.phase("write")
+
+        ### paths relative to the output directory, which the sink stores them in
+        p = Paths(images_dir=Path("images") if image_derivatives else None)
+
+        previous = None
+        if incremental:
+            previous_json = sink.read("manifest.json")
+            if previous_json is not None:
+                previous = Manifest.model_validate_json(previous_json)
+        with OutputWriter(
+            p.root,
+            incremental=incremental,
+            known=expected_files(previous) if previous is not None else None,
+            sink=sink,
+        ) as writer:
+            ### save extracted files to raw_dir
+            save_raw_files(list(self._raw_files.items()), p.raw_dir, writer)
+            writer.prune(p.raw_dir)
+
+            ### save XMLs converted to UTF-8 to xml_dir
+            for filename in self.xml_filenames:
+                writer.write(p.xml_dir / filename, self.xml(filename))
+            writer.prune(p.xml_dir)
+
+            manifest = self.manifest
+
+            ### convert images to WebP and thumbnails
+            if p.images_dir is not None:
+                convert_seconds: dict[str, float] = {}
+                images = create_image_derivatives(
+                    manifest.images,
+                    None,
+                    p.images_dir,
+                    cache_dir=Path(image_cache_dir) if image_cache_dir else None,
+                    writer=writer,
+                    originals=self._raw_files,
+                    convert_seconds=convert_seconds,
+                    executor=image_executor,
+                )
+                for filename, seconds in convert_seconds.items():
+                    self._timer.add(filename, "convert", seconds)
+                manifest = manifest.model_copy(update={"images": images, "paths": p})
+            writer.prune(p.root / "images")
+
+            ### stream text of converted XMLs for search indexing
+            if text_jsonl:
+                text = io.StringIO()
+                write_text_jsonl(
+                    manifest,
+                    p.root,
+                    text,
+                    xml_data={name: self.xml(name) for name in self.xml_filenames},
+                )
+                writer.write(p.root / "text.jsonl", text.getvalue().encode("utf-8"))
+            else:
+                writer.remove(p.root / "text.jsonl")
+
+            stats = manifest.stats.model_copy(
+                update={"processing_seconds": time.perf_counter() - self._started}
+            )
+            manifest = manifest.model_copy(update={"stats": stats})
+
+            ### manifest last, so that it is there only if the outputs are.
+            ### kept untouched when nothing but the creation and processing
+            ### times differ
+            sink.flush()
+            if previous is not None and manifest.is_equivalent(previous):
+                writer.keep(p.root / "manifest.json")
+            else:
+                writer.write(
+                    p.root / "manifest.json", manifest.to_json().encode("utf-8")
+                )
+
+            if incremental:
+                writer.write(
+                    p.root / "changes.json",
+                    writer.changes.model_dump_json(indent=4).encode("utf-8"),
+                    record=False,
+                )
+
+            ### reports of the run, not outputs of the archive
+            if profiler is not None:
+                reports = profiler.report(self.sources, self.member_costs())
+                for filename, data in reports.items():
+                    writer.write(p.root / filename, data, record=False)
+        return manifest
 
 
 def save_raw_files(
     extracted_archives: list[tuple[str, bytes]],
     raw_dir: Path,
+    writer: OutputWriter | None = None,
 ) -> None:
+    writer = writer or OutputWriter(raw_dir)
     for filename, data in extracted_archives:
-        output_path = raw_dir / filename
-        with output_path.open("wb") as f:
-            f.write(data)
+        writer.write(raw_dir / filename, data)
 
 
 def process_xml(
@@ -92,19 +532,14 @@ def process_xml(
     Returns:
         list[XmlFile]: List of XmlFile entries.
     """
+    writer = OutputWriter(xml_dir)
     xml_files = []
     for file_path in raw_xml_files:
-        converted_xml_path = xml_dir / file_path.name
-        convert_xml_charset(str(file_path), str(converted_xml_path))
-
-        xml_files.append(
-            XmlFile(
-                filename=file_path.name,
-                sha256=generate_sha256(converted_xml_path),
-                encoding=EncodingInfo(detected="shift_jis", normalized_to="UTF-8"),
-                kind=detect_xml_kind(file_path.name),
-            )
+        converted, encoding = convert_xml_bytes(
+            file_path.read_bytes(), name=str(file_path)
         )
+        writer.write(xml_dir / file_path.name, converted)
+        xml_files.append(_xml_entry(file_path.name, converted, encoding))
 
     return xml_files
 
@@ -113,22 +548,59 @@ def process_procedure_xml(
     src_procedure_path: Path,
     xml_path: Path,
 ) -> XmlFile:
-    convert_xml_charset(str(src_procedure_path), str(xml_path))
+    writer = OutputWriter(xml_path.parent)
+    converted, encoding = convert_xml_bytes(
+        src_procedure_path.read_bytes(), name=str(src_procedure_path)
+    )
+    writer.write(xml_path, converted)
+    return _xml_entry(xml_path.name, converted, encoding)
+
+
+def _xml_entry(filename: str, converted: bytes, encoding: EncodingInfo) -> XmlFile:
     return XmlFile(
-        filename=xml_path.name,
-        encoding=EncodingInfo(detected="shift_jis", normalized_to="UTF-8"),
-        sha256=generate_sha256(xml_path),
-        kind=detect_xml_kind(xml_path.name),
+        filename=filename,
+        encoding=encoding,
+        sha256=hashlib.sha256(converted).hexdigest(),
+        kind=detect_xml_kind(filename),
     )
 
 
+def _feeder(
+    extractor: BibliographyExtractor | None, kind: XML_KIND
+) -> Callable[[ET.Element], None] | None:
+    if extractor is None:
+        return None
+    return lambda root: extractor.feed(kind, root)
+
+
 def collect_image_entries(image_files: list[Path]) -> list[ImageEntry]:
-    return [
-        ImageEntry(
-            filename=image.name,
-            sha256=generate_sha256(image),
-            media_type=get_media_type(image.suffix),
-            kind=detect_image_kind(image.name),
-        )
-        for image in image_files
-    ]
+    """hash images and read their header metadata in a single read.
+
+    Args:
+        image_files (list[Path]): image file paths
+
+    Returns:
+        list[ImageEntry]: List of ImageEntry entries.
+    """
+    return [_image_entry(image.name, image.read_bytes()) for image in image_files]
+
+
+def _member_kind(filename: str) -> str:
+    suffix = Path(filename).suffix.lower()
+    if suffix == ".xml":
+        return detect_xml_kind(filename)
+    if suffix in IMAGE_SUFFIXES:
+        return detect_image_kind(filename)
+    return "unknown"
+
+
+def _image_entry(filename: str, data: bytes) -> ImageEntry:
+    info = read_image_info(data)
+    return ImageEntry(
+        filename=filename,
+        sha256=hashlib.sha256(data).hexdigest(),
+        media_type=get_media_type(Path(filename).suffix),
+        kind=detect_image_kind(filename),
+        byte_size=len(data),
+        **info._asdict(),
+    )
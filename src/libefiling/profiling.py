@@ -0,0 +1,242 @@
+"""Costs of parsing an archive: cProfile, tracemalloc and member by member.
+
+the reports are written next to manifest.json, each in a format which can
+be aggregated over the output directories of a batch:
+
+    profile.pstats          cProfile statistics, merged by pstats.Stats(*paths)
+    profile.jsonl           a line of the times and memory peaks by phase
+    profile-members.jsonl   a line per member of the archive
+
+cProfile sees the calling thread only, so that the time of the threads
+decompressing members and of the processes converting images is in the
+member table but not in profile.pstats.
+"""
+
+import cProfile
+import marshal
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Iterator, List, Literal
+
+from pydantic import BaseModel, Field
+
+from libefiling.manifest import Sources
+
+PROFILE_PSTATS_FILENAME = "profile.pstats"
+PROFILE_SUMMARY_FILENAME = "profile.jsonl"
+PROFILE_MEMBERS_FILENAME = "profile-members.jsonl"
+
+COST_STAGE = Literal["decompress", "convert", "hash"]
+
+# allocations of the profiler itself are not reported
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class MemberCost(BaseModel):
+    archive: str
+    member: str
+    kind: str
+    byte_size: int
+    decompress_seconds: float = 0.0
+    convert_seconds: float = 0.0
+    hash_seconds: float = 0.0
+
+
+class MemberTimer:
+    """seconds spent on each member by stage."""
+
+    def __init__(self, decompress_seconds: dict[str, float] | None = None):
+        """
+        Args:
+            decompress_seconds (dict[str, float] | None): seconds spent
+                decompressing each member, see extract_archive_data
+        """
+        self._seconds: dict[str, dict[str, float]] = {}
+        for member, seconds in (decompress_seconds or {}).items():
+            self.add(member, "decompress", seconds)
+
+    def add(self, member: str, stage: COST_STAGE, seconds: float) -> None:
+        stages = self._seconds.setdefault(member, {})
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def time(self, member: str, stage: COST_STAGE) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(member, stage, time.perf_counter() - start)
+
+    def cost(self, archive: str, member: str, kind: str, byte_size: int) -> MemberCost:
+        return MemberCost(
+            archive=archive,
+            member=member,
+            kind=kind,
+            byte_size=byte_size,
+            **{
+                f"{stage}_seconds": seconds
+                for stage, seconds in self._seconds.get(member, {}).items()
+            },
+        )
+
+
+class Allocation(BaseModel):
+    location: str  # file:line
+    size: int
+    count: int
+
+
+class PhaseCost(BaseModel):
+    seconds: float
+    cpu_seconds: float
+    peak_bytes: int = Field(description="tracemalloc peak during the phase")
+    top_allocations: List[Allocation] = Field(
+        default_factory=list, description="largest allocations held at the end"
+    )
+
+
+class FunctionCost(BaseModel):
+    function: str
+    calls: int
+    tottime: float
+    cumtime: float
+
+
+class ProfileSummary(BaseModel):
+    archive: str
+    document_code: str
+    seconds: float
+    cpu_seconds: float
+    peak_bytes: int
+    phases: dict[str, PhaseCost]
+    top_functions: List[FunctionCost]
+
+
+class Profiler:
+    """cProfile and tracemalloc over the phases of parsing an archive.
+
+    the phases are named by the caller, e.g. parse and write, and the
+    tracemalloc peak is reset between them.
+    """
+
+    def __init__(self, top: int = 20):
+        """
+        Args:
+            top (int): number of functions and allocations in the summary
+        """
+        self.top = top
+        self._profile: cProfile.Profile | None = None
+        self._started_tracemalloc = False
+        self._phase: tuple[str, float, float] | None = None
+        self._phases: dict[str, PhaseCost] = {}
+        self._start: tuple[float, float] | None = None
+        self._end: tuple[float, float] | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._profile is not None and self._end is None
+
+    def phase(self, name: str) -> None:
+        """end the current phase, and start a new one.
+        the first phase starts profiling."""
+        if self._end is not None:
+            raise RuntimeError("the profiler has been stopped")
+        if self._profile is None:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+            self._start = (time.perf_counter(), time.process_time())
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._end_phase()
+        tracemalloc.reset_peak()
+        self._phase = (name, time.perf_counter(), time.process_time())
+
+    def _end_phase(self) -> None:
+        if self._phase is None:
+            return
+        name, start, cpu_start = self._phase
+        seconds = time.perf_counter() - start
+        cpu_seconds = time.process_time() - cpu_start
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        self._phases[name] = PhaseCost(
+            seconds=seconds,
+            cpu_seconds=cpu_seconds,
+            peak_bytes=peak,
+            top_allocations=[
+                Allocation(
+                    location=f"{frame.filename}:{frame.lineno}",
+                    size=stat.size,
+                    count=stat.count,
+                )
+                for stat in snapshot.statistics("lineno")[: self.top]
+                for frame in (stat.traceback[0],)
+            ],
+        )
+        self._phase = None
+
+    def stop(self) -> None:
+        """stop profiling. does nothing if not running."""
+        if not self.running:
+            return
+        assert self._profile is not None
+        self._profile.disable()
+        self._end_phase()
+        self._end = (time.perf_counter(), time.process_time())
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def report(self, sources: Sources, costs: list[MemberCost]) -> dict[str, bytes]:
+        """stop profiling and render the reports.
+
+        Args:
+            sources (Sources): the archive profiled
+            costs (list[MemberCost]): costs of the members of the archive
+
+        Returns:
+            dict[str, bytes]: content of the reports by filename
+        """
+        self.stop()
+        if self._profile is None or self._start is None or self._end is None:
+            raise RuntimeError("the profiler has not been started")
+        stats = pstats.Stats(self._profile)
+        functions = sorted(
+            stats.stats.items(),  # type: ignore[attr-defined]
+            key=lambda item: item[1][3],
+            reverse=True,
+        )
+        summary = ProfileSummary(
+            archive=sources.archive.filename,
+            document_code=sources.document_code,
+            seconds=self._end[0] - self._start[0],
+            cpu_seconds=self._end[1] - self._start[1],
+            peak_bytes=max(
+                (phase.peak_bytes for phase in self._phases.values()), default=0
+            ),
+            phases=self._phases,
+            top_functions=[
+                FunctionCost(
+                    function=pstats.func_std_string(func),
+                    calls=calls,
+                    tottime=tottime,
+                    cumtime=cumtime,
+                )
+                for func, (_, calls, tottime, cumtime, _) in functions[: self.top]
+            ],
+        )
+        members = "".join(cost.model_dump_json() + "\n" for cost in costs)
+        return {
+            PROFILE_PSTATS_FILENAME: marshal.dumps(stats.stats),  # type: ignore
+            PROFILE_SUMMARY_FILENAME: f"{summary.model_dump_json()}\n".encode("utf-8"),
+            PROFILE_MEMBERS_FILENAME: members.encode("utf-8"),
+        }
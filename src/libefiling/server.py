@@ -0,0 +1,310 @@
+"""Warm worker processes serving jobs over a local Unix domain socket.
+
+the client sends one JSON object per line, and receives one JSON object per
+line for each of them in the same order.
+
+    {"op": "parse", "archive": ..., "procedure": ..., "out_dir": ..., "options": {...}}
+    {"op": "inspect", "archive": ..., "procedure": ..., "options": {...}}
+    {"op": "verify", "out_dir": ..., "incremental": false}
+
+    {"ok": true, "result": {...}}
+    {"ok": false, "error": "..."}
+
+a request may also carry "timeout" in seconds, which can only shorten the
+timeout of the server. paths are resolved by the server, so they should be
+absolute.
+"""
+
+import json
+import math
+import multiprocessing
+import os
+import queue
+import socket
+import socketserver
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+from pathlib import Path
+from typing import Any
+
+from libefiling.parse import ParsedArchive, parse_archive
+from libefiling.verify import verify_output
+from libefiling.xml.bibliography import DEFAULT_BIBLIOGRAPHY_FIELDS
+
+_PARSE_OPTIONS = {
+    "image_derivatives",
+    "image_cache_dir",
+    "bibliography",
+    "text_jsonl",
+    "incremental",
+    "unzip_workers",
+    "durability",
+    "profile",
+}
+_INSPECT_OPTIONS = {"bibliography", "unzip_workers"}
+
+
+def _options(job: dict, allowed: set[str]) -> dict[str, Any]:
+    options = dict(job.get("options") or {})
+    unknown = set(options) - allowed
+    if unknown:
+        raise ValueError(f"unknown options: {', '.join(sorted(unknown))}")
+    if "bibliography" in options:
+        options["bibliography_fields"] = (
+            DEFAULT_BIBLIOGRAPHY_FIELDS if options.pop("bibliography") else None
+        )
+    return options
+
+
+def _require(job: dict, key: str) -> str:
+    if not isinstance(job.get(key), str):
+        raise ValueError(f"'{key}' is required")
+    return job[key]
+
+
+def run_job(job: dict) -> dict:
+    """run a job of the protocol in this process.
+
+    Args:
+        job (dict): request without the timeout
+
+    Returns:
+        dict: result of the job
+
+    Raises:
+        ValueError: when the request is invalid
+    """
+    op = job.get("op")
+    if op == "parse":
+        out_dir = _require(job, "out_dir")
+        parse_archive(
+            _require(job, "archive"),
+            _require(job, "procedure"),
+            out_dir,
+            **_options(job, _PARSE_OPTIONS),
+        )
+        return {
+            "out_dir": out_dir,
+            "manifest_path": str(Path(out_dir) / "manifest.json"),
+        }
+    if op == "inspect":
+        parsed = ParsedArchive.create(
+            _require(job, "archive"),
+            _require(job, "procedure"),
+            **_options(job, _INSPECT_OPTIONS),
+        )
+        return {"manifest": parsed.manifest.model_dump(mode="json")}
+    if op == "verify":
+        report = verify_output(
+            _require(job, "out_dir"), incremental=bool(job.get("incremental"))
+        )
+        return {"ok": report.ok, **report.model_dump()}
+    raise ValueError(f"unknown op: {op}")
+
+
+def _worker_main(conn: Connection) -> None:
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        try:
+            response = {"ok": True, "result": run_job(job)}
+        except Exception as exc:
+            response = {"ok": False, "error": f"{type(exc).__name__}: {exc}"}
+        conn.send(response)
+
+
+class WorkerPool:
+    """fixed number of warm worker processes, which is also the number of
+    jobs running at once. a job waits until a worker is idle.
+
+    a worker running a job longer than its timeout is killed and replaced.
+    """
+
+    def __init__(self, workers: int, timeout: float | None = None):
+        """
+        Args:
+            workers (int): number of worker processes
+            timeout (float | None): maximum seconds of a job, None for no limit
+        """
+        # forkserver, so that workers are not forked from the threads of the
+        # server, and replaced workers start with the modules already imported
+        self._ctx = multiprocessing.get_context("forkserver")
+        self._ctx.set_forkserver_preload([__name__])
+        self.timeout = timeout
+        self._idle: queue.Queue[tuple[BaseProcess, Connection]] = queue.Queue()
+        self._workers = [self._spawn() for _ in range(workers)]
+        for worker in self._workers:
+            self._idle.put(worker)
+
+    def _spawn(self) -> tuple[BaseProcess, Connection]:
+        conn, child_conn = self._ctx.Pipe()
+        # not daemonic, so that a parse job can convert images on a process
+        # pool of its own. close() joins or kills the workers
+        process = self._ctx.Process(target=_worker_main, args=(child_conn,))
+        process.start()
+        child_conn.close()
+        return process, conn
+
+    def _replace(
+        self, worker: tuple[BaseProcess, Connection]
+    ) -> tuple[BaseProcess, Connection]:
+        process, conn = worker
+        process.kill()
+        process.join()
+        conn.close()
+        new_worker = self._spawn()
+        self._workers[self._workers.index(worker)] = new_worker
+        return new_worker
+
+    def submit(self, job: dict, timeout: float | None = None) -> dict:
+        """run a job on an idle worker and wait for the response.
+
+        Args:
+            job (dict): request of the protocol
+            timeout (float | None): seconds, shortens the timeout of the pool
+
+        Returns:
+            dict: response of the protocol
+        """
+        if timeout is None or (self.timeout is not None and timeout > self.timeout):
+            timeout = self.timeout
+        worker = self._idle.get()
+        answered = False
+        try:
+            _, conn = worker
+            conn.send(job)
+            if conn.poll(timeout):
+                response = conn.recv()
+                answered = True
+                return response
+            return {"ok": False, "error": f"timed out after {timeout} seconds"}
+        except (EOFError, OSError):
+            return {"ok": False, "error": "worker process died"}
+        finally:
+            ### a worker which has not answered may still be running the job,
+            ### or hold its response for the next one. it is never reused.
+            if not answered:
+                worker = self._replace(worker)
+            self._idle.put(worker)
+
+    def close(self) -> None:
+        for _process, conn in self._workers:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for process, conn in self._workers:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.kill()
+                process.join()
+            conn.close()
+
+
+def _is_positive_number(value: Any) -> bool:
+    return (
+        isinstance(value, (int, float))
+        and not isinstance(value, bool)
+        and math.isfinite(value)
+        and value > 0
+    )
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    server: "_Server"
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                job = json.loads(line)
+                if not isinstance(job, dict):
+                    raise ValueError
+            except ValueError:
+                response = {"ok": False, "error": "request must be a JSON object"}
+            else:
+                timeout = job.pop("timeout", None)
+                if timeout is None or _is_positive_number(timeout):
+                    response = self.server.pool.submit(job, timeout)
+                else:
+                    response = {
+                        "ok": False,
+                        "error": "timeout must be a positive number of seconds",
+                    }
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8"))
+            self.wfile.write(b"\n")
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    pool: WorkerPool
+
+
+def serve(
+    socket_path: str | Path, workers: int | None = None, timeout: float | None = None
+) -> None:
+    """serve jobs on a Unix domain socket until interrupted.
+
+    Args:
+        socket_path (str | Path): path of the socket, created with mode 0600
+        workers (int | None): number of worker processes, the number of CPUs
+            when None
+        timeout (float | None): maximum seconds of a job, None for no limit
+
+    Raises:
+        RuntimeError: when another server is listening on socket_path
+    """
+    path = Path(socket_path)
+    if path.exists():
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(str(path))
+            except OSError:
+                path.unlink()  # left by a server which did not exit cleanly
+            else:
+                raise RuntimeError(f"already serving on {path}")
+
+    pool = WorkerPool(workers or os.cpu_count() or 1, timeout)
+    try:
+        ### the socket is created by bind, accessible only by the owner from
+        ### the start rather than after a chmod
+        umask = os.umask(0o077)
+        try:
+            server = _Server(str(path), _RequestHandler)
+        finally:
+            os.umask(umask)
+        with server:
+            os.chmod(path, 0o600)
+            server.pool = pool
+            server.serve_forever()
+    finally:
+        pool.close()
+        path.unlink(missing_ok=True)
+
+
+def submit(socket_path: str | Path, job: dict, timeout: float | None = None) -> dict:
+    """send a job to the server and wait for the response.
+
+    Args:
+        socket_path (str | Path): path of the socket of the server
+        job (dict): request of the protocol
+        timeout (float | None): seconds to wait for the response
+
+    Returns:
+        dict: response of the protocol
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(str(socket_path))
+        sock.sendall(json.dumps(job, ensure_ascii=False).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError("server closed the connection")
+    return json.loads(line)
@@ -0,0 +1,622 @@
+"""Destinations of output files: local file system, memory and S3.
+
+files are addressed by POSIX paths relative to the output directory,
+such as xml/procedure.xml.
+
+boto3 is an optional dependency of S3Sink: ``pip install libefiling[s3]``.
+"""
+
+import hashlib
+import os
+import shutil
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import Any, Literal
+
+# fast: write in place, never fsync.
+# batch: write into a staging directory, fsync every file once at the end,
+#        then publish the staging directory by renaming it to root.
+# strict: write each file to a temporary file, fsync and rename it in place.
+DURABILITY = Literal["fast", "batch", "strict"]
+
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+
+
+class Sink(ABC):
+    """destination of the files of an output directory.
+
+    size, read and list_files see the outputs of the previous run, which are
+    compared with in incremental mode. finish makes the written files
+    available, abort discards what finish would have made available.
+    """
+
+    @abstractmethod
+    def write(self, relpath: str, data: bytes) -> None:
+        pass
+
+    @abstractmethod
+    def size(self, relpath: str) -> int | None:
+        """size of an existing file, None if there is no such file."""
+        pass
+
+    @abstractmethod
+    def read(self, relpath: str) -> bytes | None:
+        """content of an existing file, None if there is no such file."""
+        pass
+
+    def matches(self, relpath: str, data: bytes) -> bool:
+        """whether an existing file has the content data.
+
+        reads the file back, sinks that can tell it cheaper override this.
+        """
+        return self.read(relpath) == data
+
+    @abstractmethod
+    def list_files(self, directory: str) -> list[str]:
+        """relative paths of the existing files directly in directory, sorted."""
+        pass
+
+    @abstractmethod
+    def delete(self, relpath: str) -> None:
+        pass
+
+    @abstractmethod
+    def child(self, relpath: str | PurePosixPath) -> "Sink":
+        """sink of a subdirectory, e.g. the output directory of a layout."""
+        pass
+
+    ### the hooks below do nothing unless a sink needs them
+
+    def keep(self, relpath: str) -> None:  # noqa: B027
+        """keep an existing file untouched by this run."""
+
+    def flush(self) -> None:  # noqa: B027
+        """wait until the files written so far are stored, so that the files
+        written after them never appear before them."""
+
+    def finish(self) -> None:  # noqa: B027
+        pass
+
+    def abort(self) -> None:  # noqa: B027
+        pass
+
+    def close(self) -> None:  # noqa: B027
+        """release resources shared with the children."""
+
+    def __enter__(self) -> "Sink":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def _fsync_dir(directory: Path) -> None:
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class FileSystemSink(Sink):
+    """files under a local directory.
+
+    in batch mode, files are written to a staging directory next to root
+    until finish() publishes it. root is replaced as a whole, so output
+    files not written (or kept) by the run do not survive. kept files, and
+    the dotfiles directly in root such as the state of verify_output, are
+    hard linked into the staging directory, so that their mtime does not
+    change.
+
+    root is replaced by two renames, root to .{name}.old and the staging
+    directory to root. a crash between them leaves no root; the next
+    FileSystemSink of root in batch mode renames .{name}.old back.
+    """
+
+    def __init__(self, root: str | Path, durability: DURABILITY = "fast"):
+        self.root = Path(root)
+        self.durability = durability
+        self._staging: Path | None = None
+        self._created: set[Path] = set()
+        # files to fsync when the batch is finished
+        self._unsynced: list[Path] = []
+        if durability == "batch":
+            self._recover()
+
+    @property
+    def _previous(self) -> Path:
+        """where root is renamed aside while the staging directory takes
+        its place."""
+        return self.root.with_name(f".{self.root.name}.old")
+
+    def _recover(self) -> None:
+        """put back root renamed aside by a finish which crashed before
+        publishing the staging directory, or remove it if it was published."""
+        previous = self._previous
+        if not previous.is_dir():
+            return
+        if self.root.exists():
+            shutil.rmtree(previous, ignore_errors=True)
+        else:
+            os.replace(previous, self.root)
+            _fsync_dir(self.root.parent)
+
+    def _sibling(self, label: str) -> Path:
+        """a directory next to root, on the same file system,
+        removing the one left by a crashed run of the same pid."""
+        path = self.root.with_name(f".{self.root.name}.{label}-{os.getpid()}")
+        shutil.rmtree(path, ignore_errors=True)
+        return path
+
+    @property
+    def workdir(self) -> Path:
+        """directory the files are written to."""
+        if self.durability != "batch":
+            return self.root
+        if self._staging is None:
+            self._staging = self._sibling("staging")
+            self._staging.mkdir(parents=True)
+        return self._staging
+
+    def _target(self, relpath: str) -> Path:
+        path = self.workdir / relpath
+        if path.parent not in self._created:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._created.add(path.parent)
+        return path
+
+    def write(self, relpath: str, data: bytes) -> None:
+        path = self._target(relpath)
+        if self.durability == "strict":
+            tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+            try:
+                with tmp_path.open("wb") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                tmp_path.replace(path)
+            except BaseException:
+                tmp_path.unlink(missing_ok=True)
+                raise
+            _fsync_dir(path.parent)
+            return
+        ### the whole content is written by a single write call
+        with path.open("wb") as f:
+            f.write(data)
+        if self.durability == "batch":
+            self._unsynced.append(path)
+
+    def size(self, relpath: str) -> int | None:
+        try:
+            return (self.root / relpath).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    def read(self, relpath: str) -> bytes | None:
+        try:
+            return (self.root / relpath).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def list_files(self, directory: str) -> list[str]:
+        path = self.root / directory
+        if not path.is_dir():
+            return []
+        return [
+            PurePosixPath(directory, file_path.name).as_posix()
+            for file_path in sorted(path.iterdir())
+            if file_path.is_file()
+        ]
+
+    def delete(self, relpath: str) -> None:
+        ### in batch mode, the file is not carried over to the staging directory
+        if self.durability == "batch":
+            return
+        path = self.root / relpath
+        path.unlink(missing_ok=True)
+        if self.durability == "strict":
+            _fsync_dir(path.parent)
+
+    def keep(self, relpath: str) -> None:
+        if self.durability != "batch":
+            return
+        existing = self.root / relpath
+        staged = self._target(relpath)
+        try:
+            os.link(existing, staged)
+        except OSError:
+            shutil.copy2(existing, staged)
+            self._unsynced.append(staged)
+
+    def finish(self) -> None:
+        """make the outputs durable as the durability requires.
+
+        in batch mode, fsync the staged files and publish the staging
+        directory as root. the previous root is renamed aside just before,
+        and removed after the staging directory takes its place.
+        in strict mode, fsync the directories, which may have been created.
+        """
+        if self.durability == "fast":
+            return
+        if self.durability == "strict":
+            if not self._created:
+                return
+            for directory in sorted(self._created | {self.root}, reverse=True):
+                _fsync_dir(directory)
+            _fsync_dir(self.root.parent)
+            self._reset()
+            return
+        if self._staging is None:
+            return
+        self._carry_dotfiles()
+        for path in self._unsynced:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        for directory, _, _ in os.walk(self._staging, topdown=False):
+            _fsync_dir(Path(directory))
+
+        self.root.parent.mkdir(parents=True, exist_ok=True)
+        previous = None
+        if self.root.exists():
+            previous = self._previous
+            shutil.rmtree(previous, ignore_errors=True)
+            os.replace(self.root, previous)
+        ### until the next rename, root exists only as .{name}.old,
+        ### which _recover puts back after a crash
+        os.replace(self._staging, self.root)
+        _fsync_dir(self.root.parent)
+        if previous is not None:
+            shutil.rmtree(previous)
+        self._reset()
+
+    def _carry_dotfiles(self) -> None:
+        """link the dotfiles directly in root, which are not outputs of the
+        run, into the staging directory unless the run wrote them."""
+        assert self._staging is not None
+        try:
+            entries = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            ### temporary files of strict mode left by a crash are not carried
+            if not entry.name.startswith(".") or entry.name.endswith(".tmp"):
+                continue
+            staged = self._staging / entry.name
+            if not entry.is_file() or staged.exists():
+                continue
+            try:
+                os.link(entry.path, staged)
+            except OSError:
+                shutil.copy2(entry.path, staged)
+                self._unsynced.append(staged)
+
+    def abort(self) -> None:
+        """discard the staging directory of batch mode, leaving root as it was."""
+        if self._staging is not None:
+            shutil.rmtree(self._staging, ignore_errors=True)
+        self._reset()
+
+    def _reset(self) -> None:
+        self._staging = None
+        self._created.clear()
+        self._unsynced.clear()
+
+    def child(self, relpath: str | PurePosixPath) -> "FileSystemSink":
+        return FileSystemSink(self.root / relpath, self.durability)
+
+
+class MemorySink(Sink):
+    """files kept in a dict by relative path, for tests and for callers
+    pushing the outputs elsewhere themselves."""
+
+    def __init__(self, files: dict[str, bytes] | None = None, prefix: str = ""):
+        self.files = {} if files is None else files
+        self._prefix = prefix
+
+    def _key(self, relpath: str) -> str:
+        return f"{self._prefix}{relpath}"
+
+    def write(self, relpath: str, data: bytes) -> None:
+        self.files[self._key(relpath)] = bytes(data)
+
+    def size(self, relpath: str) -> int | None:
+        data = self.files.get(self._key(relpath))
+        return len(data) if data is not None else None
+
+    def read(self, relpath: str) -> bytes | None:
+        return self.files.get(self._key(relpath))
+
+    def list_files(self, directory: str) -> list[str]:
+        prefix = self._key(directory.rstrip("/") + "/")
+        return sorted(
+            key[len(self._prefix) :]
+            for key in self.files
+            if key.startswith(prefix) and "/" not in key[len(prefix) :]
+        )
+
+    def delete(self, relpath: str) -> None:
+        self.files.pop(self._key(relpath), None)
+
+    def child(self, relpath: str | PurePosixPath) -> "MemorySink":
+        return MemorySink(self.files, self._key(f"{PurePosixPath(relpath)}/"))
+
+
+class _PartReader:
+    """file-like view of a part of the data, uploaded without copying it."""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._pos = 0
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else self._pos + size
+        chunk = self._view[self._pos : end]
+        self._pos += len(chunk)
+        return bytes(chunk)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self._pos, os.SEEK_END: len(self._view)}
+        self._pos = base[whence] + offset
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def __len__(self) -> int:
+        return len(self._view)
+
+
+def _require_boto3() -> Any:
+    try:
+        import boto3
+    except ImportError as exc:
+        raise ImportError("S3Sink requires boto3: pip install libefiling[s3]") from exc
+    return boto3
+
+
+class S3Sink(Sink):
+    """objects in an S3 compatible object store, under bucket/prefix.
+
+    uploads run concurrently on a thread pool sharing one client, whose
+    HTTP connections are pooled. files larger than part_size are uploaded
+    in parts, which also run concurrently. finish() waits for the uploads
+    and completes the multipart uploads.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        *,
+        client: Any = None,
+        endpoint_url: str | None = None,
+        max_workers: int = 8,
+        part_size: int = DEFAULT_PART_SIZE,
+    ):
+        """
+        Args:
+            bucket (str): bucket name
+            prefix (str): key prefix of the output directory
+            client: boto3 S3 client. created when None.
+            endpoint_url (str | None): endpoint of a S3 compatible store such
+                as MinIO, used when creating the client.
+            max_workers (int): number of concurrent uploads, and the size of
+                the connection pool of the client created.
+            part_size (int): size of the parts of multipart uploads, 5 MiB or more
+        """
+        if client is None:
+            boto3 = _require_boto3()
+            from botocore.config import Config
+
+            client = boto3.client(
+                "s3",
+                endpoint_url=endpoint_url,
+                config=Config(max_pool_connections=max_workers),
+            )
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.part_size = part_size
+        self._client = client
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._owner = True
+        self._pending: list[Future] = []
+        # (key, upload id, futures of the parts)
+        self._uploads: list[tuple[str, str, list[Future]]] = []
+
+    def _key(self, relpath: str) -> str:
+        return f"{self.prefix}/{relpath}" if self.prefix else relpath
+
+    def _put(self, key: str, data: bytes) -> None:
+        self._client.put_object(Bucket=self.bucket, Key=key, Body=data)
+
+    def _upload_part(self, key: str, upload_id: str, number: int, part: memoryview):
+        response = self._client.upload_part(
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=number,
+            Body=_PartReader(part),
+        )
+        return {"PartNumber": number, "ETag": response["ETag"]}
+
+    def write(self, relpath: str, data: bytes) -> None:
+        key = self._key(relpath)
+        if len(data) <= self.part_size:
+            self._pending.append(self._executor.submit(self._put, key, data))
+            return
+        upload = self._client.create_multipart_upload(Bucket=self.bucket, Key=key)
+        upload_id = upload["UploadId"]
+        view = memoryview(data)
+        parts = [
+            self._executor.submit(
+                self._upload_part,
+                key,
+                upload_id,
+                number,
+                view[offset : offset + self.part_size],
+            )
+            for number, offset in enumerate(range(0, len(data), self.part_size), 1)
+        ]
+        self._uploads.append((key, upload_id, parts))
+
+    def _is_missing(self, exc: Exception) -> bool:
+        error = getattr(exc, "response", {}).get("Error", {})
+        return error.get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    def size(self, relpath: str) -> int | None:
+        try:
+            response = self._client.head_object(
+                Bucket=self.bucket, Key=self._key(relpath)
+            )
+        except Exception as exc:
+            if self._is_missing(exc):
+                return None
+            raise
+        return response["ContentLength"]
+
+    def read(self, relpath: str) -> bytes | None:
+        try:
+            response = self._client.get_object(
+                Bucket=self.bucket, Key=self._key(relpath)
+            )
+        except Exception as exc:
+            if self._is_missing(exc):
+                return None
+            raise
+        return response["Body"].read()
+
+    def _etag(self, data: bytes) -> str:
+        """ETag of data uploaded by write, as S3 computes it without SSE-KMS:
+        the MD5 of the object, or of the MD5s of its parts."""
+        if len(data) <= self.part_size:
+            return f'"{hashlib.md5(data, usedforsecurity=False).hexdigest()}"'
+        view = memoryview(data)
+        digests = [
+            hashlib.md5(view[offset : offset + self.part_size], usedforsecurity=False)
+            for offset in range(0, len(data), self.part_size)
+        ]
+        md5 = hashlib.md5(
+            b"".join(digest.digest() for digest in digests), usedforsecurity=False
+        )
+        return f'"{md5.hexdigest()}-{len(digests)}"'
+
+    def matches(self, relpath: str, data: bytes) -> bool:
+        """compare the ETag of the object instead of downloading it.
+
+        an object uploaded with another part size or encrypted by SSE-KMS has
+        another ETag, and is taken as changed.
+        """
+        try:
+            response = self._client.head_object(
+                Bucket=self.bucket, Key=self._key(relpath)
+            )
+        except Exception as exc:
+            if self._is_missing(exc):
+                return False
+            raise
+        return response["ETag"] == self._etag(data)
+
+    def list_files(self, directory: str) -> list[str]:
+        prefix = self._key(directory.rstrip("/") + "/")
+        relpaths = []
+        paginator = self._client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(
+            Bucket=self.bucket, Prefix=prefix, Delimiter="/"
+        ):
+            for content in page.get("Contents", []):
+                name = content["Key"][len(prefix) :]
+                relpaths.append(PurePosixPath(directory, name).as_posix())
+        return sorted(relpaths)
+
+    def delete(self, relpath: str) -> None:
+        self._pending.append(
+            self._executor.submit(
+                self._client.delete_object, Bucket=self.bucket, Key=self._key(relpath)
+            )
+        )
+
+    def flush(self) -> None:
+        """wait for the uploads, and complete the multipart uploads.
+
+        Raises:
+            Exception: the first error of the uploads, after aborting
+                the multipart uploads
+        """
+        try:
+            for future in self._pending:
+                future.result()
+            for key, upload_id, parts in self._uploads:
+                self._client.complete_multipart_upload(
+                    Bucket=self.bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    MultipartUpload={"Parts": [part.result() for part in parts]},
+                )
+        except BaseException:
+            self.abort()
+            raise
+        self._pending = []
+        self._uploads = []
+
+    def finish(self) -> None:
+        self.flush()
+
+    def abort(self) -> None:
+        """cancel the uploads not started yet, and abort the multipart uploads.
+        objects already put are left."""
+        for future in self._pending:
+            future.cancel()
+        for key, upload_id, parts in self._uploads:
+            for part in parts:
+                part.cancel()
+            for part in parts:
+                if not part.cancelled():
+                    part.exception()  # wait for the running ones
+            try:
+                self._client.abort_multipart_upload(
+                    Bucket=self.bucket, Key=key, UploadId=upload_id
+                )
+            except Exception:
+                pass  # completed already, or the store is unreachable
+        self._pending = []
+        self._uploads = []
+
+    def child(self, relpath: str | PurePosixPath) -> "S3Sink":
+        """sink of a subdirectory sharing the client and the thread pool."""
+        child = object.__new__(S3Sink)
+        child.__dict__.update(self.__dict__)
+        child.prefix = self._key(str(PurePosixPath(relpath)))
+        child._owner = False
+        child._pending = []
+        child._uploads = []
+        return child
+
+    def close(self) -> None:
+        if self._owner:
+            self._executor.shutdown()
+
+
+def open_sink(
+    location: str | Path, durability: DURABILITY = "fast", **s3_options: Any
+) -> Sink:
+    """sink of an output directory given as a path or a s3://bucket/prefix URL.
+
+    Args:
+        location (str | Path): local directory or s3://bucket/prefix
+        durability (DURABILITY): durability of a local directory
+        s3_options: keyword arguments of S3Sink, e.g. endpoint_url
+
+    Raises:
+        ValueError: when durability other than fast is given for S3
+    """
+    location = str(location)
+    if not location.startswith("s3://"):
+        return FileSystemSink(location, durability)
+    if durability != "fast":
+        raise ValueError("durability applies to local directories only")
+    bucket, _, prefix = location[len("s3://") :].partition("/")
+    return S3Sink(bucket, prefix, **s3_options)
@@ -0,0 +1,339 @@
+"""Statistics of a corpus of output directories, for capacity planning.
+
+manifests are read by worker processes, a chunk at a time, into partial
+aggregates which are merged into one. every aggregate has a fixed size
+whatever the number of manifests, so that neither the manifests nor the
+values in them are kept in memory.
+"""
+
+import csv
+import math
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import IO, Any, Iterable, Iterator
+
+from libefiling.manifest import Manifest
+
+# quantiles in the report
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class QuantileSketch:
+    """DDSketch: quantiles of positive values within a relative error.
+
+    values are counted in logarithmic buckets, whose boundaries are powers
+    of gamma = (1 + alpha) / (1 - alpha). sketches with the same alpha are
+    merged by adding the counts of the buckets.
+    """
+
+    def __init__(self, alpha: float = 0.01):
+        """
+        Args:
+            alpha (float): relative error of the quantiles
+        """
+        self.alpha = alpha
+        self._gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self._gamma)
+        self._buckets: dict[int, int] = {}
+        self._zero_count = 0  # values <= 0
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        if value <= 0:
+            self._zero_count += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if other.alpha != self.alpha:
+            raise ValueError("sketches of different accuracy cannot be merged")
+        self.count += other.count
+        self._zero_count += other._zero_count
+        for index, count in other._buckets.items():
+            self._buckets[index] = self._buckets.get(index, 0) + count
+
+    def quantile(self, q: float) -> float | None:
+        """value at quantile q (0 <= q <= 1) by the nearest-rank method,
+        None if no value was added."""
+        if self.count == 0:
+            return None
+        ### 0-based index of the ceil(q * n)-th smallest value
+        rank = max(math.ceil(q * self.count) - 1, 0)
+        seen = self._zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if rank < seen:
+                return 2 * self._gamma**index / (self._gamma + 1)
+        return 2 * self._gamma ** max(self._buckets) / (self._gamma + 1)
+
+
+class Distribution:
+    """count, sum, min and max of values, a histogram of power of 2
+    buckets and a quantile sketch."""
+
+    def __init__(self):
+        self.count = 0
+        self.sum: float = 0
+        self.min: float | None = None
+        self.max: float | None = None
+        # exponent k -> number of values in (2 ** (k - 1), 2 ** k],
+        # None -> number of values <= 0
+        self.histogram: dict[int | None, int] = {}
+        self.sketch = QuantileSketch()
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        bucket = _log2_bucket(value)
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+        self.sketch.add(value)
+
+    def merge(self, other: "Distribution") -> None:
+        self.count += other.count
+        self.sum += other.sum
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+        for bucket, count in other.histogram.items():
+            self.histogram[bucket] = self.histogram.get(bucket, 0) + count
+        self.sketch.merge(other.sketch)
+
+    def quantile(self, q: float) -> float | None:
+        """approximate quantile, clamped to the values seen."""
+        value = self.sketch.quantile(q)
+        if value is None or self.min is None or self.max is None:
+            return None
+        return min(max(value, self.min), self.max)
+
+    def result(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.sum / self.count if self.count else None,
+            **{_quantile_name(q): self.quantile(q) for q in QUANTILES},
+            "histogram": [
+                {"le": 0 if bucket is None else 2.0**bucket, "count": count}
+                for bucket, count in sorted(
+                    self.histogram.items(),
+                    key=lambda item: -math.inf if item[0] is None else item[0],
+                )
+            ],
+        }
+
+
+def _log2_bucket(value: float) -> int | None:
+    if value <= 0:
+        return None
+    mantissa, exponent = math.frexp(value)  # value = mantissa * 2 ** exponent
+    return exponent - 1 if mantissa == 0.5 else exponent
+
+
+def _quantile_name(q: float) -> str:
+    return "p" + f"{q * 100:g}".replace(".", "")
+
+
+class CorpusStats:
+    """aggregates of many manifests, mergeable in any order."""
+
+    def __init__(self):
+        self.manifests = 0
+        self.errors = 0
+        # task/kind/extension of Source -> archive byte_size
+        self.archive_bytes: dict[str, Distribution] = {}
+        self.document_codes: dict[str, int] = {}
+        self.xml_kinds: dict[str, int] = {}
+        self.xml_files_per_archive = Distribution()
+        # image kind -> byte_size of the original images
+        self.image_bytes: dict[str, Distribution] = {}
+        self.image_media_types: dict[str, int] = {}
+        self.images_per_archive = Distribution()
+        # archive extension -> Stats.processing_seconds
+        self.processing_seconds: dict[str, Distribution] = {}
+
+    def add(self, manifest: Manifest) -> None:
+        self.manifests += 1
+        archive = manifest.sources.archive
+        key = f"{archive.task}/{archive.kind}/{archive.extension}"
+        self.archive_bytes.setdefault(key, Distribution()).add(archive.byte_size)
+        _count(self.document_codes, manifest.sources.document_code)
+
+        for xml_file in manifest.xml_files:
+            _count(self.xml_kinds, xml_file.kind)
+        self.xml_files_per_archive.add(len(manifest.xml_files))
+
+        for image in manifest.images:
+            _count(self.image_media_types, image.media_type)
+            if image.byte_size is not None:
+                self.image_bytes.setdefault(image.kind, Distribution()).add(
+                    image.byte_size
+                )
+        self.images_per_archive.add(len(manifest.images))
+
+        seconds = manifest.stats.processing_seconds
+        if seconds is not None:
+            by_extension = self.processing_seconds
+            by_extension.setdefault(archive.extension, Distribution()).add(seconds)
+
+    def merge(self, other: "CorpusStats") -> None:
+        self.manifests += other.manifests
+        self.errors += other.errors
+        for mine, theirs in (
+            (self.archive_bytes, other.archive_bytes),
+            (self.image_bytes, other.image_bytes),
+            (self.processing_seconds, other.processing_seconds),
+        ):
+            for key, distribution in theirs.items():
+                mine.setdefault(key, Distribution()).merge(distribution)
+        for mine_counts, their_counts in (
+            (self.document_codes, other.document_codes),
+            (self.xml_kinds, other.xml_kinds),
+            (self.image_media_types, other.image_media_types),
+        ):
+            for key, count in their_counts.items():
+                _count(mine_counts, key, count)
+        self.xml_files_per_archive.merge(other.xml_files_per_archive)
+        self.images_per_archive.merge(other.images_per_archive)
+
+    def _sections(
+        self,
+    ) -> Iterator[tuple[str, dict[str, Distribution] | dict[str, int]]]:
+        yield "archive_bytes", self.archive_bytes
+        yield "document_codes", self.document_codes
+        yield "xml_kinds", self.xml_kinds
+        yield "xml_files_per_archive", {"": self.xml_files_per_archive}
+        yield "image_bytes", self.image_bytes
+        yield "image_media_types", self.image_media_types
+        yield "images_per_archive", {"": self.images_per_archive}
+        yield "processing_seconds", self.processing_seconds
+
+    def result(self) -> dict[str, Any]:
+        """the report as a JSON object."""
+        report: dict[str, Any] = {"manifests": self.manifests, "errors": self.errors}
+        for name, section in self._sections():
+            values = {
+                key: value.result() if isinstance(value, Distribution) else value
+                for key, value in sorted(section.items())
+            }
+            report[name] = values[""] if list(values) == [""] else values
+        return report
+
+    def write_csv(self, stream: IO[str]) -> None:
+        """write the report as CSV, a row per count or distribution."""
+        quantiles = [_quantile_name(q) for q in QUANTILES]
+        writer = csv.writer(stream)
+        writer.writerow(
+            ["metric", "key", "count", "sum", "min", "max", "mean", *quantiles]
+        )
+        writer.writerow(["manifests", "", self.manifests])
+        writer.writerow(["errors", "", self.errors])
+        for name, section in self._sections():
+            for key, value in sorted(section.items()):
+                if not isinstance(value, Distribution):
+                    writer.writerow([name, key, value])
+                    continue
+                result = value.result()
+                writer.writerow(
+                    [name, key]
+                    + [
+                        result[column]
+                        for column in ("count", "sum", "min", "max", "mean", *quantiles)
+                    ]
+                )
+
+
+def _count(counts: dict[str, int], key: str, n: int = 1) -> None:
+    counts[key] = counts.get(key, 0) + n
+
+
+def iter_manifest_paths(roots: Iterable[str | Path]) -> Iterator[Path]:
+    """find manifest.json under roots, without descending into output
+    directories.
+
+    Args:
+        roots (Iterable[str | Path]): output directories or roots of layouts
+
+    Yields:
+        Path: path of a manifest.json
+    """
+    for root in roots:
+        for directory, dirnames, filenames in os.walk(root):
+            if "manifest.json" in filenames:
+                dirnames.clear()
+                yield Path(directory) / "manifest.json"
+            else:
+                dirnames.sort()
+
+
+def _collect(manifest_paths: list[Path]) -> CorpusStats:
+    """aggregate a chunk of manifests, reading one at a time."""
+    stats = CorpusStats()
+    for path in manifest_paths:
+        try:
+            manifest = Manifest.load_json(path)
+        except (OSError, ValueError):
+            stats.errors += 1
+            continue
+        stats.add(manifest)
+    return stats
+
+
+def _chunks(paths: Iterator[Path], size: int) -> Iterator[list[Path]]:
+    chunk = []
+    for path in paths:
+        chunk.append(path)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def collect_stats(
+    roots: Iterable[str | Path],
+    max_workers: int | None = None,
+    chunk_size: int = 256,
+) -> CorpusStats:
+    """aggregate the manifests under roots on a process pool.
+
+    the manifests are found while being aggregated, and only a few chunks
+    per worker are in flight at a time.
+
+    Args:
+        roots (Iterable[str | Path]): output directories or roots of layouts
+        max_workers (int | None): number of worker processes, the number of
+            CPUs when None. 1 aggregates in this process.
+        chunk_size (int): number of manifests per task
+
+    Returns:
+        CorpusStats: aggregates of all the manifests. unreadable ones are
+            counted in errors.
+    """
+    total = CorpusStats()
+    chunks = _chunks(iter_manifest_paths(roots), chunk_size)
+    if max_workers == 1:
+        for chunk in chunks:
+            total.merge(_collect(chunk))
+        return total
+
+    workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: set[Future[CorpusStats]] = set()
+        for chunk in chunks:
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    total.merge(future.result())
+            pending.add(executor.submit(_collect, chunk))
+        for future in pending:
+            total.merge(future.result())
+    return total
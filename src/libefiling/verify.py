@@ -0,0 +1,167 @@
+"""Integrity check of output directories against their manifest.json."""
+
+import json
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+from libefiling.archive.utils import generate_sha256
+from libefiling.manifest import Manifest
+
+# sidecar file of incremental verification, kept next to manifest.json
+VERIFY_STATE_FILENAME = ".libefiling-verify.json"
+
+_IMAGE_SUFFIXES = {".tif", ".tiff", ".jpg", ".jpeg"}
+
+
+class VerifyReport(BaseModel):
+    root: str
+    checked: int = 0
+    trusted: int = 0
+    missing: List[str] = Field(default_factory=list)
+    extra: List[str] = Field(default_factory=list)
+    mismatched: List[str] = Field(default_factory=list)
+    # why the directory could not be verified, e.g. an unreadable manifest.json
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return not (self.missing or self.extra or self.mismatched or self.error)
+
+
+def expected_files(manifest: Manifest) -> dict[str, str]:
+    """return sha256 of every file listed in a manifest by path relative to root.
+
+    Args:
+        manifest (Manifest): manifest of the output directory
+
+    Returns:
+        dict[str, str]: relative path -> sha256
+    """
+    paths = manifest.paths
+    files = {}
+    for xml_file in manifest.xml_files:
+        files[(paths.xml_dir / xml_file.filename).as_posix()] = xml_file.sha256
+    for image in manifest.images:
+        files[(paths.raw_dir / image.filename).as_posix()] = image.sha256
+        if paths.images_dir is not None:
+            for derivative in image.derivatives:
+                relpath = (paths.images_dir / derivative.filename).as_posix()
+                files[relpath] = derivative.sha256
+    return files
+
+
+def _listed_dirs(manifest: Manifest) -> list[tuple[Path, set[str] | None]]:
+    """directories whose files must all be in the manifest,
+    with the suffixes to look at (None for all files)."""
+    paths = manifest.paths
+    dirs: list[tuple[Path, set[str] | None]] = [
+        (paths.xml_dir, {".xml"}),
+        (paths.raw_dir, _IMAGE_SUFFIXES),
+    ]
+    if paths.images_dir is not None:
+        dirs.append((paths.images_dir, None))
+    return dirs
+
+
+def _load_state(path: Path) -> dict[str, list]:
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_state(path: Path, state: dict[str, list]) -> None:
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump(state, f)
+    tmp_path.replace(path)
+
+
+def verify_output(
+    output_dir: str | Path,
+    incremental: bool = False,
+    max_workers: int | None = None,
+    executor: Executor | None = None,
+) -> VerifyReport:
+    """rehash every file listed in manifest.json and compare.
+
+    in incremental mode, files whose size and mtime are unchanged since the
+    last successful verification are trusted without rehashing. the state is
+    kept in a sidecar file next to manifest.json.
+
+    Args:
+        output_dir (str | Path): output directory of parse_archive
+        incremental (bool): trust files unchanged since the last verification
+        max_workers (int | None): number of hashing threads
+        executor (Executor | None): executor to share between many directories.
+            max_workers is ignored when given.
+
+    Returns:
+        VerifyReport: missing, extra and mismatched files relative to output_dir
+
+    Raises:
+        OSError: when manifest.json cannot be read
+        ValueError: when manifest.json is not a valid manifest
+    """
+    root = Path(output_dir)
+    manifest = Manifest.load_json(root / "manifest.json")
+    expected = expected_files(manifest)
+    report = VerifyReport(root=str(root))
+
+    state_path = root / VERIFY_STATE_FILENAME
+    state = _load_state(state_path) if incremental else {}
+    new_state: dict[str, list] = {}
+
+    to_hash: list[tuple[str, os.stat_result]] = []
+    for relpath, sha256 in expected.items():
+        try:
+            st = (root / relpath).stat()
+        except FileNotFoundError:
+            report.missing.append(relpath)
+            continue
+        if state.get(relpath) == [st.st_size, st.st_mtime_ns, sha256]:
+            report.trusted += 1
+            new_state[relpath] = state[relpath]
+        else:
+            to_hash.append((relpath, st))
+
+    own_executor = executor is None
+    if executor is None:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        digests = executor.map(
+            generate_sha256, [root / relpath for relpath, _ in to_hash]
+        )
+        for (relpath, st), digest in zip(to_hash, digests, strict=True):
+            report.checked += 1
+            if digest == expected[relpath]:
+                new_state[relpath] = [st.st_size, st.st_mtime_ns, digest]
+            else:
+                report.mismatched.append(relpath)
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    for directory, suffixes in _listed_dirs(manifest):
+        if not (root / directory).is_dir():
+            continue
+        for file_path in (root / directory).iterdir():
+            if not file_path.is_file():
+                continue
+            if suffixes is not None and file_path.suffix.lower() not in suffixes:
+                continue
+            relpath = (directory / file_path.name).as_posix()
+            if relpath not in expected:
+                report.extra.append(relpath)
+
+    report.missing.sort()
+    report.extra.sort()
+    report.mismatched.sort()
+    if incremental:
+        _save_state(state_path, new_state)
+    return report
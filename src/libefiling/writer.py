@@ -0,0 +1,141 @@
+"""Writes of output files, and the change set of a run."""
+
+import hashlib
+from pathlib import Path
+from typing import List
+
+from pydantic import BaseModel, Field
+
+from libefiling.sink import DURABILITY, FileSystemSink, Sink
+
+
+class ChangeSet(BaseModel):
+    added: List[str] = Field(default_factory=list)
+    changed: List[str] = Field(default_factory=list)
+    removed: List[str] = Field(default_factory=list)
+    unchanged: int = 0
+
+
+class OutputWriter:
+    """write output files under root to a sink and record what has changed.
+
+    in incremental mode, a file whose content is byte-identical to the
+    existing one is left untouched, so that its mtime is kept.
+    known maps paths relative to root to the sha256 recorded by the
+    previous run; a file whose size or hash differs is rewritten without
+    being read back. the others are compared with the existing file by
+    the sink, byte for byte or by the ETag on S3, so that a file modified
+    since the previous run is rewritten.
+
+    used as a context manager, the sink is finished on success and
+    aborted on error.
+    """
+
+    def __init__(
+        self,
+        root: str | Path,
+        incremental: bool = False,
+        known: dict[str, str] | None = None,
+        durability: DURABILITY = "fast",
+        sink: Sink | None = None,
+    ):
+        """
+        Args:
+            root (str | Path): output directory. paths given to the writer
+                are under root, and stored in the sink relative to it.
+            incremental (bool): skip identical files and record the changes
+            known (dict[str, str] | None): sha256 of the previous run by relpath
+            durability (DURABILITY): durability of the FileSystemSink of root,
+                which is created when sink is None
+            sink (Sink | None): destination of the files
+        """
+        self.root = Path(root)
+        self.incremental = incremental
+        self.sink = sink if sink is not None else FileSystemSink(root, durability)
+        self._known = known or {}
+        self._written: set[str] = set()
+        self.changes = ChangeSet()
+
+    def __enter__(self) -> "OutputWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.sink.finish()
+        else:
+            self.sink.abort()
+
+    def _relpath(self, path: Path) -> str:
+        return path.relative_to(self.root).as_posix()
+
+    def _is_identical(self, relpath: str, size: int | None, data: bytes) -> bool:
+        if size is None or size != len(data):
+            return False
+        known = self._known.get(relpath)
+        if known is not None and hashlib.sha256(data).hexdigest() != known:
+            return False
+        return self.sink.matches(relpath, data)
+
+    def write(self, path: str | Path, data: bytes, record: bool = True) -> None:
+        """write data to path, which must be under root.
+
+        Args:
+            path (str | Path): destination path
+            data (bytes): content of the file
+            record (bool): record the file in the change set. False for
+                files describing the run itself, such as changes.json.
+        """
+        relpath = self._relpath(Path(path))
+        if not record or not self.incremental:
+            self.sink.write(relpath, data)
+            return
+        self._written.add(relpath)
+        size = self.sink.size(relpath)
+        if self._is_identical(relpath, size, data):
+            self.changes.unchanged += 1
+            self.sink.keep(relpath)
+            return
+        if size is not None:
+            self.changes.changed.append(relpath)
+        else:
+            self.changes.added.append(relpath)
+        self.sink.write(relpath, data)
+
+    def keep(self, path: str | Path) -> None:
+        """keep the existing file of a previous run as it is.
+
+        Args:
+            path (str | Path): path under root, whose file exists in the sink
+        """
+        relpath = self._relpath(Path(path))
+        self._written.add(relpath)
+        self.changes.unchanged += 1
+        self.sink.keep(relpath)
+
+    def prune(self, directory: str | Path) -> None:
+        """remove files in directory which were not written by this run.
+
+        does nothing unless in incremental mode.
+
+        Args:
+            directory (str | Path): directory under root
+        """
+        if not self.incremental:
+            return
+        for relpath in self.sink.list_files(self._relpath(Path(directory))):
+            if relpath not in self._written:
+                self.remove(self.root / relpath)
+
+    def remove(self, path: str | Path) -> None:
+        """remove a file no longer produced, if it exists.
+
+        does nothing unless in incremental mode.
+
+        Args:
+            path (str | Path): file path under root
+        """
+        relpath = self._relpath(Path(path))
+        if not self.incremental or self.sink.size(relpath) is None:
+            return
+        self.sink.delete(relpath)
+        self.changes.removed.append(relpath)
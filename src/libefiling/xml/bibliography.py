@@ -0,0 +1,105 @@
+"""Bibliographic keys collected from XMLs while their charset is converted."""
+
+from typing import NamedTuple
+from xml.etree import ElementTree as ET
+
+from libefiling.xml.kind import XML_KIND
+
+
+class BibliographyField(NamedTuple):
+    """a field to be collected into the bibliography section of the manifest.
+
+    path is an ElementTree path (a subset of XPath) evaluated against
+    the root element. use {*} to match both jp: prefixed and unprefixed tags.
+    kinds are tried in order and the first kind having a match wins.
+    """
+
+    name: str
+    kinds: tuple[XML_KIND, ...]
+    path: str
+
+
+DEFAULT_BIBLIOGRAPHY_FIELDS: tuple[BibliographyField, ...] = (
+    BibliographyField(
+        "application_number",
+        ("procedure", "bibliographic-info", "management-info"),
+        ".//{*}application-reference//{*}doc-number",
+    ),
+    BibliographyField(
+        "filing_date",
+        ("procedure", "bibliographic-info", "management-info"),
+        ".//{*}application-reference//{*}date",
+    ),
+    BibliographyField(
+        "document_name",
+        ("procedure", "request", "management-info", "notice"),
+        ".//{*}document-name",
+    ),
+    BibliographyField(
+        "file_reference_id",
+        ("request", "procedure", "management-info"),
+        ".//{*}file-reference-id",
+    ),
+    BibliographyField(
+        "applicants",
+        ("request", "bibliographic-info", "procedure"),
+        ".//{*}applicant//{*}name",
+    ),
+)
+
+
+class BibliographyExtractor:
+    """collect bibliography fields from XML trees that are already parsed.
+
+    feed() is meant to be called with the root element built for charset
+    conversion, so that no XML is parsed twice.
+    """
+
+    def __init__(
+        self, fields: tuple[BibliographyField, ...] = DEFAULT_BIBLIOGRAPHY_FIELDS
+    ):
+        self._fields = fields
+        # name -> (priority of the kind, values)
+        self._found: dict[str, tuple[int, list[str]]] = {}
+
+    def feed(self, kind: XML_KIND, root: ET.Element) -> None:
+        """collect the fields targeting kind from root.
+
+        Args:
+            kind (XML_KIND): kind of the XML
+            root (ET.Element): root element of the XML
+        """
+        for field in self._fields:
+            if kind not in field.kinds:
+                continue
+            priority = field.kinds.index(kind)
+            found = self._found.get(field.name)
+            if found is not None and found[0] <= priority:
+                continue
+            values = [
+                text
+                for element in root.iterfind(field.path)
+                if (text := "".join(element.itertext()).strip())
+            ]
+            if values:
+                self._found[field.name] = (priority, values)
+
+    def merge(self, other: "BibliographyExtractor") -> None:
+        """take the values collected by other, as if its XMLs were fed
+        after the ones fed to this extractor.
+
+        Args:
+            other (BibliographyExtractor): extractor with the same fields
+        """
+        for name, (priority, values) in other._found.items():
+            found = self._found.get(name)
+            if found is None or priority < found[0]:
+                self._found[name] = (priority, values)
+
+    def result(self) -> dict[str, list[str]]:
+        """return collected values by field name, in the order of the fields."""
+        return {
+            field.name: self._found[field.name][1]
+            for field in self._fields
+            if field.name in self._found
+        }
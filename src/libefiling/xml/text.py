@@ -0,0 +1,158 @@
+"""Text content of converted XMLs as JSON Lines, for search indexing."""
+
+import io
+import json
+from pathlib import Path
+from typing import BinaryIO, Iterator, Mapping, TextIO
+from xml.etree import ElementTree as ET
+
+from libefiling.manifest import Manifest
+from libefiling.xml.kind import XML_KIND
+
+# kind -> local names of the elements whose text is emitted as one record
+DEFAULT_TEXT_SECTIONS: dict[XML_KIND, tuple[str, ...]] = {
+    "application-body": ("description", "claims", "abstract"),
+    "foreign-language-body": ("description", "claims", "abstract"),
+}
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def iter_text_sections(
+    xml_path: str | Path | BinaryIO, sections: tuple[str, ...]
+) -> Iterator[tuple[str, str]]:
+    """stream text of the section elements of an XML file.
+
+    the XML is parsed incrementally. every element is dropped as soon as
+    it ends and only its text is kept, so memory is bounded by the text of
+    the largest section and the depth of the XML, not by the file.
+
+    Args:
+        xml_path (str | Path | BinaryIO): path of a converted XML, or a
+            binary stream of it
+        sections (tuple[str, ...]): local names of the section elements.
+            nested sections are emitted as part of the outermost one.
+
+    Yields:
+        tuple[str, str]: element path such as application-body/claims, and text
+    """
+    path: list[str] = []
+    elements: list[ET.Element] = []
+    # one frame per open element inside a section:
+    # [text parts, (text, element) of the last ended child, has children]
+    frames: list[list] = []
+    capturing = 0  # depth of the section element being captured, 0 if none
+    source = str(xml_path) if isinstance(xml_path, (str, Path)) else xml_path
+    for event, element in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if capturing:
+                _close_child(frames[-1], elements[-1])
+            path.append(_local_name(element.tag))
+            elements.append(element)
+            if not capturing and path[-1] in sections:
+                capturing = len(path)
+            if capturing:
+                frames.append([[], None, False])
+            continue
+
+        if capturing:
+            frame = frames.pop()
+            _close_child(frame, element)
+            text = "".join(frame[0])
+            if capturing == len(path):
+                text = text.strip()
+                if text:
+                    yield "/".join(path), text
+                capturing = 0
+            else:
+                # tail of element is known only when the next sibling starts
+                # or the parent ends, keep it pending until then.
+                frames[-1][1] = (text, element)
+        path.pop()
+        elements.pop()
+        if elements:
+            # element is always the last child of its parent when it ends
+            del elements[-1][-1]
+
+
+def _close_child(frame: list, parent: ET.Element) -> None:
+    """move text of the pending child, or text of parent before its first
+    child, into the parts of frame."""
+    if not frame[2]:
+        frame[0].append(parent.text or "")
+        frame[2] = True
+    elif frame[1] is not None:
+        text, child = frame[1]
+        frame[0].append(text)
+        frame[0].append(child.tail or "")
+        frame[1] = None
+
+
+def iter_text_records(
+    manifest: Manifest,
+    root: str | Path,
+    sections: dict[XML_KIND, tuple[str, ...]] = DEFAULT_TEXT_SECTIONS,
+    xml_data: Mapping[str, bytes] | None = None,
+) -> Iterator[dict[str, str]]:
+    """stream text records of the XMLs listed in a manifest.
+
+    Args:
+        manifest (Manifest): manifest of the output directory
+        root (str | Path): output directory containing manifest.json
+        sections (dict[XML_KIND, tuple[str, ...]]): sections to emit by kind
+        xml_data (Mapping[str, bytes] | None): converted XMLs by filename,
+            read instead of the files under root when given.
+
+    Yields:
+        dict[str, str]: record with archive, sha256, file, kind, path and text
+    """
+    xml_dir = Path(root) / manifest.paths.xml_dir
+    archive = manifest.sources.archive
+    for xml_file in manifest.xml_files:
+        kind_sections = sections.get(xml_file.kind)
+        if not kind_sections:
+            continue
+        source = (
+            io.BytesIO(xml_data[xml_file.filename])
+            if xml_data is not None
+            else xml_dir / xml_file.filename
+        )
+        for path, text in iter_text_sections(source, kind_sections):
+            yield {
+                "archive": archive.filename,
+                "sha256": archive.sha256,
+                "file": xml_file.filename,
+                "kind": xml_file.kind,
+                "path": path,
+                "text": text,
+            }
+
+
+def write_text_jsonl(
+    manifest: Manifest,
+    root: str | Path,
+    out: TextIO,
+    sections: dict[XML_KIND, tuple[str, ...]] = DEFAULT_TEXT_SECTIONS,
+    xml_data: Mapping[str, bytes] | None = None,
+) -> int:
+    """write text records of an output directory to out as JSON Lines.
+
+    Args:
+        manifest (Manifest): manifest of the output directory
+        root (str | Path): output directory containing manifest.json
+        out (TextIO): destination, may be shared by many output directories
+        sections (dict[XML_KIND, tuple[str, ...]]): sections to emit by kind
+        xml_data (Mapping[str, bytes] | None): converted XMLs by filename,
+            read instead of the files under root when given.
+
+    Returns:
+        int: number of records written
+    """
+    count = 0
+    for record in iter_text_records(manifest, root, sections, xml_data):
+        out.write(json.dumps(record, ensure_ascii=False))
+        out.write("\n")
+        count += 1
+    return count
@@ -0,0 +1,155 @@
+import hashlib
+import io
+import struct
+import zipfile
+
+import pytest
+
+from libefiling.archive.check import check_archive, check_archives
+
+
+def _zip(members: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as zip_file:
+        for name, data in members.items():
+            zip_file.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _patch_member(data: bytes, name: str, flag_bits: int, method: int) -> bytes:
+    """set general purpose flags and compression method of a stored member,
+    in its local header and central directory entry."""
+    out = bytearray(data)
+    encoded = name.encode()
+    local = out.index(b"PK\x03\x04")
+    while out[local + 30 : local + 30 + len(encoded)] != encoded:
+        local = out.index(b"PK\x03\x04", local + 4)
+    struct.pack_into("<HH", out, local + 6, flag_bits, method)
+    central = out.index(b"PK\x01\x02")
+    while out[central + 46 : central + 46 + len(encoded)] != encoded:
+        central = out.index(b"PK\x01\x02", central + 4)
+    struct.pack_into("<HH", out, central + 8, flag_bits, method)
+    return bytes(out)
+
+
+def _jpc(
+    first: bytes, second: bytes, signature: bytes = b"\x30\x31\x32\x30\x31\x30"
+) -> bytes:
+    """archive with a 0x32 byte header and two parts, a JPC by default."""
+    header = bytearray(0x32)
+    header[0:6] = signature
+    struct.pack_into(">L", header, 0x06, 0x32 + len(first) + len(second) - 6)
+    struct.pack_into(">L", header, 0x0A, len(first))
+    struct.pack_into(">L", header, 0x12, len(second))
+    return bytes(header) + first + second
+
+
+def test_valid_archive(tmp_path):
+    path = tmp_path / "a.JPC"
+    path.write_bytes(_jpc(_zip({"a.xml": b"<a/>"}), _zip({"b.xml": b"<b/>"})))
+    result = check_archive(path)
+    assert result.ok
+    assert result.handler == "ArchiveHandlerAAAJPC"
+    assert result.byte_size == path.stat().st_size
+
+
+@pytest.mark.parametrize(
+    "flag_bits, method, message",
+    [(0x1, zipfile.ZIP_STORED, "encrypted"), (0, 99, "compression method")],
+)
+def test_unreadable_member_is_reported(tmp_path, flag_bits, method, message):
+    first = _patch_member(
+        _zip({"bad.xml": b"<a/>", "good.xml": b"<b/>"}), "bad.xml", flag_bits, method
+    )
+    corrupt = bytearray(_zip({"c.xml": b"<c/>"}))
+    corrupt[corrupt.index(b"<c/>")] ^= 0xFF
+    path = tmp_path / "a.JPC"
+    path.write_bytes(_jpc(first, bytes(corrupt)))
+
+    result = check_archive(path)
+    assert len(result.errors) == 2
+    assert result.errors[0].startswith("first part: bad.xml: ")
+    assert message in result.errors[0]
+    assert result.errors[1].startswith("second part: c.xml: Bad CRC-32")
+
+
+def test_unreadable_archives_do_not_stop_the_batch(tmp_path):
+    good = tmp_path / "good.JPC"
+    good.write_bytes(_jpc(_zip({"a.xml": b"<a/>"}), _zip({})))
+    empty = tmp_path / "empty.JPC"
+    empty.write_bytes(b"")
+    truncated = tmp_path / "truncated.JPC"
+    truncated.write_bytes(good.read_bytes()[:8])
+    missing = tmp_path / "missing.JPC"
+
+    paths = [empty, truncated, missing, good]
+    results = list(check_archives(paths, max_workers=1))
+    assert [result.path for result in results] == [str(path) for path in paths]
+    assert [result.ok for result in results] == [False, False, False, True]
+    assert results[0].errors == ["unsupported signature: b''"]
+    assert results[2].errors[0].startswith("FileNotFoundError: ")
+
+
+def _signed_data(content: bytes, digests: list[bytes]) -> bytes:
+    """SignedData of content with a SHA-256 signer per messageDigest value."""
+    cms = pytest.importorskip("asn1crypto.cms")
+    x509 = pytest.importorskip("asn1crypto.x509")
+    signer_infos = [
+        cms.SignerInfo(
+            {
+                "version": "v1",
+                "sid": cms.SignerIdentifier(
+                    {
+                        "issuer_and_serial_number": {
+                            "issuer": x509.Name.build({"common_name": "test"}),
+                            "serial_number": serial_number,
+                        }
+                    }
+                ),
+                "digest_algorithm": {"algorithm": "sha256"},
+                "signed_attrs": [
+                    {"type": "content_type", "values": ["data"]},
+                    {"type": "message_digest", "values": [digest]},
+                ],
+                "signature_algorithm": {"algorithm": "rsassa_pkcs1v15"},
+                "signature": b"\0" * 16,
+            }
+        )
+        for serial_number, digest in enumerate(digests)
+    ]
+    return cms.SignedData(
+        {
+            "version": "v1",
+            "digest_algorithms": [{"algorithm": "sha256"}],
+            "encap_content_info": {"content_type": "data", "content": content},
+            "signer_infos": signer_infos,
+        }
+    ).dump()
+
+
+def test_message_digest_of_signed_data(tmp_path):
+    content = _zip({"b.xml": b"<b/>"})
+    digest = hashlib.sha256(content).digest()
+    path = tmp_path / "a.JWX"
+
+    path.write_bytes(
+        _jpc(
+            _zip({"a.xml": b"<a/>"}),
+            _signed_data(content, [digest, digest]),
+            b"\x49\x31\x32\x30\x31\x30",
+        )
+    )
+    result = check_archive(path)
+    assert result.handler == "ArchiveHandlerAAAJWX"
+    assert result.ok
+
+    path.write_bytes(
+        _jpc(
+            _zip({"a.xml": b"<a/>"}),
+            _signed_data(content, [digest, hashlib.sha256(b"other").digest()]),
+            b"\x49\x31\x32\x30\x31\x30",
+        )
+    )
+    assert check_archive(path).errors == [
+        "second part: signer 1: messageDigest mismatch"
+    ]
@@ -0,0 +1,93 @@
+import io
+import struct
+import zipfile
+
+import pytest
+
+from libefiling.archive.extract import extract_archive_data
+
+
+class _Unseekable(io.RawIOBase):
+    """write-only stream, on which zipfile writes data descriptors."""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+
+# name -> (compression method, content), in the order of the archive
+MEMBERS = {
+    "stored.xml": (zipfile.ZIP_STORED, b"<stored/>" * 100),
+    "deflated.xml": (zipfile.ZIP_DEFLATED, b"<deflated/>" * 1000),
+    "empty.xml": (zipfile.ZIP_DEFLATED, b""),
+    "bzip2.xml": (zipfile.ZIP_BZIP2, b"<bzip2/>" * 1000),
+    "image.tif": (zipfile.ZIP_DEFLATED, bytes(range(256)) * 64),
+}
+
+
+def _zip(members, data_descriptor: bool = False) -> bytes:
+    stream = _Unseekable() if data_descriptor else io.BytesIO()
+    with zipfile.ZipFile(stream, "w") as zip_file:
+        for name, (method, data) in members.items():
+            info = zipfile.ZipInfo(name)
+            info.compress_type = method
+            with zip_file.open(info, "w") as member:
+                member.write(data)
+    data = (stream.buffer if data_descriptor else stream).getvalue()
+    with zipfile.ZipFile(io.BytesIO(data)) as zip_file:
+        assert all(
+            bool(info.flag_bits & 0x8) == data_descriptor
+            for info in zip_file.infolist()
+        )
+    return data
+
+
+def _jpc(first: bytes) -> bytes:
+    second = _zip({})
+    header = bytearray(0x32)
+    header[0:6] = b"\x30\x31\x32\x30\x31\x30"
+    struct.pack_into(">L", header, 0x06, 0x32 + len(first) + len(second) - 6)
+    struct.pack_into(">L", header, 0x0A, len(first))
+    struct.pack_into(">L", header, 0x12, len(second))
+    return bytes(header) + first + second
+
+
+@pytest.mark.parametrize("data_descriptor", [False, True])
+@pytest.mark.parametrize("unzip_workers", [2, 8])
+def test_parallel_unzip_matches_serial(data_descriptor, unzip_workers):
+    archive = _jpc(_zip(MEMBERS, data_descriptor))
+    serial = extract_archive_data(archive, unzip_workers=1)
+    assert serial == [(name, data) for name, (_, data) in MEMBERS.items()]
+
+    seconds: dict[str, float] = {}
+    assert extract_archive_data(archive, "a.JPC", unzip_workers, seconds) == serial
+    assert sorted(seconds) == sorted(MEMBERS)
+
+
+def _corrupt_stored(data: bytes) -> bytes:
+    out = bytearray(data)
+    out[out.index(b"<stored/>")] ^= 0xFF
+    return bytes(out)
+
+
+def _corrupt_crc(data: bytes) -> bytes:
+    """change the CRC-32 of deflated.xml recorded in the central directory."""
+    out = bytearray(data)
+    central = out.index(b"PK\x01\x02")
+    while out[central + 46 : central + 58] != b"deflated.xml":
+        central = out.index(b"PK\x01\x02", central + 4)
+    out[central + 16] ^= 0xFF
+    return bytes(out)
+
+
+@pytest.mark.parametrize("corrupt", [_corrupt_stored, _corrupt_crc])
+@pytest.mark.parametrize("unzip_workers", [1, 4])
+def test_corrupt_member_is_rejected(corrupt, unzip_workers):
+    archive = _jpc(corrupt(_zip(MEMBERS)))
+    with pytest.raises(zipfile.BadZipFile, match="Bad CRC-32"):
+        extract_archive_data(archive, unzip_workers=unzip_workers)
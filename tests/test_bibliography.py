@@ -0,0 +1,153 @@
+import io
+import struct
+import zipfile
+from xml.etree import ElementTree as ET
+
+import pytest
+
+from libefiling.parse import ParsedArchive
+from libefiling.xml.bibliography import (
+    DEFAULT_BIBLIOGRAPHY_FIELDS,
+    BibliographyExtractor,
+    BibliographyField,
+)
+
+ARCHIVE_NAME = "202501010000123456_A163_____XXXXXXXXXX__99999999999_____AAA.JPC"
+
+
+def _application(number: str, date: str = "") -> str:
+    return (
+        "<jp:application-reference><document-id>"
+        f"<doc-number>{number}</doc-number><date>{date}</date>"
+        "</document-id></jp:application-reference>"
+    )
+
+
+def _xml(body: str) -> bytes:
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<root xmlns:jp="http://www.jpo.go.jp">{body}</root>'
+    ).encode()
+
+
+### kind -> XML having a value of some fields, each kind a different one
+XMLS = {
+    "procedure": _xml(
+        _application("2025-000001") + "<document-name>procedure</document-name>"
+    ),
+    "bibliographic-info": _xml(
+        _application("2025-000002", "20250102")
+        + "<jp:applicant><name>bibl</name></jp:applicant>"
+    ),
+    "management-info": _xml(
+        _application("2025-000003", "20250103")
+        + "<jp:file-reference-id>mngt</jp:file-reference-id>"
+    ),
+    "request": _xml(
+        "<jp:file-reference-id>requ</jp:file-reference-id>"
+        "<jp:applicant><name>first</name></jp:applicant>"
+        "<jp:applicant><name> second </name></jp:applicant>"
+        "<jp:applicant><name> </name></jp:applicant>"
+    ),
+    "notice": _xml("<document-name>notice</document-name>"),
+}
+
+EXPECTED = {
+    "application_number": ["2025-000001"],
+    "filing_date": ["20250102"],
+    "document_name": ["procedure"],
+    "file_reference_id": ["requ"],
+    "applicants": ["first", "second"],
+}
+
+
+def _extractor(kinds) -> BibliographyExtractor:
+    extractor = BibliographyExtractor()
+    for kind in kinds:
+        extractor.feed(kind, ET.fromstring(XMLS[kind]))
+    return extractor
+
+
+def test_first_kind_having_a_match_wins():
+    """an empty element does not match, and the next kind is tried."""
+    assert _extractor(XMLS).result() == EXPECTED
+    assert _extractor(["notice", "management-info"]).result() == {
+        "application_number": ["2025-000003"],
+        "filing_date": ["20250103"],
+        "document_name": ["notice"],
+        "file_reference_id": ["mngt"],
+    }
+
+
+def test_kinds_not_targeted_are_ignored():
+    field = BibliographyField("name", ("request",), ".//{*}name")
+    extractor = BibliographyExtractor((field,))
+    extractor.feed("bibliographic-info", ET.fromstring(XMLS["bibliographic-info"]))
+    assert extractor.result() == {}
+
+
+def _orders(kinds: list[str]) -> list[list[str]]:
+    """every rotation of kinds, forward and backward."""
+    rotations = [kinds[i:] + kinds[:i] for i in range(len(kinds))]
+    return rotations + [rotation[::-1] for rotation in rotations]
+
+
+@pytest.mark.parametrize("kinds", _orders(list(XMLS)))
+def test_feed_does_not_depend_on_the_order(kinds):
+    assert _extractor(kinds).result() == EXPECTED
+
+
+@pytest.mark.parametrize("split", range(len(XMLS) + 1))
+def test_merge_does_not_depend_on_the_order(split):
+    kinds = list(XMLS)
+    first, second = _extractor(kinds[:split]), _extractor(kinds[split:])
+    reverse = _extractor(kinds[split:])
+    reverse.merge(_extractor(kinds[:split]))
+    first.merge(second)
+    assert first.result() == reverse.result() == EXPECTED
+
+
+def _jpc(members: dict[str, bytes]) -> bytes:
+    parts = []
+    for part in (members, {}):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zip_file:
+            for name, data in part.items():
+                zip_file.writestr(name, data)
+        parts.append(buffer.getvalue())
+    first, second = parts
+    header = bytearray(0x32)
+    header[0:6] = b"\x30\x31\x32\x30\x31\x30"
+    struct.pack_into(">L", header, 0x06, 0x32 + len(first) + len(second) - 6)
+    struct.pack_into(">L", header, 0x0A, len(first))
+    struct.pack_into(">L", header, 0x12, len(second))
+    return bytes(header) + first + second
+
+
+@pytest.mark.parametrize("reverse", [False, True])
+def test_manifest_bibliography(reverse):
+    """the procedure XML comes last in the manifest, and still wins."""
+    members = {
+        "JPOXMLDOC01-jpbibl.xml": XMLS["bibliographic-info"],
+        "JPOXMLDOC01-requ.xml": XMLS["request"],
+        "X-jpmngt.xml": XMLS["management-info"],
+        "X-jpntce.xml": XMLS["notice"],
+    }
+    parsed = ParsedArchive.from_bytes(
+        ARCHIVE_NAME,
+        _jpc(members),
+        "AFM.XML",
+        XMLS["procedure"],
+        bibliography_fields=DEFAULT_BIBLIOGRAPHY_FIELDS,
+    )
+    ### converting the XMLs in another order does not change the result
+    for filename in sorted(parsed.xml_filenames, reverse=reverse):
+        parsed.xml(filename)
+    assert parsed.manifest.bibliography == EXPECTED
+
+
+def test_manifest_bibliography_is_empty_unless_asked():
+    parsed = ParsedArchive.from_bytes(
+        ARCHIVE_NAME, _jpc({}), "AFM.XML", XMLS["procedure"]
+    )
+    assert parsed.manifest.bibliography == {}
@@ -0,0 +1,122 @@
+import io
+import struct
+import tarfile
+import zipfile
+
+import pytest
+
+from libefiling.bundle import _pair_key, iter_bundle
+from libefiling.cli import bundle_main
+
+PREFIX = "202501010000{}_A163_____XXXXXXXXXX__99999999999_____"
+PROCEDURE = b'<?xml version="1.0" encoding="UTF-8"?><procedure/>'
+
+
+def _zip(members: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        for name, data in members.items():
+            zip_file.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _jpc(members: dict[str, bytes]) -> bytes:
+    first, second = _zip(members), _zip({})
+    header = bytearray(0x32)
+    header[0:6] = b"\x30\x31\x32\x30\x31\x30"
+    struct.pack_into(">L", header, 0x06, 0x32 + len(first) + len(second) - 6)
+    struct.pack_into(">L", header, 0x0A, len(first))
+    struct.pack_into(">L", header, 0x12, len(second))
+    return bytes(header) + first + second
+
+
+def _filing(directory: str, number: str, archive: bytes | None = None):
+    name = f"{directory}{PREFIX.format(number)}"
+    return {
+        f"{name}AAA.JPC": archive or _jpc({"a.xml": b"<a/>"}),
+        f"{name}AFM.XML": PROCEDURE,
+    }
+
+
+def _tar(members: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def test_pair_key():
+    assert _pair_key("a/b/XYZAAA.JWX") == _pair_key("a/b/XYZAFM.XML") == ("a/b", "XYZ")
+    assert _pair_key("a/XYZAAA.JWX") != _pair_key("b/XYZAFM.XML")
+
+
+def _members():
+    """filings in nested directories, with a procedure stored before its
+    archive, a same-named filing in another directory and unpaired members."""
+    first = _filing("x/", "000001")
+    nested = _filing("x/y/", "000001")
+    members = {
+        **dict(reversed(first.items())),
+        **nested,
+        "x/readme.txt": b"skipped",
+        f"x/{PREFIX.format('000002')}AAA.JPC": _jpc({}),
+        f"z/{PREFIX.format('000001')}AFM.XML": PROCEDURE,
+    }
+    return members
+
+
+@pytest.mark.parametrize("kind", ["zip", "tar", "stream"])
+def test_iter_bundle(tmp_path, kind):
+    members = _members()
+    if kind == "zip":
+        bundle = tmp_path / "bundle.zip"
+        bundle.write_bytes(_zip(members))
+    elif kind == "tar":
+        bundle = tmp_path / "bundle.tgz"
+        bundle.write_bytes(_tar(members))
+    else:
+        bundle = io.BytesIO(_tar(members))
+
+    unpaired = []
+    pairs = [
+        (pair.archive.name, pair.procedure.name)
+        for pair in iter_bundle(bundle, unpaired.append)
+    ]
+    x, y = f"x/{PREFIX.format('000001')}", f"x/y/{PREFIX.format('000001')}"
+    assert pairs == [(f"{x}AAA.JPC", f"{x}AFM.XML"), (f"{y}AAA.JPC", f"{y}AFM.XML")]
+    assert sorted(member.name for member in unpaired) == [
+        f"x/{PREFIX.format('000002')}AAA.JPC",
+        f"z/{PREFIX.format('000001')}AFM.XML",
+    ]
+
+
+def _encrypted(data: bytes) -> bytes:
+    """mark every zip member of a JPC as encrypted."""
+    out = bytearray(data)
+    for signature, offset in ((b"PK\x03\x04", 6), (b"PK\x01\x02", 8)):
+        position = out.find(signature)
+        while position != -1:
+            out[position + offset] |= 0x1
+            position = out.find(signature, position + 4)
+    return bytes(out)
+
+
+def test_bundle_main_continues_after_a_failed_filing(tmp_path, capsys):
+    members = {
+        **_filing("", "000001", _encrypted(_jpc({"a.xml": b"<a/>"}))),
+        **_filing("", "000002"),
+    }
+    bundle = tmp_path / "bundle.zip"
+    bundle.write_bytes(_zip(members))
+    out_root = tmp_path / "out"
+
+    assert bundle_main([str(bundle), str(out_root)]) == 1
+    captured = capsys.readouterr()
+    assert "NG " + PREFIX.format("000001") in captured.err
+    assert "parsed=1 failed=1" in captured.err
+    assert [path.parent.name for path in out_root.rglob("manifest.json")] == [
+        PREFIX.format("000002") + "AAA"
+    ]
@@ -1,7 +1,39 @@
+import codecs
 import sys
 from pathlib import Path
 
-from libefiling.charset import convert_xml_charset
+import pytest
+
+from libefiling.charset import convert_xml_bytes, convert_xml_charset, sniff_encoding
+
+TEXT = '<?xml version="1.0"?><a>日本語①</a>'
+
+
+@pytest.mark.parametrize(
+    "data, detected, had_bom",
+    [
+        (TEXT.encode("utf-8"), "utf-8", False),
+        (TEXT.encode("cp932"), "cp932", False),
+        (b"<a>abc</a>", "ascii", False),
+        (codecs.BOM_UTF8 + TEXT.encode("utf-8"), "utf-8", True),
+        (
+            '<?xml version="1.0" encoding="Shift_JIS"?><a>①</a>'.encode("cp932"),
+            "cp932",
+            False,
+        ),
+    ],
+)
+def test_sniff_encoding(data, detected, had_bom):
+    info = sniff_encoding(data)
+    assert (info.detected, info.had_bom) == (detected, had_bom)
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "cp932"])
+def test_convert_undeclared_xml(encoding):
+    converted, info = convert_xml_bytes(TEXT.encode(encoding))
+    assert info.detected == encoding
+    assert "日本語①" in converted.decode("utf-8")
+
 
 if __name__ == "__main__":
     if len(sys.argv) != 3:
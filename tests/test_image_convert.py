@@ -0,0 +1,125 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from libefiling.image import convert
+from libefiling.image.convert import create_image_derivatives, derivative_filename
+from libefiling.parse import _image_entry
+from libefiling.sink import MemorySink
+from libefiling.writer import OutputWriter
+
+
+def test_derivative_filename_keeps_the_extension():
+    assert derivative_filename("a-D000001.tif", "webp") == "a-D000001.tif.webp"
+    assert (
+        derivative_filename("a-D000001.tif", "thumbnail")
+        == "a-D000001.tif.thumbnail.webp"
+    )
+    assert derivative_filename("foo.tif", "webp") != derivative_filename(
+        "foo.jpg", "webp"
+    )
+
+
+def _image(fmt: str, size: tuple[int, int]) -> bytes:
+    Image = pytest.importorskip("PIL.Image")
+    buffer = io.BytesIO()
+    Image.new("L", size, color=128).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def test_same_stem_images_do_not_overwrite_each_other():
+    originals = {
+        "foo.tif": _image("TIFF", (40, 30)),
+        "foo.jpg": _image("JPEG", (20, 10)),
+    }
+    images = [_image_entry(name, data) for name, data in originals.items()]
+    sink = MemorySink()
+    with OutputWriter(".", sink=sink) as writer:
+        updated = create_image_derivatives(
+            images,
+            None,
+            Path("images"),
+            max_workers=1,
+            writer=writer,
+            originals=originals,
+        )
+
+    assert sorted(sink.files) == [
+        "images/foo.jpg.thumbnail.webp",
+        "images/foo.jpg.webp",
+        "images/foo.tif.thumbnail.webp",
+        "images/foo.tif.webp",
+    ]
+    sizes = {
+        image.filename: (image.derivatives[0].width, image.derivatives[0].height)
+        for image in updated
+    }
+    assert sizes == {"foo.tif": (40, 30), "foo.jpg": (20, 10)}
+
+
+def _derive(originals, **kwargs):
+    images = [_image_entry(name, data) for name, data in originals.items()]
+    sink = MemorySink()
+    with OutputWriter(".", sink=sink) as writer:
+        updated = create_image_derivatives(
+            images,
+            None,
+            Path("images"),
+            writer=writer,
+            originals=originals,
+            **kwargs,
+        )
+    return updated, sink.files
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """sources rendered in this process."""
+    rendered = []
+    render = convert._render
+
+    def counting(src, thumbnail_size):
+        rendered.append(src)
+        return render(src, thumbnail_size)
+
+    monkeypatch.setattr(convert, "_render", counting)
+    return rendered
+
+
+def test_same_images_are_converted_once(renders):
+    data = _image("TIFF", (40, 30))
+    originals = {"a.tif": data, "b.tif": data, "c.tif": _image("TIFF", (8, 8))}
+    updated, files = _derive(originals, max_workers=1)
+
+    assert len(renders) == 2
+    assert files["images/a.tif.webp"] == files["images/b.tif.webp"]
+    assert [image.derivatives[0].sha256 for image in updated][:2] == [
+        updated[0].derivatives[0].sha256
+    ] * 2
+
+
+def test_cache(tmp_path, renders):
+    originals = {"a.tif": _image("TIFF", (40, 30)), "b.jpg": _image("JPEG", (9, 7))}
+    first, first_files = _derive(originals, cache_dir=tmp_path, max_workers=1)
+    assert len(renders) == 2
+    assert len(list(tmp_path.rglob("*.webp"))) == 4
+
+    second, second_files = _derive(originals, cache_dir=tmp_path, max_workers=1)
+    assert len(renders) == 2  # nothing converted again
+    assert second_files == first_files
+    assert second == first
+
+    # another thumbnail size is cached separately
+    _derive(originals, cache_dir=tmp_path, thumbnail_size=(16, 16), max_workers=1)
+    assert len(renders) == 4
+
+
+def test_shared_executor_is_left_running():
+    originals = {"a.tif": _image("TIFF", (40, 30)), "b.jpg": _image("JPEG", (9, 7))}
+    expected, expected_files = _derive(originals, max_workers=1)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        for _ in range(2):
+            updated, files = _derive(originals, executor=executor)
+            assert (updated, files) == (expected, expected_files)
@@ -0,0 +1,109 @@
+import io
+import struct
+
+import pytest
+
+from libefiling.image.header import ImageInfo, read_image_info, read_webp_size
+
+
+def _encode(fmt: str, size: tuple[int, int], mode: str = "L", **params) -> bytes:
+    Image = pytest.importorskip("PIL.Image")
+    buffer = io.BytesIO()
+    Image.new(mode, size, color=0).save(buffer, fmt, **params)
+    return buffer.getvalue()
+
+
+def _tiff(width: int, height: int, dpi: int, pages: int = 1) -> bytes:
+    """little endian TIFF of bilevel pages, built by hand."""
+    entries = 6
+    ifd_size = 2 + entries * 12 + 4
+    rational = 8 + pages * ifd_size
+    out = bytearray(b"II*\x00" + struct.pack("<L", 8))
+    for page in range(pages):
+        offset = 8 + page * ifd_size
+        next_offset = offset + ifd_size if page + 1 < pages else 0
+        out += struct.pack("<H", entries)
+        out += struct.pack("<HHLHH", 256, 3, 1, width, 0)
+        out += struct.pack("<HHLHH", 257, 3, 1, height, 0)
+        out += struct.pack("<HHLHH", 259, 3, 1, 4, 0)
+        out += struct.pack("<HHLL", 282, 5, 1, rational)
+        out += struct.pack("<HHLL", 283, 5, 1, rational)
+        out += struct.pack("<HHLHH", 296, 3, 1, 2, 0)
+        out += struct.pack("<L", next_offset)
+    out += struct.pack("<LL", dpi, 1)
+    return bytes(out)
+
+
+def test_tiff():
+    info = read_image_info(_tiff(2480, 3508, 300, pages=3))
+    assert info == ImageInfo(2480, 3508, 300.0, 300.0, 3, "ccitt-g4")
+
+
+def test_jpeg():
+    data = _encode("JPEG", (64, 48), dpi=(200, 200))
+    assert read_image_info(data) == ImageInfo(64, 48, 200.0, 200.0, 1, "jpeg-baseline")
+
+
+@pytest.mark.parametrize(
+    "params",
+    [{"lossless": True}, {"quality": 80}, {"quality": 80, "exif": b"Exif\x00\x00"}],
+    ids=["VP8L", "VP8", "VP8X"],
+)
+def test_webp(params):
+    data = _encode("WEBP", (300, 17), mode="RGB", **params)
+    assert read_image_info(data) == ImageInfo(300, 17, None, None, 1, "webp")
+
+
+def _truncations(data: bytes):
+    return [data[:n] for n in range(len(data))]
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        pytest.param(lambda: _tiff(2480, 3508, 300, pages=2), id="tiff"),
+        pytest.param(lambda: _encode("JPEG", (64, 48), dpi=(200, 200)), id="jpeg"),
+        pytest.param(
+            lambda: _encode("WEBP", (300, 17), mode="RGB", lossless=True), id="VP8L"
+        ),
+        pytest.param(
+            lambda: _encode("WEBP", (300, 17), mode="RGB", quality=80), id="VP8"
+        ),
+        pytest.param(
+            lambda: _encode(
+                "WEBP", (300, 17), mode="RGB", quality=80, exif=b"Exif\x00\x00"
+            ),
+            id="VP8X",
+        ),
+    ],
+)
+def test_truncated_headers_never_give_wrong_values(data):
+    """a truncated header gives the right value or None, and never raises."""
+    data = data()
+    full = read_image_info(data)
+    for prefix in _truncations(data):
+        info = read_image_info(prefix)
+        for field, value in info._asdict().items():
+            if field == "page_count" and value is not None:
+                # pages of a TIFF are counted until the IFD chain is cut
+                assert 1 <= value <= full.page_count
+                continue
+            assert value is None or value == getattr(full, field), (
+                len(prefix),
+                field,
+            )
+
+
+def test_truncated_webp_size_raises():
+    data = _encode("WEBP", (300, 17), mode="RGB", quality=80, exif=b"Exif\x00\x00")
+    with pytest.raises(ValueError):
+        read_webp_size(data[:26])
+
+
+@pytest.mark.parametrize("data", [b"", b"II*\x00", b"RIFF\0\0\0\0WEBP"])
+def test_headers_too_short_to_read(data):
+    assert read_image_info(data) == ImageInfo()
+
+
+def test_jpeg_without_frame_header():
+    assert read_image_info(b"\xff\xd8") == ImageInfo(page_count=1)
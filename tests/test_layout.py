@@ -0,0 +1,26 @@
+import hashlib
+from pathlib import PurePosixPath
+
+from libefiling.layout import OutputLayout
+from libefiling.manifest import Source
+
+NAME = "202501010000123456_A163_____XXXXXXXXXX__99999999999_____AAA.JWX"
+
+
+def test_document_layout():
+    layout = OutputLayout(scheme="document", depth=1, width=2)
+    fanout = hashlib.sha256(NAME.encode()).hexdigest()[:2]
+    expected = PurePosixPath("A163", "2025", "01", "01", fanout, NAME[:-4])
+    assert layout.for_archive_name(NAME) == expected
+    assert layout.for_archive_name(f"some/dir/{NAME}") == expected
+
+    source = Source.from_bytes(NAME, b"data")
+    assert layout.relative_path(source) == expected
+    assert expected.parts[0] == source.get_document_code()
+
+
+def test_document_layout_of_unknown_names():
+    layout = OutputLayout(scheme="document", depth=0)
+    assert layout.for_archive_name("short.JWX") == PurePosixPath(
+        "UNKNOWN", "UNKNOWN", "short"
+    )
@@ -0,0 +1,48 @@
+import io
+import struct
+import zipfile
+
+import pytest
+
+from libefiling.parse import PROCEDURE_XML_FILENAME, ParsedArchive
+
+ARCHIVE_NAME = "202501010000123456_A163_____XXXXXXXXXX__99999999999_____AAA.JPC"
+PROCEDURE = b'<?xml version="1.0" encoding="UTF-8"?><procedure/>'
+
+
+def _jpc(members: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        for name, data in members.items():
+            zip_file.writestr(name, data)
+    first = buffer.getvalue()
+    buffer = io.BytesIO()
+    zipfile.ZipFile(buffer, "w").close()
+    second = buffer.getvalue()
+    header = bytearray(0x32)
+    header[0:6] = b"\x30\x31\x32\x30\x31\x30"
+    struct.pack_into(">L", header, 0x06, 0x32 + len(first) + len(second) - 6)
+    struct.pack_into(">L", header, 0x0A, len(first))
+    struct.pack_into(">L", header, 0x12, len(second))
+    return bytes(header) + first + second
+
+
+def test_xml_filenames():
+    parsed = ParsedArchive.from_bytes(
+        ARCHIVE_NAME,
+        _jpc({"b.xml": b"<b/>", "a.xml": b"<a/>"}),
+        "AFM.XML",
+        PROCEDURE,
+    )
+    assert parsed.xml_filenames == ["a.xml", "b.xml", PROCEDURE_XML_FILENAME]
+    assert parsed.xml(PROCEDURE_XML_FILENAME) == PROCEDURE
+
+
+def test_member_named_like_the_procedure_xml_is_rejected():
+    with pytest.raises(ValueError, match=PROCEDURE_XML_FILENAME):
+        ParsedArchive.from_bytes(
+            ARCHIVE_NAME,
+            _jpc({PROCEDURE_XML_FILENAME: b"<member/>"}),
+            "AFM.XML",
+            PROCEDURE,
+        )
@@ -0,0 +1,122 @@
+import io
+import json
+import pstats
+import struct
+import tracemalloc
+import zipfile
+
+import pytest
+
+from libefiling.cli import parse_main
+from libefiling.parse import ParsedArchive
+from libefiling.profiling import (
+    PROFILE_MEMBERS_FILENAME,
+    PROFILE_PSTATS_FILENAME,
+    PROFILE_SUMMARY_FILENAME,
+    MemberTimer,
+    Profiler,
+)
+
+NAME = "202501010000123456_A163_____XXXXXXXXXX__99999999999_____"
+PROCEDURE = b'<?xml version="1.0" encoding="UTF-8"?><procedure/>'
+
+
+def _jpc(members: dict[str, bytes]) -> bytes:
+    parts = []
+    for part in (members, {}):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zip_file:
+            for name, data in part.items():
+                zip_file.writestr(name, data)
+        parts.append(buffer.getvalue())
+    first, second = parts
+    header = bytearray(0x32)
+    header[0:6] = b"\x30\x31\x32\x30\x31\x30"
+    struct.pack_into(">L", header, 0x06, 0x32 + len(first) + len(second) - 6)
+    struct.pack_into(">L", header, 0x0A, len(first))
+    struct.pack_into(">L", header, 0x12, len(second))
+    return bytes(header) + first + second
+
+
+def test_member_timer_sums_stages():
+    timer = MemberTimer({"a.xml": 1.0, "b.tif": 0.5})
+    timer.add("a.xml", "convert", 2.0)
+    timer.add("a.xml", "convert", 0.25)
+    timer.add("a.xml", "decompress", 0.5)
+    with timer.time("b.tif", "hash"):
+        pass
+
+    cost = timer.cost("a.JPC", "a.xml", "request", 10)
+    assert (cost.decompress_seconds, cost.convert_seconds, cost.hash_seconds) == (
+        1.5,
+        2.25,
+        0.0,
+    )
+    cost = timer.cost("a.JPC", "b.tif", "figure", 20)
+    assert cost.decompress_seconds == 0.5
+    assert 0 < cost.hash_seconds < 1
+    assert timer.cost("a.JPC", "c.xml", "unknown", 0).model_dump() == {
+        "archive": "a.JPC",
+        "member": "c.xml",
+        "kind": "unknown",
+        "byte_size": 0,
+        "decompress_seconds": 0.0,
+        "convert_seconds": 0.0,
+        "hash_seconds": 0.0,
+    }
+
+
+def test_report(tmp_path):
+    profiler = Profiler(top=5)
+    profiler.phase("parse")
+    parsed = ParsedArchive.from_bytes(
+        f"{NAME}AAA.JPC", _jpc({"a.xml": b"<a/>"}), f"{NAME}AFM.XML", PROCEDURE
+    )
+    assert parsed.manifest.xml_files
+    profiler.phase("write")
+    costs = parsed.member_costs()
+    reports = profiler.report(parsed.sources, costs)
+    assert not profiler.running
+
+    assert sorted(reports) == sorted(
+        [PROFILE_PSTATS_FILENAME, PROFILE_SUMMARY_FILENAME, PROFILE_MEMBERS_FILENAME]
+    )
+    for filename, data in reports.items():
+        (tmp_path / filename).write_bytes(data)
+    stats = pstats.Stats(str(tmp_path / PROFILE_PSTATS_FILENAME))
+    assert stats.total_calls > 0  # type: ignore[attr-defined]
+
+    (summary,) = map(json.loads, reports[PROFILE_SUMMARY_FILENAME].splitlines())
+    assert summary["archive"] == f"{NAME}AAA.JPC"
+    assert list(summary["phases"]) == ["parse", "write"]
+    assert len(summary["top_functions"]) == 5
+    members = [
+        json.loads(line) for line in reports[PROFILE_MEMBERS_FILENAME].splitlines()
+    ]
+    assert [member["member"] for member in members] == [cost.member for cost in costs]
+
+
+def test_report_needs_a_started_profiler():
+    with pytest.raises(RuntimeError):
+        Profiler().report(None, [])  # type: ignore[arg-type]
+
+
+def test_parse_main_stops_the_profiler_on_error(tmp_path, monkeypatch):
+    stopped = []
+    stop = Profiler.stop
+
+    def spy(self):
+        stop(self)
+        stopped.append(self.running)
+
+    monkeypatch.setattr(Profiler, "stop", spy)
+    archive = tmp_path / f"{NAME}AAA.JPC"
+    archive.write_bytes(b"not an archive")
+    procedure = tmp_path / f"{NAME}AFM.XML"
+    procedure.write_bytes(PROCEDURE)
+
+    tracing = tracemalloc.is_tracing()
+    with pytest.raises(ValueError, match="unsupported archive format"):
+        parse_main([str(archive), str(procedure), str(tmp_path / "out"), "--profile"])
+    assert stopped == [False]
+    assert tracemalloc.is_tracing() == tracing
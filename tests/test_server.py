@@ -0,0 +1,152 @@
+import io
+import os
+import stat
+import struct
+import threading
+import zipfile
+
+import pytest
+
+from libefiling.server import WorkerPool, _RequestHandler, _Server, serve, submit
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = WorkerPool(1)
+    yield pool
+    pool.close()
+
+
+def _verify(out_dir) -> dict:
+    return {"op": "verify", "out_dir": str(out_dir)}
+
+
+def _blocking_dir(tmp_path):
+    """output directory whose manifest.json blocks the reader forever."""
+    out_dir = tmp_path / "blocking"
+    out_dir.mkdir()
+    os.mkfifo(out_dir / "manifest.json")
+    return out_dir
+
+
+def test_timed_out_worker_is_replaced(pool, tmp_path):
+    pid = pool._workers[0][0].pid
+    response = pool.submit(_verify(_blocking_dir(tmp_path)), timeout=0.5)
+    assert response == {"ok": False, "error": "timed out after 0.5 seconds"}
+    assert pool._workers[0][0].pid != pid
+
+    response = pool.submit(_verify(tmp_path / "missing"))
+    assert not response["ok"]
+    assert "missing" in response["error"]
+
+
+def test_worker_is_replaced_on_any_error(pool, tmp_path):
+    """the response of a job whose wait failed is not given to the next one."""
+    pid = pool._workers[0][0].pid
+    with pytest.raises(TypeError):
+        pool.submit(_verify(tmp_path / "first"), timeout="1")  # type: ignore
+    assert pool._workers[0][0].pid != pid
+
+    response = pool.submit(_verify(tmp_path / "second"))
+    assert "second" in response["error"]
+    assert "first" not in response["error"]
+
+
+def _jpc(members: dict[str, bytes]) -> bytes:
+    parts = []
+    for part in (members, {}):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zip_file:
+            for name, data in part.items():
+                zip_file.writestr(name, data)
+        parts.append(buffer.getvalue())
+    first, second = parts
+    header = bytearray(0x32)
+    header[0:6] = b"\x30\x31\x32\x30\x31\x30"
+    struct.pack_into(">L", header, 0x06, 0x32 + len(first) + len(second) - 6)
+    struct.pack_into(">L", header, 0x0A, len(first))
+    struct.pack_into(">L", header, 0x12, len(second))
+    return bytes(header) + first + second
+
+
+def _tiff(size: tuple[int, int]) -> bytes:
+    Image = pytest.importorskip("PIL.Image")
+    buffer = io.BytesIO()
+    Image.new("L", size).save(buffer, "TIFF")
+    return buffer.getvalue()
+
+
+def test_parse_job_converts_images_on_a_process_pool(pool, tmp_path):
+    """workers are not daemonic, so that they can start the image pool."""
+    name = "202501010000123456_A163_____XXXXXXXXXX__99999999999_____"
+    archive = tmp_path / f"{name}AAA.JPC"
+    archive.write_bytes(
+        _jpc({"a.xml": b"<a/>", "a.tif": _tiff((40, 30)), "b.tif": _tiff((8, 8))})
+    )
+    procedure = tmp_path / f"{name}AFM.XML"
+    procedure.write_bytes(b'<?xml version="1.0" encoding="UTF-8"?><procedure/>')
+    out_dir = tmp_path / "out"
+    job = {
+        "op": "parse",
+        "archive": str(archive),
+        "procedure": str(procedure),
+        "out_dir": str(out_dir),
+        "options": {"image_derivatives": True},
+    }
+    response = pool.submit(job, timeout=60)
+    assert response["ok"], response
+    assert sorted(path.name for path in (out_dir / "images").iterdir()) == [
+        "a.tif.thumbnail.webp",
+        "a.tif.webp",
+        "b.tif.thumbnail.webp",
+        "b.tif.webp",
+    ]
+    assert pool.submit(_verify(out_dir))["result"]["ok"]
+
+
+@pytest.fixture
+def server(pool, tmp_path):
+    path = tmp_path / "server.sock"
+    server = _Server(str(path), _RequestHandler)
+    server.pool = pool
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield path
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("timeout", ["1", 0, -1, True, float("nan"), [1]])
+def test_invalid_timeout_is_rejected(pool, server, tmp_path, timeout):
+    pid = pool._workers[0][0].pid
+    job = {**_verify(tmp_path / "missing"), "timeout": timeout}
+    assert submit(server, job, timeout=10) == {
+        "ok": False,
+        "error": "timeout must be a positive number of seconds",
+    }
+    assert pool._workers[0][0].pid == pid
+
+    response = submit(server, {**job, "timeout": 5}, timeout=10)
+    assert "missing" in response["error"]
+
+
+def test_socket_is_private_from_bind(tmp_path, monkeypatch):
+    path = tmp_path / "server.sock"
+    modes = []
+    server_bind = _Server.server_bind
+
+    def bind(self):
+        server_bind(self)
+        modes.append(stat.S_IMODE(os.stat(path).st_mode))
+
+    def serve_forever(self):
+        modes.append(stat.S_IMODE(os.stat(path).st_mode))
+
+    monkeypatch.setattr(_Server, "server_bind", bind)
+    monkeypatch.setattr(_Server, "serve_forever", serve_forever)
+    monkeypatch.setattr(WorkerPool, "__init__", lambda self, *args: None)
+    monkeypatch.setattr(WorkerPool, "close", lambda self: None)
+    serve(path)
+    assert modes[0] & 0o077 == 0
+    assert modes[1] == 0o600
+    assert not path.exists()
@@ -0,0 +1,244 @@
+import os
+
+import pytest
+
+from libefiling.sink import FileSystemSink, MemorySink, S3Sink, Sink, open_sink
+from libefiling.verify import VERIFY_STATE_FILENAME
+from libefiling.writer import OutputWriter
+
+
+def _files(root) -> dict[str, bytes]:
+    return {
+        path.relative_to(root).as_posix(): path.read_bytes()
+        for path in sorted(root.rglob("*"))
+        if path.is_file()
+    }
+
+
+def _previous_run(root) -> None:
+    (root / "xml").mkdir(parents=True)
+    (root / "xml/a.xml").write_bytes(b"a")
+    (root / VERIFY_STATE_FILENAME).write_bytes(b"{}")
+    (root / ".manifest.json.1.tmp").write_bytes(b"")
+
+
+def test_batch_replaces_outputs_and_carries_dotfiles(tmp_path):
+    root = tmp_path / "out"
+    _previous_run(root)
+    state = (root / VERIFY_STATE_FILENAME).stat()
+
+    sink = FileSystemSink(root, "batch")
+    sink.write("xml/b.xml", b"b")
+    assert _files(root)["xml/a.xml"] == b"a"
+    sink.finish()
+
+    assert _files(root) == {VERIFY_STATE_FILENAME: b"{}", "xml/b.xml": b"b"}
+    assert (root / VERIFY_STATE_FILENAME).stat().st_ino == state.st_ino
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["out"]
+
+
+def test_batch_does_not_carry_dotfiles_written_by_the_run(tmp_path):
+    root = tmp_path / "out"
+    _previous_run(root)
+    sink = FileSystemSink(root, "batch")
+    sink.write(VERIFY_STATE_FILENAME, b"new")
+    sink.finish()
+    assert _files(root) == {VERIFY_STATE_FILENAME: b"new"}
+
+
+def test_batch_recovers_from_a_crash_between_the_renames(tmp_path, monkeypatch):
+    root = tmp_path / "out"
+    _previous_run(root)
+    before = _files(root)
+
+    sink = FileSystemSink(root, "batch")
+    sink.write("xml/b.xml", b"b")
+    replace = os.replace
+
+    def crash_on_publish(src, dst):
+        if os.path.basename(src).startswith(".out.staging-"):
+            raise KeyboardInterrupt
+        replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", crash_on_publish)
+    with pytest.raises(KeyboardInterrupt):
+        sink.finish()
+    monkeypatch.setattr(os, "replace", replace)
+    assert not root.exists()
+
+    FileSystemSink(root, "batch")
+    assert _files(root) == before
+    assert not (tmp_path / ".out.old").exists()
+
+
+def test_batch_removes_old_root_left_after_publishing(tmp_path):
+    root = tmp_path / "out"
+    _previous_run(root)
+    (tmp_path / ".out.old").mkdir()
+    (tmp_path / ".out.old/stale").write_bytes(b"")
+
+    FileSystemSink(root, "batch")
+    assert not (tmp_path / ".out.old").exists()
+    assert (root / "xml/a.xml").exists()
+
+
+def test_batch_abort_leaves_root(tmp_path):
+    root = tmp_path / "out"
+    _previous_run(root)
+    before = _files(root)
+    sink = FileSystemSink(root, "batch")
+    sink.write("xml/b.xml", b"b")
+    sink.abort()
+    assert _files(root) == before
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["out"]
+
+
+def test_memory_sink():
+    sink = MemorySink()
+    child = sink.child("out/a")
+    child.write("xml/a.xml", b"a")
+    child.write("xml/b.xml", b"bb")
+    child.write("xml/sub/c.xml", b"c")
+    assert sink.files == {
+        "out/a/xml/a.xml": b"a",
+        "out/a/xml/b.xml": b"bb",
+        "out/a/xml/sub/c.xml": b"c",
+    }
+    assert child.list_files("xml") == ["xml/a.xml", "xml/b.xml"]
+    assert (child.size("xml/b.xml"), child.size("xml/missing.xml")) == (2, None)
+    assert (child.read("xml/a.xml"), child.read("xml/missing.xml")) == (b"a", None)
+    child.delete("xml/a.xml")
+    child.delete("xml/missing.xml")
+    assert child.list_files("xml/") == ["xml/b.xml"]
+
+
+def test_sink_is_abstract():
+    with pytest.raises(TypeError):
+        Sink()  # type: ignore
+
+
+def test_open_sink(tmp_path):
+    sink = open_sink(tmp_path / "out", "strict")
+    assert isinstance(sink, FileSystemSink)
+    assert (sink.root, sink.durability) == (tmp_path / "out", "strict")
+
+    pytest.importorskip("boto3")
+    sink = open_sink("s3://bucket1/some/prefix/", client=object())
+    assert isinstance(sink, S3Sink)
+    assert (sink.bucket, sink.prefix) == ("bucket1", "some/prefix")
+    sink.close()
+    with pytest.raises(ValueError):
+        open_sink("s3://bucket1/prefix", "batch")
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    moto = pytest.importorskip("moto")
+    boto3 = pytest.importorskip("boto3")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        client = boto3.client("s3")
+        client.create_bucket(Bucket="bucket1")
+        yield client
+
+
+def _objects(client) -> dict[str, bytes]:
+    response = client.list_objects_v2(Bucket="bucket1")
+    return {
+        content["Key"]: client.get_object(Bucket="bucket1", Key=content["Key"])[
+            "Body"
+        ].read()
+        for content in response.get("Contents", [])
+    }
+
+
+def test_s3_sink_multipart_upload(s3):
+    large = bytes(range(256)) * (11 * 1024 * 4)  # 11 MiB, 3 parts of 5 MiB
+    with S3Sink("bucket1", "root", client=s3, part_size=5 * 1024 * 1024) as sink:
+        child = sink.child("out")
+        child.write("images/large.tif", large)
+        child.write("xml/a.xml", b"a")
+        child.finish()
+
+    assert _objects(s3) == {
+        "root/out/images/large.tif": large,
+        "root/out/xml/a.xml": b"a",
+    }
+    assert s3.list_multipart_uploads(Bucket="bucket1").get("Uploads", []) == []
+
+
+def test_s3_sink_abort(s3):
+    sink = S3Sink("bucket1", client=s3, part_size=5 * 1024 * 1024)
+    sink.write("large.tif", b"\0" * (6 * 1024 * 1024))
+    sink.abort()
+    sink.finish()
+    sink.close()
+    assert _objects(s3) == {}
+    assert s3.list_multipart_uploads(Bucket="bucket1").get("Uploads", []) == []
+
+
+def test_s3_sink_failed_upload_is_aborted(s3):
+    """parts smaller than 5 MiB fail to complete, and the upload is aborted."""
+    ClientError = pytest.importorskip("botocore.exceptions").ClientError
+    sink = S3Sink("bucket1", client=s3, part_size=1024 * 1024)
+    sink.write("large.tif", b"\0" * (3 * 1024 * 1024))
+    with pytest.raises(ClientError, match="EntityTooSmall"):
+        sink.finish()
+    sink.close()
+    assert _objects(s3) == {}
+    assert s3.list_multipart_uploads(Bucket="bucket1").get("Uploads", []) == []
+
+
+def test_s3_sink_list_and_delete(s3):
+    with S3Sink("bucket1", "out", client=s3) as sink:
+        for relpath in ["xml/a.xml", "xml/b.xml", "xml/sub/c.xml", "raw/d.xml"]:
+            sink.write(relpath, relpath.encode())
+        sink.finish()
+        assert sink.list_files("xml") == ["xml/a.xml", "xml/b.xml"]
+        assert sink.list_files("missing") == []
+        assert (sink.size("xml/a.xml"), sink.size("xml/missing.xml")) == (9, None)
+        assert (sink.read("raw/d.xml"), sink.read("missing")) == (b"raw/d.xml", None)
+
+        sink.delete("xml/a.xml")
+        sink.finish()
+        assert sink.list_files("xml") == ["xml/b.xml"]
+    assert sorted(_objects(s3)) == [
+        "out/raw/d.xml",
+        "out/xml/b.xml",
+        "out/xml/sub/c.xml",
+    ]
+
+
+def _write_incremental(client, files, part_size):
+    sink = S3Sink("bucket1", "out", client=client, part_size=part_size)
+    with sink, OutputWriter(".", incremental=True, sink=sink) as writer:
+        for relpath, data in files.items():
+            writer.write(relpath, data)
+    return writer.changes
+
+
+def test_s3_sink_incremental_compares_etags(s3, monkeypatch):
+    """objects uploaded whole or in parts are compared without downloading."""
+    large = bytes(range(256)) * (11 * 1024 * 4)
+    files = {"xml/a.xml": b"a", "images/large.tif": large}
+    _write_incremental(s3, files, 5 * 1024 * 1024)
+
+    def read(self, relpath):
+        raise AssertionError(f"{relpath} is downloaded")
+
+    monkeypatch.setattr(S3Sink, "read", read)
+    assert _write_incremental(s3, files, 5 * 1024 * 1024).unchanged == 2
+
+    ### the ETag of an object uploaded in parts depends on the part size
+    changes = _write_incremental(s3, files, 6 * 1024 * 1024)
+    assert (changes.unchanged, changes.changed) == (1, ["images/large.tif"])
+    assert _write_incremental(s3, files, 6 * 1024 * 1024).unchanged == 2
+
+    modified = {"xml/a.xml": b"b", "images/large.tif": large[:-1] + b"\0"}
+    changes = _write_incremental(s3, modified, 6 * 1024 * 1024)
+    assert sorted(changes.changed) == sorted(modified)
+    assert _objects(s3) == {
+        f"out/{relpath}": data for relpath, data in modified.items()
+    }
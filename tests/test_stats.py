@@ -0,0 +1,200 @@
+import io
+import math
+import random
+import struct
+import zipfile
+
+import pytest
+
+from libefiling.manifest import Manifest
+from libefiling.parse import ParsedArchive
+from libefiling.stats import (
+    CorpusStats,
+    Distribution,
+    QuantileSketch,
+    collect_stats,
+    iter_manifest_paths,
+)
+
+QUANTILES = [0, 0.01, 0.25, 0.5, 0.9, 0.99, 0.999, 1]
+
+
+def _exact(values: list[float], q: float) -> float:
+    """the value the sketch approximates, by the nearest-rank method."""
+    return sorted(values)[max(math.ceil(q * len(values)) - 1, 0)]
+
+
+def _values(n: int, seed: int) -> list[float]:
+    rng = random.Random(seed)
+    return [rng.lognormvariate(10, 2) for _ in range(n)]
+
+
+@pytest.mark.parametrize("alpha", [0.01, 0.05])
+def test_quantiles_within_relative_error(alpha):
+    values = _values(20000, seed=1)
+    sketch = QuantileSketch(alpha)
+    for value in values:
+        sketch.add(value)
+    for q in QUANTILES:
+        exact = _exact(values, q)
+        assert sketch.quantile(q) == pytest.approx(exact, rel=alpha), q
+
+
+def test_merged_sketch_equals_the_whole():
+    values = _values(5000, seed=2) + [0.0] * 100
+    whole = QuantileSketch()
+    parts = [QuantileSketch() for _ in range(4)]
+    for i, value in enumerate(values):
+        whole.add(value)
+        parts[i % 4].add(value)
+    merged = QuantileSketch()
+    for part in parts:
+        merged.merge(part)
+
+    assert merged.count == whole.count == len(values)
+    for q in QUANTILES:
+        assert merged.quantile(q) == whole.quantile(q)
+        assert merged.quantile(q) == pytest.approx(_exact(values, q), rel=0.01)
+    assert merged.quantile(0) == 0.0
+
+
+def test_sketches_of_different_accuracy_are_not_merged():
+    with pytest.raises(ValueError):
+        QuantileSketch(0.01).merge(QuantileSketch(0.02))
+
+
+@pytest.mark.parametrize("value", [0.3, 1, 7, 123456.789])
+def test_distribution_quantiles_are_clamped_to_the_values_seen(value):
+    distribution = Distribution()
+    distribution.add(value)
+    assert [distribution.quantile(q) for q in QUANTILES] == [value] * len(QUANTILES)
+
+
+def test_empty_sketch():
+    assert QuantileSketch().quantile(0.5) is None
+    assert Distribution().quantile(0.5) is None
+
+
+def test_distribution():
+    values = [3, 1, 4, 1, 5, 9, 2, 6]
+    distribution = Distribution()
+    for value in values[:4]:
+        distribution.add(value)
+    other = Distribution()
+    for value in values[4:]:
+        other.add(value)
+    distribution.merge(other)
+
+    result = distribution.result()
+    assert (result["count"], result["sum"]) == (8, 31)
+    assert (result["min"], result["max"], result["mean"]) == (1, 9, 31 / 8)
+    assert result["p50"] == pytest.approx(_exact(values, 0.5), rel=0.01)
+    assert distribution.quantile(1) == pytest.approx(9, rel=0.01)
+    assert result["histogram"] == [
+        {"le": 1.0, "count": 2},
+        {"le": 2.0, "count": 1},
+        {"le": 4.0, "count": 2},
+        {"le": 8.0, "count": 2},
+        {"le": 16.0, "count": 1},
+    ]
+
+
+def test_quantiles_are_nearest_ranks():
+    sketch = QuantileSketch()
+    for value in [1, 10, 100, 1000]:
+        sketch.add(value)
+    assert [sketch.quantile(q) for q in [0, 0.25, 0.26, 0.5, 0.9, 1]] == pytest.approx(
+        [1, 1, 10, 10, 1000, 1000], rel=0.01
+    )
+
+
+def _jpc(members: dict[str, bytes]) -> bytes:
+    parts = []
+    for part in (members, {}):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zip_file:
+            for name, data in part.items():
+                zip_file.writestr(name, data)
+        parts.append(buffer.getvalue())
+    first, second = parts
+    header = bytearray(0x32)
+    header[0:6] = b"\x30\x31\x32\x30\x31\x30"
+    struct.pack_into(">L", header, 0x06, 0x32 + len(first) + len(second) - 6)
+    struct.pack_into(">L", header, 0x0A, len(first))
+    struct.pack_into(">L", header, 0x12, len(second))
+    return bytes(header) + first + second
+
+
+def _write_output(out_dir, number: int) -> Manifest:
+    """output directory of an archive with number XMLs and number - 1 images."""
+    name = f"2025010100{number:08d}_A163_____XXXXXXXXXX__99999999999_____"
+    members = {f"{i}-jpntce.xml": b"<a/>" for i in range(number)}
+    members.update({f"{i}.tif": b"II*\0" * (i + 1) for i in range(number - 1)})
+    return ParsedArchive.from_bytes(
+        f"{name}AAA.JPC",
+        _jpc(members),
+        f"{name}AFM.XML",
+        b'<?xml version="1.0" encoding="UTF-8"?><procedure/>',
+    ).write_to(out_dir)
+
+
+@pytest.fixture
+def roots(tmp_path):
+    """two roots of output directories, one of them unreadable, and their
+    manifests in the order they are found."""
+    first, second = tmp_path / "first", tmp_path / "second"
+    found = [
+        (first / "a", _write_output(first / "a", 1)),
+        (first / "b/c", _write_output(first / "b/c", 2)),
+        (second / "d", _write_output(second / "d", 3)),
+    ]
+    ### an output directory is not descended into
+    _write_output(first / "a/nested", 4)
+    (second / "e").mkdir()
+    (second / "e/manifest.json").write_text("{")
+    return [first, second], found
+
+
+def test_iter_manifest_paths(roots):
+    paths, found = roots
+    assert list(iter_manifest_paths(paths)) == [
+        *(out_dir / "manifest.json" for out_dir, _ in found[:2]),
+        found[2][0] / "manifest.json",
+        paths[1] / "e/manifest.json",
+    ]
+
+
+def test_corpus_stats_merge_equals_add(roots):
+    _, found = roots
+    manifests = [manifest for _, manifest in found]
+    whole = CorpusStats()
+    for manifest in manifests:
+        whole.add(manifest)
+    merged = CorpusStats()
+    for manifest in manifests:
+        part = CorpusStats()
+        part.add(manifest)
+        merged.merge(part)
+
+    result = whole.result()
+    assert merged.result() == result
+    assert (result["manifests"], result["errors"]) == (3, 0)
+    assert result["document_codes"] == {"A163": 3}
+    assert result["xml_kinds"] == {"notice": 6, "procedure": 3}
+    assert result["xml_files_per_archive"]["count"] == 3
+    assert result["xml_files_per_archive"]["sum"] == 9
+    assert result["image_media_types"] == {"image/tiff": 3}
+    assert result["image_bytes"]["unknown"]["sum"] == 4 * (1 + 1 + 2)
+    assert result["archive_bytes"]["A/AA/.JPC"]["count"] == 3
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_collect_stats(roots, max_workers):
+    paths, found = roots
+    expected = CorpusStats()
+    for _, manifest in found:
+        expected.add(manifest)
+    expected.errors = 1
+
+    stats = collect_stats(paths, max_workers=max_workers, chunk_size=1)
+    assert stats.result() == expected.result()
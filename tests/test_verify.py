@@ -0,0 +1,152 @@
+import io
+import json
+import os
+import struct
+import zipfile
+
+import pytest
+
+from libefiling.cli import verify_main
+from libefiling.parse import ParsedArchive
+from libefiling.verify import VERIFY_STATE_FILENAME, verify_output
+
+ARCHIVE_NAME = "202501010000123456_A163_____XXXXXXXXXX__99999999999_____AAA.JPC"
+PROCEDURE = b'<?xml version="1.0" encoding="UTF-8"?><procedure/>'
+
+
+def _jpc(members: dict[str, bytes]) -> bytes:
+    parts = []
+    for part in (members, {}):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zip_file:
+            for name, data in part.items():
+                zip_file.writestr(name, data)
+        parts.append(buffer.getvalue())
+    first, second = parts
+    header = bytearray(0x32)
+    header[0:6] = b"\x30\x31\x32\x30\x31\x30"
+    struct.pack_into(">L", header, 0x06, 0x32 + len(first) + len(second) - 6)
+    struct.pack_into(">L", header, 0x0A, len(first))
+    struct.pack_into(">L", header, 0x12, len(second))
+    return bytes(header) + first + second
+
+
+@pytest.fixture
+def out_dir(tmp_path):
+    """output directory with 2 XMLs, an image and the procedure XML."""
+    out_dir = tmp_path / "out"
+    members = {"a.xml": b"<a/>", "b.xml": b"<b/>", "c.tif": b"II*\0tiff"}
+    ParsedArchive.from_bytes(
+        ARCHIVE_NAME, _jpc(members), "AFM.XML", PROCEDURE
+    ).write_to(out_dir)
+    return out_dir
+
+
+def _tamper(path) -> None:
+    """change the content of a file, keeping its size."""
+    data = bytearray(path.read_bytes())
+    data[0] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+
+def test_valid_directory(out_dir):
+    report = verify_output(out_dir)
+    assert report.ok
+    assert (report.checked, report.trusted) == (4, 0)
+    assert not (out_dir / VERIFY_STATE_FILENAME).exists()
+
+
+def test_missing_extra_and_mismatched_files(out_dir):
+    (out_dir / "xml/a.xml").unlink()
+    (out_dir / "xml/z.xml").write_bytes(b"<z/>")
+    (out_dir / "raw/z.TIF").write_bytes(b"")
+    (out_dir / "xml/notes.txt").write_bytes(b"not looked at")
+    _tamper(out_dir / "raw/c.tif")
+
+    report = verify_output(out_dir, max_workers=2)
+    assert not report.ok
+    assert report.missing == ["xml/a.xml"]
+    assert report.extra == ["raw/z.TIF", "xml/z.xml"]
+    assert report.mismatched == ["raw/c.tif"]
+    assert report.checked == 3
+
+
+def test_incremental_trusts_unchanged_files(out_dir):
+    report = verify_output(out_dir, incremental=True)
+    assert (report.checked, report.trusted) == (4, 0)
+    report = verify_output(out_dir, incremental=True)
+    assert report.ok
+    assert (report.checked, report.trusted) == (0, 4)
+
+    ### a file whose mtime is restored after the change is still trusted
+    path = out_dir / "xml/a.xml"
+    st = path.stat()
+    _tamper(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    report = verify_output(out_dir, incremental=True)
+    assert report.ok
+    assert (report.checked, report.trusted) == (0, 4)
+
+
+def test_incremental_state_is_invalidated(out_dir):
+    verify_output(out_dir, incremental=True)
+
+    path = out_dir / "xml/a.xml"
+    st = path.stat()
+    _tamper(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+    report = verify_output(out_dir, incremental=True)
+    assert report.mismatched == ["xml/a.xml"]
+    assert (report.checked, report.trusted) == (1, 3)
+
+    ### a mismatched file is dropped from the state, and checked until fixed
+    state = json.loads((out_dir / VERIFY_STATE_FILENAME).read_text())
+    assert "xml/a.xml" not in state
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    report = verify_output(out_dir, incremental=True)
+    assert report.mismatched == ["xml/a.xml"]
+    _tamper(path)
+    report = verify_output(out_dir, incremental=True)
+    assert report.ok
+    assert (report.checked, report.trusted) == (1, 3)
+
+    ### a broken state is ignored
+    (out_dir / VERIFY_STATE_FILENAME).write_text("{")
+    report = verify_output(out_dir, incremental=True)
+    assert (report.checked, report.trusted) == (4, 0)
+
+
+def test_unreadable_manifest_is_raised(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        verify_output(tmp_path)
+
+
+def _unreadable_dirs(tmp_path):
+    corrupt = tmp_path / "corrupt"
+    corrupt.mkdir()
+    (corrupt / "manifest.json").write_text("{}")
+    return [tmp_path / "missing", corrupt]
+
+
+def test_verify_main_continues_after_an_unreadable_directory(out_dir, tmp_path, capsys):
+    dirs = [*_unreadable_dirs(tmp_path), out_dir]
+    assert verify_main(list(map(str, dirs))) == 1
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith(f"NG {dirs[0]}: ")
+    assert "manifest.json" in lines[0]
+    assert [line.split(":")[0] for line in lines if not line.startswith(" ")] == [
+        f"NG {dirs[0]}",
+        f"NG {dirs[1]}",
+        f"OK {out_dir}",
+    ]
+
+
+def test_verify_main_json(out_dir, tmp_path, capsys):
+    dirs = [*_unreadable_dirs(tmp_path), out_dir]
+    assert verify_main([*map(str, dirs), "--json"]) == 1
+    reports = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [report["root"] for report in reports] == list(map(str, dirs))
+    assert [report["error"] is None for report in reports] == [False, False, True]
+    assert reports[2]["checked"] == 4
+
+    assert verify_main([str(out_dir), "--json"]) == 0
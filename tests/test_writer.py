@@ -0,0 +1,98 @@
+import hashlib
+import os
+
+import pytest
+
+from libefiling.sink import FileSystemSink, MemorySink
+from libefiling.writer import OutputWriter
+
+
+def _run(sink, files, known=None, prune=(), remove=()):
+    """write files in incremental mode as a run would, return the changes."""
+    with OutputWriter("out", incremental=True, known=known, sink=sink) as writer:
+        for relpath, data in files.items():
+            writer.write(f"out/{relpath}", data)
+        for relpath in remove:
+            writer.remove(f"out/{relpath}")
+        for directory in prune:
+            writer.prune(f"out/{directory}")
+    return writer.changes
+
+
+def test_incremental_changes():
+    sink = MemorySink()
+    first = {"xml/a.xml": b"a", "xml/b.xml": b"b", "images/c.webp": b"c"}
+    changes = _run(sink, first)
+    assert sorted(changes.added) == sorted(first)
+    assert changes.changed == changes.removed == []
+
+    second = {"xml/a.xml": b"a", "xml/b.xml": b"B", "xml/d.xml": b"d"}
+    changes = _run(sink, second, prune=["xml", "images"])
+    assert changes.added == ["xml/d.xml"]
+    assert changes.changed == ["xml/b.xml"]
+    assert changes.removed == ["images/c.webp"]
+    assert changes.unchanged == 1
+    assert sink.files == second
+
+
+def test_remove_missing_file_is_not_recorded():
+    sink = MemorySink({"a.txt": b"a"})
+    changes = _run(sink, {}, remove=["a.txt", "missing.txt"])
+    assert changes.removed == ["a.txt"]
+    assert sink.files == {}
+
+
+def test_keep_is_not_pruned():
+    sink = MemorySink({"xml/a.xml": b"a", "xml/b.xml": b"b"})
+    with OutputWriter("out", incremental=True, sink=sink) as writer:
+        writer.keep("out/xml/a.xml")
+        writer.prune("out/xml")
+    assert writer.changes.unchanged == 1
+    assert writer.changes.removed == ["xml/b.xml"]
+    assert sink.files == {"xml/a.xml": b"a"}
+
+
+def test_prune_does_nothing_unless_incremental():
+    sink = MemorySink({"xml/a.xml": b"a"})
+    with OutputWriter("out", sink=sink) as writer:
+        writer.prune("out/xml")
+        writer.remove("out/xml/a.xml")
+    assert sink.files == {"xml/a.xml": b"a"}
+
+
+def test_known_hash_is_confirmed_against_the_file():
+    """a file modified since the previous run is rewritten, even if the
+    hash recorded by that run matches the new content."""
+    data = b"content"
+    known = {"a.txt": hashlib.sha256(data).hexdigest()}
+    sink = MemorySink({"a.txt": b"CONTENT"})
+    changes = _run(sink, {"a.txt": data}, known=known)
+    assert changes.changed == ["a.txt"]
+    assert sink.files == {"a.txt": data}
+
+    changes = _run(sink, {"a.txt": data}, known=known)
+    assert changes.unchanged == 1
+    assert changes.changed == []
+
+
+@pytest.mark.parametrize("durability", ["fast", "strict", "batch"])
+def test_file_system_sink_keeps_mtime(tmp_path, durability):
+    root = tmp_path / "out"
+
+    def run(files, prune=()):
+        sink = FileSystemSink(root, durability)
+        with OutputWriter(root, incremental=True, sink=sink) as writer:
+            for relpath, data in files.items():
+                writer.write(root / relpath, data)
+            for directory in prune:
+                writer.prune(root / directory)
+        return writer.changes
+
+    run({"xml/a.xml": b"a", "xml/b.xml": b"b"})
+    os.utime(root / "xml/a.xml", ns=(0, 0))
+
+    changes = run({"xml/a.xml": b"a"}, prune=["xml"])
+    assert changes.unchanged == 1
+    assert changes.removed == ["xml/b.xml"]
+    assert (root / "xml/a.xml").stat().st_mtime_ns == 0
+    assert sorted(p.name for p in (root / "xml").iterdir()) == ["a.xml"]
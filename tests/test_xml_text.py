@@ -0,0 +1,137 @@
+import io
+import json
+import shutil
+import struct
+import zipfile
+from types import SimpleNamespace
+from xml.etree import ElementTree as ET
+
+import pytest
+
+from libefiling.cli import text_main
+from libefiling.parse import ParsedArchive
+from libefiling.xml.text import iter_text_sections, write_text_jsonl
+
+ARCHIVE_NAME = "202501010000123456_A163_____XXXXXXXXXX__99999999999_____AAA.JPC"
+
+SECTIONS = ("description", "claims", "abstract")
+
+DOCUMENTS = [
+    "<application-body><description><p>a</p></description></application-body>",
+    # mixed content: text, children and tails in document order
+    "<application-body><claims>head<claim>one<b>bold</b>tail</claim>"
+    "between<claim>two</claim>end</claims></application-body>",
+    # nested sections are part of the outermost one
+    "<application-body><description>x<abstract>inner</abstract>y"
+    "</description><abstract> outer </abstract></application-body>",
+    # namespaced elements are matched by local name
+    '<jp:application-body xmlns:jp="http://www.jpo.go.jp">'
+    "<jp:claims><jp:claim>請求項</jp:claim></jp:claims></jp:application-body>",
+    # empty and whitespace only sections are skipped
+    "<application-body><abstract/><claims>  \n </claims></application-body>",
+    "<root><other>not emitted</other></root>",
+]
+
+
+def _expected(xml: str) -> list[tuple[str, str]]:
+    """sections found on the fully parsed tree."""
+    found = []
+
+    def walk(element: ET.Element, path: list[str]) -> None:
+        path = path + [element.tag.rsplit("}", 1)[-1]]
+        if path[-1] in SECTIONS:
+            text = "".join(element.itertext()).strip()
+            if text:
+                found.append(("/".join(path), text))
+            return
+        for child in element:
+            walk(child, path)
+
+    walk(ET.fromstring(xml), [])
+    return found
+
+
+@pytest.mark.parametrize("xml", DOCUMENTS)
+def test_iter_text_sections_matches_the_tree(xml):
+    stream = io.BytesIO(xml.encode("utf-8"))
+    assert list(iter_text_sections(stream, SECTIONS)) == _expected(xml)
+
+
+def test_iter_text_sections_reads_a_path(tmp_path):
+    path = tmp_path / "a.xml"
+    path.write_text(DOCUMENTS[1], encoding="utf-8")
+    assert list(iter_text_sections(path, ("claims",))) == [
+        ("application-body/claims", "headoneboldtailbetweentwoend")
+    ]
+
+
+def test_write_text_jsonl():
+    manifest = SimpleNamespace(
+        paths=SimpleNamespace(xml_dir="xml"),
+        sources=SimpleNamespace(
+            archive=SimpleNamespace(filename="a.JWX", sha256="0" * 64)
+        ),
+        xml_files=[
+            SimpleNamespace(filename="body.xml", kind="application-body"),
+            SimpleNamespace(filename="other.xml", kind="procedure"),
+        ],
+    )
+    xml_data = {"body.xml": DOCUMENTS[1].encode(), "other.xml": DOCUMENTS[0].encode()}
+    out = io.StringIO()
+
+    assert write_text_jsonl(manifest, "unused", out, xml_data=xml_data) == 1
+    assert [json.loads(line) for line in out.getvalue().splitlines()] == [
+        {
+            "archive": "a.JWX",
+            "sha256": "0" * 64,
+            "file": "body.xml",
+            "kind": "application-body",
+            "path": "application-body/claims",
+            "text": "headoneboldtailbetweentwoend",
+        }
+    ]
+
+
+def _jpc(members: dict[str, bytes]) -> bytes:
+    parts = []
+    for part in (members, {}):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zip_file:
+            for name, data in part.items():
+                zip_file.writestr(name, data)
+        parts.append(buffer.getvalue())
+    first, second = parts
+    header = bytearray(0x32)
+    header[0:6] = b"\x30\x31\x32\x30\x31\x30"
+    struct.pack_into(">L", header, 0x06, 0x32 + len(first) + len(second) - 6)
+    struct.pack_into(">L", header, 0x0A, len(first))
+    struct.pack_into(">L", header, 0x12, len(second))
+    return bytes(header) + first + second
+
+
+def test_text_main_continues_after_a_failed_directory(tmp_path, capsys):
+    body = '<?xml version="1.0" encoding="UTF-8"?>' + DOCUMENTS[0]
+    good = tmp_path / "good"
+    ParsedArchive.from_bytes(
+        ARCHIVE_NAME,
+        _jpc({"JPOXMLDOC01-appb.xml": body.encode()}),
+        "AFM.XML",
+        b'<?xml version="1.0" encoding="UTF-8"?><procedure/>',
+    ).write_to(good)
+    broken_xml = tmp_path / "broken-xml"
+    shutil.copytree(good, broken_xml)
+    (broken_xml / "xml/JPOXMLDOC01-appb.xml").write_bytes(b"<application-body>")
+    corrupt = tmp_path / "corrupt"
+    corrupt.mkdir()
+    (corrupt / "manifest.json").write_text("{", encoding="utf-8")
+    output = tmp_path / "text.jsonl"
+
+    dirs = [tmp_path / "missing", corrupt, broken_xml, good]
+    assert text_main([*map(str, dirs), "-o", str(output)]) == 1
+    assert [
+        json.loads(line)["text"] for line in output.read_text("utf-8").splitlines()
+    ] == ["a"]
+    errors = capsys.readouterr().err.splitlines()
+    assert [line.split(":")[0] for line in errors if line.startswith("NG ")] == [
+        f"NG {path}" for path in dirs[:3]
+    ]